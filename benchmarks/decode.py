@@ -0,0 +1,49 @@
+""" Micro-Benchmark for the inbound message decoding
+
+Compares the validating decoder (json + pydantic validation) with the
+trusted fast path (orjson if installed + construct) on typical frames.
+
+    python -m benchmarks.decode --number 20000
+"""
+import argparse
+import json
+import timeit
+import uuid
+
+from bergen.messages.utils import get_message_decoder
+
+
+def build_frames():
+    reference = str(uuid.uuid4())
+    extensions = {"progress": None, "callback": None}
+
+    return {
+        "assign_return": json.dumps({"data": {"returns": list(range(20))}, "meta": {"type": "assign_return", "reference": reference, "extensions": extensions}}),
+        "assign_yield": json.dumps({"data": {"returns": [{"x": i, "y": str(i)} for i in range(50)]}, "meta": {"type": "assign_yield", "reference": reference, "extensions": extensions}}),
+        "assign_log": json.dumps({"data": {"level": "INFO", "message": "Assignment received"}, "meta": {"type": "assign_log", "reference": reference, "extensions": extensions}}),
+        "reserve_transition": json.dumps({"data": {"state": "ACTIVE", "message": None}, "meta": {"type": "reserve_transition", "reference": reference, "extensions": extensions}}),
+        "bounced_forwarded_assign": json.dumps({
+            "data": {"reservation": reference, "provision": reference, "args": [1, 2, 3], "kwargs": {"z": 7}},
+            "meta": {"type": "bounced_forwarded_assign", "reference": reference, "extensions": extensions, "context": {"roles": [], "scopes": ["provide"], "user": "1", "app": "1"}}
+        }),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the message decoders")
+    parser.add_argument("--number", type=int, default=10000, help="Decodes per frame type")
+    args = parser.parse_args()
+
+    validating = get_message_decoder(trusted=False)
+    trusted = get_message_decoder(trusted=True)
+
+    print(f"{'frame':<28}{'validating (us)':>18}{'trusted (us)':>16}{'speedup':>10}")
+    for name, frame in build_frames().items():
+        assert type(validating(frame)[0]) == type(trusted(frame)[0]), f"Decoders disagree on {name}"
+        slow = timeit.timeit(lambda: validating(frame), number=args.number) / args.number * 1e6
+        fast = timeit.timeit(lambda: trusted(frame), number=args.number) / args.number * 1e6
+        print(f"{name:<28}{slow:>18.2f}{fast:>16.2f}{slow / fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+""" End-to-End Benchmark against the FakeArkitekt
+
+Runs every scenario with a fresh fake server and a fresh client (each in its own
+process) and measures:
+
+* startup: negotiation and time to the first result (including the reservation)
+* latency: sequential assignments (p50, p90, p99)
+* throughput: concurrent assignments and websocket messages per second
+* streaming: first item latency and items per second
+* memory: traced memory growth per 1000 assignments (after a gc)
+
+Scenarios are "server" (nodes served by the fake server), "provider" (a node
+provided by this client and routed through the server to its entertainer) and
+"loopback" (the same node, dispatched in process).
+
+    python -m benchmarks.e2e --protocols WEBSOCKET MULTIPLEX --output new.json
+    python -m benchmarks.e2e --output new.json --compare old.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import multiprocessing
+import platform
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import aiohttp
+
+from benchmarks.server import FAKE_PACKAGE, FakeAuth, serve
+
+
+SCENARIOS = {
+    "server": {"client_type": "CLIENT", "package": FAKE_PACKAGE, "function": "echo", "generator": "range", "args": lambda i: (i,), "loopback": False},
+    "provider": {"client_type": "PROVIDER", "package": None, "function": "add", "generator": "count", "args": lambda i: (i, 1), "loopback": False},
+    "loopback": {"client_type": "PROVIDER", "package": None, "function": "add", "generator": "count", "args": lambda i: (i, 1), "loopback": True},
+}
+
+# Metrics where a smaller value is better (for --compare)
+LOWER_IS_BETTER = ("startup", "latency", "first_item", "memory")
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(percent / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_server(port, protocol, transport_kwargs):
+    logging.basicConfig(level=logging.WARN)
+    try:
+        asyncio.get_event_loop().run_until_complete(serve(port=port, protocol=protocol, transport_kwargs=transport_kwargs))
+    except KeyboardInterrupt:
+        pass
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"Fake Arkitekt did not come up on port {port}")
+
+
+async def get_server_stats(port) -> dict:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"http://127.0.0.1:{port}/stats/") as response:
+            return await response.json()
+
+
+async def benchmark(client, scenario: dict, port: int, options: dict, started: float) -> dict:
+    from bergen.models import Node
+
+    results = {}
+    providing = asyncio.ensure_future(client.provider.provide_async()) if scenario["client_type"] == "PROVIDER" else None
+    query = {"package": scenario["package"]} if scenario["package"] else {}
+    args = scenario["args"]
+
+    function = await Node.asyncs.get(interface=scenario["function"], **query)
+    generator = await Node.asyncs.get(interface=scenario["generator"], **query)
+
+    async with function.reserve(loopback=scenario["loopback"]) as reservation:
+        await reservation.assign_async(*args(0))
+        results["startup_first_result_s"] = time.perf_counter() - started
+
+        latencies = []
+        for i in range(options["assignments"]):
+            start = time.perf_counter()
+            await reservation.assign_async(*args(i))
+            latencies.append(time.perf_counter() - start)
+
+        for percent in (50, 90, 99):
+            results[f"latency_p{percent}_ms"] = percentile(latencies, percent) * 1000
+
+        semaphore = asyncio.Semaphore(options["concurrency"])
+
+        async def assign(i):
+            async with semaphore:
+                return await reservation.assign_async(*args(i))
+
+        before = await get_server_stats(port)
+        start = time.perf_counter()
+        await asyncio.gather(*[assign(i) for i in range(options["assignments"])])
+        elapsed = time.perf_counter() - start
+        after = await get_server_stats(port)
+
+        results["throughput_assignments_per_s"] = options["assignments"] / elapsed
+        results["throughput_messages_per_s"] = (after["received"] + after["sent"] - before["received"] - before["sent"]) / elapsed
+
+    async with generator.reserve(loopback=scenario["loopback"]) as reservation:
+        start = time.perf_counter()
+        first_item = None
+        items = 0
+        async for item in reservation.stream(options["stream_items"]):
+            if first_item is None: first_item = time.perf_counter() - start
+            items += 1
+
+        elapsed = time.perf_counter() - start
+        results["stream_first_item_ms"] = first_item * 1000
+        results["stream_items_per_s"] = items / elapsed
+
+    async with function.reserve(loopback=scenario["loopback"]) as reservation:
+        await reservation.assign_async(*args(0))
+
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        for i in range(options["memory_assignments"]):
+            await reservation.assign_async(*args(i))
+        gc.collect()
+        growth = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+
+        results["memory_bytes_per_1000_assignments"] = growth / options["memory_assignments"] * 1000
+
+    results["references"] = client.getReferenceStats()
+
+    if providing: providing.cancel()
+    return results
+
+
+def measure(scenario_name: str, port: int, options: dict) -> dict:
+    """Runs one scenario in a fresh process (registries and the current client are process wide)"""
+    import websockets.client # The transports only reference websockets.client, newer websockets don't import it eagerly
+    from bergen.clients.base import BaseBergen
+    from bergen.config.types import ArkitektConfig
+    from bergen.enums import ClientType
+
+    scenario = SCENARIOS[scenario_name]
+    loop = asyncio.get_event_loop()
+
+    started = time.perf_counter()
+    client = BaseBergen(FakeAuth(port=port), ArkitektConfig(secure=False, host="127.0.0.1", port=port), client_type=ClientType(scenario["client_type"]), log=logging.WARN, trusted_messages=options["trusted"])
+    loop.run_until_complete(client.negotiate_async())
+    negotiated = time.perf_counter() - started
+
+    if scenario["client_type"] == "PROVIDER":
+
+        @client.enable(allow_empty_doc=True)
+        async def add(a: int, b: int) -> int:
+            return a + b
+
+        @client.enable(allow_empty_doc=True)
+        async def count(n: int) -> int:
+            for i in range(n):
+                yield i
+
+    results = loop.run_until_complete(benchmark(client, scenario, port, options, started))
+    results["startup_negotiate_s"] = negotiated
+    loop.run_until_complete(client.disconnect_async())
+    return results
+
+
+def run_scenario(scenario_name: str, protocol: str, options: dict) -> dict:
+    context = multiprocessing.get_context("spawn")
+    transport_kwargs = {"codec": options["codec"]} if options["codec"] else {}
+
+    server = context.Process(target=run_server, args=(options["port"], protocol, transport_kwargs), daemon=True)
+    server.start()
+    try:
+        wait_for_port(options["port"])
+        with context.Pool(1) as pool:
+            return pool.apply(measure, (scenario_name, options["port"], options))
+    finally:
+        server.terminate()
+        server.join()
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout.decode().strip()
+    except Exception:
+        return None
+
+
+def compare(old: dict, new: dict):
+    print(f"{'run':<22}{'metric':<38}{'old':>14}{'new':>14}{'delta':>10}")
+    for run, metrics in new["results"].items():
+        if run not in old["results"]: continue
+        for metric, value in metrics.items():
+            previous = old["results"][run].get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(previous, (int, float)): continue
+
+            delta = (value - previous) / previous * 100 if previous else float("inf")
+            better = (delta < 0) == metric.startswith(LOWER_IS_BETTER)
+            print(f"{run:<22}{metric:<38}{previous:>14.2f}{value:>14.2f}{delta:>+9.1f}%{'' if delta == 0 else (' +' if better else ' -')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bergen end to end against a local fake Arkitekt")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS.keys()), choices=list(SCENARIOS.keys()))
+    parser.add_argument("--protocols", nargs="+", default=["WEBSOCKET", "MULTIPLEX"], choices=["WEBSOCKET", "MULTIPLEX"])
+    parser.add_argument("--codec", default=None, help="Negotiated frame codec (json, msgpack, cbor)")
+    parser.add_argument("--trusted", action="store_true", help="Skip the validation of inbound messages")
+    parser.add_argument("--assignments", type=int, default=500, help="Assignments for the latency and throughput runs")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--stream-items", type=int, default=1000)
+    parser.add_argument("--memory-assignments", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--output", default=None, help="Write the results as json")
+    parser.add_argument("--compare", default=None, help="A previous --output to compare against")
+    args = parser.parse_args()
+
+    options = {"codec": args.codec, "trusted": args.trusted, "assignments": args.assignments, "concurrency": args.concurrency,
+        "stream_items": args.stream_items, "memory_assignments": args.memory_assignments, "port": args.port}
+
+    report = {
+        "commit": get_commit(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "config": {**options, "scenarios": args.scenarios, "protocols": args.protocols},
+        "results": {},
+    }
+
+    for protocol in args.protocols:
+        for scenario_name in args.scenarios:
+            run = f"{scenario_name}/{protocol}"
+            report["results"][run] = run_scenario(scenario_name, protocol, options)
+            print(run, json.dumps(report["results"][run], indent=2), flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+""" A local stand-in for an Arkitekt (and Herre) server
+
+Speaks enough of the protocols to run bergen end to end without a deployment:
+
+* GraphQL on /graphql answers NEGOTIATION_GQL and the node, template and pod
+  queries and mutations (createNode, createTemplate), also in the batch array form
+  and as automatic persisted queries (sha256 hashes of queries sent before)
+* the postman, provider, entertainer and multiplex websockets route reserve,
+  assign, unassign and unreserve messages between callers and providers
+* /stats/ returns the message counters (used by benchmarks.e2e)
+
+Two nodes (package "fakeserver") are served by the server itself, so callers
+can be benchmarked without a provider: "echo" returns its argument and "range"
+yields 0..n-1. Nodes created through createNode are routed to the connected
+provider and its entertainer, like on a real server.
+
+Messages are routed as plain dicts (no validation), and every reply uses the
+codec of the last frame the connection sent.
+
+    python -m benchmarks.server --port 8090
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import logging
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from aiohttp import WSMsgType, web
+
+from bergen.auths.base import BaseAuthBackend
+from bergen.config.types import GrantType, HerreConfig
+from bergen.messages.codecs import codec_classes, decode_frame, get_codec, json_codec
+from bergen.messages.types import *
+from bergen.query import GQL
+
+logger = logging.getLogger(__name__)
+
+
+FAKE_TOKEN = "fake-token"
+FAKE_PACKAGE = "fakeserver"
+CONTEXT = {"roles": [], "scopes": ["provide"], "user": None, "app": None}
+TERMINAL_TYPES = {ASSIGN_RETURN, ASSIGN_DONE, ASSIGN_CRITICAL, ASSIGN_RETRY, ASSIGN_CANCELLED, UNASSIGN_DONE, UNASSIGN_CRITICAL}
+
+
+class FakeAuth(BaseAuthBackend):
+    """ Authenticates against the FakeArkitekt with a static token (no Herre, no token.db)"""
+
+    def __init__(self, host="127.0.0.1", port=8090, token=FAKE_TOKEN) -> None:
+        config = HerreConfig(secure=False, host=host, port=port, client_id="fake", client_secret="fake", authorization_grant_type=GrantType.CLIENT_CREDENTIALS, scopes=["provide"])
+        super().__init__(config)
+        self.static_token = token
+
+    def fetchToken(self, loop=None) -> str:
+        return {"access_token": self.static_token}
+
+    def login(self, force_new=False):
+        self.token = self.fetchToken()
+
+    def refetch(self):
+        self.token = self.fetchToken()
+
+
+def build_port(typename, key, **kwargs):
+    return {"__typename": typename, "key": key, "label": key.capitalize(), "description": None, "required": True, "widget": None, **kwargs}
+
+
+class Channel:
+    """ Somewhere the server can send messages to (a websocket, or one channel of a multiplexed websocket)"""
+
+    def __init__(self, connection: "Connection", name: str = None) -> None:
+        self.connection = connection
+        self.name = name
+
+    async def send(self, message: dict):
+        if self.name: message = {**message, "channel": self.name}
+        await self.connection.send(message)
+
+
+class Connection:
+
+    def __init__(self, ws: web.WebSocketResponse) -> None:
+        self.ws = ws
+        self.codec = json_codec
+
+    def observe(self, frame):
+        if isinstance(frame, str):
+            self.codec = json_codec
+        else:
+            for codec_class in codec_classes.values():
+                if codec_class.tag == frame[:1]: self.codec = get_codec(codec_class.name)
+
+    async def send(self, message: dict):
+        frame = self.codec.encode(message)
+        if isinstance(frame, str):
+            await self.ws.send_str(frame)
+        else:
+            await self.ws.send_bytes(frame)
+
+
+class FakeArkitekt:
+    """ The fake server, use it as an async context manager or with start and stop
+
+    Args:
+        host (str, optional): Defaults to 127.0.0.1.
+        port (int, optional): Defaults to 8090.
+        token (str, optional): The only accepted access token. Defaults to FAKE_TOKEN.
+        protocol (str, optional): WEBSOCKET or MULTIPLEX, negotiated for the postman, provider and entertainer. Defaults to WEBSOCKET.
+        transport_kwargs (dict, optional): Negotiated as settings kwargs for all transports. Defaults to {}.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8090, token=FAKE_TOKEN, protocol="WEBSOCKET", transport_kwargs: dict = None) -> None:
+        self.host = host
+        self.port = port
+        self.token = token
+        self.protocol = protocol
+        self.transport_kwargs = transport_kwargs or {}
+
+        self.ids = itertools.count(1)
+        self.nodes: Dict[int, dict] = {}
+        self.templates: Dict[int, dict] = {}
+        self.pods: Dict[int, dict] = {}
+
+        self.providers: List[Channel] = []
+        self.provisions: Dict[str, dict] = {} # provision reference -> {template, entertainer, active, waiting}
+        self.template_provisions: Dict[int, str] = {}
+        self.reservations: Dict[str, dict] = {} # reservation reference -> {node, provision, postman}
+        self.assignments: Dict[str, Channel] = {} # assign and unassign references -> postman
+        self.assignment_provisions: Dict[str, str] = {}
+
+        self.received = 0
+        self.sent = 0
+        self.graphql_requests = 0
+        self.persisted_queries: Dict[str, str] = {} # sha256 hash -> query
+
+        self.create_node(FAKE_PACKAGE, "echo", "FUNCTION", args=[build_port("IntArgPort", "value")], returns=[build_port("IntReturnPort", "value")])
+        self.create_node(FAKE_PACKAGE, "range", "GENERATOR", args=[build_port("IntArgPort", "n")], returns=[build_port("IntReturnPort", "value")])
+
+        self.app = web.Application()
+        self.app.router.add_post("/graphql", self.graphql)
+        self.app.router.add_get("/auth/", self.check)
+        self.app.router.add_get("/stats/", self.stats)
+        for path in ["postman", "provider", "entertainer", "multiplex"]:
+            self.app.router.add_get(f"/{path}/", self.websocket)
+
+        self.runner = None
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info(f"Fake Arkitekt listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self.runner: await self.runner.cleanup()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    # Models
+
+    def create_node(self, package, interface, type, name=None, description=None, args=None, kwargs=None, returns=None) -> dict:
+        for node in self.nodes.values():
+            if node["package"] == package and node["interface"] == interface: return node
+
+        node = {"id": next(self.ids), "name": name or interface, "description": description, "package": package, "interface": interface, "type": type, "args": args or [], "kwargs": kwargs or [], "returns": returns or []}
+        self.nodes[node["id"]] = node
+        return node
+
+    def get_node(self, id=None, package=None, interface=None, **kwargs) -> Optional[dict]:
+        if id is not None: return self.nodes.get(int(id))
+        for node in self.nodes.values():
+            if node["interface"] == interface and (package is None or node["package"] == package): return node
+        return None
+
+    def is_builtin(self, node: dict) -> bool:
+        return node["package"] == FAKE_PACKAGE
+
+    # Http
+
+    def authorized(self, request: web.Request) -> bool:
+        return request.headers.get("Authorization") == f"Bearer {self.token}" or request.query.get("token") == self.token
+
+    async def check(self, request: web.Request):
+        if not self.authorized(request): return web.Response(status=403)
+        return web.json_response({"client_id": "fake", "name": "Fake Arkitekt"})
+
+    async def stats(self, request: web.Request):
+        return web.json_response({"received": self.received, "sent": self.sent, "reservations": len(self.reservations), "assignments": len(self.assignments), "graphql_requests": self.graphql_requests})
+
+    async def graphql(self, request: web.Request):
+        if not self.authorized(request): return web.Response(status=403)
+
+        body = await request.json()
+        self.graphql_requests += 1
+        if isinstance(body, list):
+            # Batch array form, one result per query
+            return web.json_response([self.execute(item) for item in body])
+
+        return web.json_response(self.execute(body))
+
+    def execute(self, body: dict) -> dict:
+        variables = body.get("variables") or {}
+        persisted = (body.get("extensions") or {}).get("persistedQuery")
+        query = body.get("query")
+
+        if persisted:
+            if query is None:
+                query = self.persisted_queries.get(persisted["sha256Hash"])
+                if query is None: return {"data": None, "errors": [{"message": "PersistedQueryNotFound", "extensions": {"code": "PERSISTED_QUERY_NOT_FOUND"}}]}
+            elif hashlib.sha256(query.encode("utf-8")).hexdigest() != persisted["sha256Hash"]:
+                return {"data": None, "errors": [{"message": "provided sha does not match query"}]}
+            else:
+                self.persisted_queries[persisted["sha256Hash"]] = query
+
+        field = GQL(query).firstchild
+
+        try:
+            result = self.resolve(field, variables)
+        except Exception as e:
+            return {"data": None, "errors": [{"message": str(e)}]}
+
+        return {"data": {field: result}}
+
+    def resolve(self, field: str, variables: dict):
+        if field == "negotiate":
+            settings = {"type": self.protocol, "kwargs": self.transport_kwargs}
+            return {"timestamp": time.time(), "wards": [], "models": [], "postman": settings, "provider": settings, "host": settings}
+
+        if field == "node":
+            node = self.get_node(**variables)
+            if node is None: raise Exception(f"Node {variables} does not exist")
+            return node
+
+        if field == "nodes":
+            return [node for node in self.nodes.values() if variables.get("name") in (None, node["name"])]
+
+        if field == "createNode":
+            return self.create_node(variables.get("package", "provider"), variables["interface"], variables.get("type") or "FUNCTION", name=variables.get("name"), description=variables.get("description"),
+                args=[build_port(item["type"], item["key"]) for item in variables["args"]],
+                kwargs=[build_port(item["type"], item["key"], required=False) for item in variables["kwargs"]],
+                returns=[build_port(item["type"], item["key"]) for item in variables["returns"]])
+
+        if field == "createTemplate":
+            for template in self.templates.values():
+                if template["node"]["id"] == int(variables["node"]): return template
+
+            template = {"id": next(self.ids), "node": self.nodes[int(variables["node"])], "params": variables.get("params"), "provider": {"name": "fake"}, "channel": None}
+            self.templates[template["id"]] = template
+            return template
+
+        if field == "template":
+            return self.templates[int(variables["id"])]
+
+        if field == "pod":
+            return self.pods[int(variables["id"])]
+
+        raise Exception(f"The Fake Arkitekt cannot resolve {field}")
+
+    # Websockets
+
+    async def websocket(self, request: web.Request):
+        if not self.authorized(request): return web.Response(status=403)
+
+        ws = web.WebSocketResponse(autoping=True, max_msg_size=0)
+        await ws.prepare(request)
+        connection = Connection(ws)
+        path = request.path.strip("/")
+        channels = {}
+
+        def channel_for(name):
+            if name not in channels:
+                channels[name] = Channel(connection, name if path == "multiplex" else None)
+                if name == "provider": self.providers.append(channels[name])
+            return channels[name]
+
+        # Providers only listen until they get a provide request, so they are known from the connection on
+        if path in ("provider", "multiplex"): channel_for("provider")
+
+        try:
+            async for frame in ws:
+                if frame.type not in (WSMsgType.TEXT, WSMsgType.BINARY): continue
+                connection.observe(frame.data)
+                payload = decode_frame(frame.data)
+                items = payload["data"]["messages"] if payload.get("meta", {}).get("type") == BATCH else [payload]
+
+                for item in items:
+                    self.received += 1
+                    channel = channel_for(item.pop("channel", path))
+                    await self.on_message(channel, item)
+        finally:
+            for name, channel in channels.items():
+                if channel in self.providers: self.providers.remove(channel)
+
+        return ws
+
+    async def send(self, channel: Optional[Channel], type: str, reference: str, data: dict, **meta):
+        if channel is None: return
+        self.sent += 1
+        await channel.send({"data": data, "meta": {"type": type, "reference": reference, "extensions": {}, **meta}})
+
+    async def on_message(self, channel: Channel, message: dict):
+        type = message["meta"]["type"]
+        reference = message["meta"]["reference"]
+        data = message["data"]
+
+        if type in (RESERVE, BOUNCED_RESERVE): await self.reserve(channel, reference, data)
+        elif type in (UNRESERVE, BOUNCED_UNRESERVE): await self.unreserve(channel, reference, data)
+        elif type in (ASSIGN, BOUNCED_ASSIGN): await self.assign(channel, reference, data, message["meta"].get("extensions") or {})
+        elif type in (UNASSIGN, BOUNCED_UNASSIGN): await self.unassign(channel, reference, data)
+        elif type == PROVIDE_DONE: await self.provided(channel, reference)
+        elif type == PROVIDE_CRITICAL: await self.provide_failed(reference, data)
+        elif type.startswith("assign_") or type.startswith("unassign_"):
+            # Results from the entertainer are relayed to the caller
+            caller = self.assignments.pop(reference, None) if type in TERMINAL_TYPES else self.assignments.get(reference)
+            await self.send(caller, type, reference, data)
+        else:
+            logger.debug(f"Ignoring {type}")
+
+    # Postman
+
+    async def reserve(self, postman: Channel, reference: str, data: dict):
+        node = self.get_node(id=data.get("node")) if data.get("node") else self.templates[int(data["template"])]["node"]
+        reservation = {"node": node, "provision": None, "postman": postman}
+        self.reservations[reference] = reservation
+
+        if node is None:
+            return await self.send(postman, RESERVE_CRITICAL, reference, {"message": f"Node {data.get('node')} does not exist", "type": "NodeDoesNotExist"})
+
+        if self.is_builtin(node):
+            reservation["provision"] = "fakeserver"
+            return await self.send(postman, RESERVE_TRANSITION, reference, {"state": "ACTIVE", "message": "Served by the Fake Arkitekt"})
+
+        template = next((template for template in self.templates.values() if template["node"]["id"] == node["id"]), None)
+        if template is None or not self.providers:
+            return await self.send(postman, RESERVE_CRITICAL, reference, {"message": f"No provider for Node {node['id']}", "type": "NoProvider"})
+
+        provision_reference = self.template_provisions.get(template["id"])
+        if provision_reference is None:
+            provision_reference = str(uuid.uuid4())
+            self.template_provisions[template["id"]] = provision_reference
+            self.provisions[provision_reference] = {"template": template, "entertainer": None, "active": False, "waiting": []}
+            await self.send(self.providers[-1], BOUNCED_PROVIDE, provision_reference, {"node": str(node["id"]), "template": str(template["id"]), "params": None}, context=CONTEXT)
+
+        provision = self.provisions[provision_reference]
+        reservation["provision"] = provision_reference
+        if provision["active"]:
+            await self.send(postman, RESERVE_TRANSITION, reference, {"state": "ACTIVE", "message": None})
+        else:
+            provision["waiting"].append(reference)
+            await self.send(postman, RESERVE_TRANSITION, reference, {"state": "PROVIDING", "message": None})
+
+    async def unreserve(self, postman: Channel, reference: str, data: dict):
+        reservation = self.reservations.pop(data["reservation"], None)
+        if reservation:
+            await self.send(reservation["postman"], RESERVE_TRANSITION, data["reservation"], {"state": "CANCELLED", "message": "Unreserved"})
+        await self.send(postman, UNRESERVE_DONE, reference, {"reservation": data["reservation"]})
+
+    async def assign(self, postman: Channel, reference: str, data: dict, extensions: dict):
+        reservation = self.reservations.get(data["reservation"])
+        if reservation is None:
+            return await self.send(postman, ASSIGN_CRITICAL, reference, {"message": f"Reservation {data['reservation']} does not exist", "type": "ReservationDoesNotExist"})
+
+        if reservation["provision"] == "fakeserver":
+            args = data.get("args") or []
+            if reservation["node"]["interface"] == "echo":
+                await self.send(postman, ASSIGN_RETURN, reference, {"returns": args[:1]})
+            else:
+                for value in range(int(args[0]) if args else 0):
+                    await self.send(postman, ASSIGN_YIELD, reference, {"returns": [value]})
+                await self.send(postman, ASSIGN_DONE, reference, {"ok": True})
+            return
+
+        self.assignments[reference] = postman
+        self.assignment_provisions[reference] = reservation["provision"]
+        if extensions.get("loopback"): return # Already running in the callers process, this is bookkeeping only
+
+        provision = self.provisions[reservation["provision"]]
+        await self.send(provision["entertainer"], BOUNCED_FORWARDED_ASSIGN, reference, {"reservation": data["reservation"], "provision": reservation["provision"], "args": data.get("args"), "kwargs": data.get("kwargs")},
+            context=CONTEXT, extensions={"deadline": extensions.get("deadline")})
+
+    async def unassign(self, postman: Channel, reference: str, data: dict):
+        assignation = data["assignation"]
+        provision = self.provisions.get(self.assignment_provisions.pop(assignation, None))
+
+        if provision is None or assignation not in self.assignments:
+            # Assignments of the server are done before they could be cancelled
+            return await self.send(postman, UNASSIGN_DONE, reference, {"assignation": assignation})
+
+        self.assignments[reference] = postman
+        await self.send(provision["entertainer"], BOUNCED_UNASSIGN, reference, {"assignation": assignation}, context=CONTEXT)
+
+    # Entertainer
+
+    async def provided(self, entertainer: Channel, reference: str):
+        provision = self.provisions[reference]
+        provision["entertainer"] = entertainer
+        provision["active"] = True
+
+        pod = {"id": next(self.ids), "name": f"pod-{reference}", "status": "ACTIVE", "unique": reference, "channel": None, "template": provision["template"]}
+        self.pods[pod["id"]] = pod
+
+        for reservation_reference in provision["waiting"]:
+            reservation = self.reservations.get(reservation_reference)
+            if reservation: await self.send(reservation["postman"], RESERVE_TRANSITION, reservation_reference, {"state": "ACTIVE", "message": None})
+        provision["waiting"] = []
+
+    async def provide_failed(self, reference: str, data: dict):
+        provision = self.provisions.pop(reference, None)
+        if provision is None: return
+        self.template_provisions.pop(provision["template"]["id"], None)
+
+        for reservation_reference in provision["waiting"]:
+            reservation = self.reservations.get(reservation_reference)
+            if reservation: await self.send(reservation["postman"], RESERVE_CRITICAL, reservation_reference, {"message": data.get("message"), "type": data.get("type")})
+
+
+async def serve(**kwargs):
+    async with FakeArkitekt(**kwargs) as server:
+        print(f"Fake Arkitekt listening on {server.host}:{server.port} (token {server.token})", flush=True)
+        while True:
+            await asyncio.sleep(3600)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for an Arkitekt server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--token", default=FAKE_TOKEN)
+    parser.add_argument("--protocol", default="WEBSOCKET", choices=["WEBSOCKET", "MULTIPLEX"])
+    args = parser.parse_args()
+
+    try:
+        asyncio.get_event_loop().run_until_complete(serve(host=args.host, port=args.port, token=args.token, protocol=args.protocol))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -10,11 +10,21 @@ from bergen.handlers import *
 from bergen.console import console
 from bergen.utils import *
 from bergen.legacy.utils import create_task
+from bergen.contracts.exceptions import AssignmentTimeoutError
+import time
 
 
 class Actor:
     expandInputs = True
+    lazyInputs = False # Models are passed as ModelProxies that are fetched on first use (threaded actors only)
     shrinkOutputs = True
+    threaded = False # The assign function runs in a thread, outside of the loop
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # On the loop a proxy can't fetch itself on attribute access, so every use would need an explicit await
+        if cls.lazyInputs and not cls.threaded:
+            raise TypeError(f"{cls.__name__}: lazy inputs are only supported for threaded (sync) actors, async actors get their models expanded")
 
     def __init__(self, connector: Connector, queue:asyncio.Queue = None, loop=None) -> None:
         self.queue = queue or asyncio.Queue()
@@ -140,16 +150,46 @@ class Actor:
             console.log(f"[green] Assignation {task} Succeeded and is now Done")
 
 
+    async def assign_before(self, deadline: float, assign_handler: AssignHandler, args, kwargs):
+        """Runs _assign and aborts it with an AssignmentTimeoutError once the deadline passed
+
+        Exceptions of the node itself (a TimeoutError too) are raised unchanged."""
+        task = create_task(self._assign(assign_handler, args, kwargs))
+        try:
+            done, _ = await asyncio.wait({task}, timeout=deadline - time.time())
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+
+        if not done:
+            task.cancel()
+            await asyncio.wait({task})
+            raise AssignmentTimeoutError("Assignment exceeded its deadline")
+
+        return task.result()
+
     async def on_assign(self, assign: BouncedForwardedAssignMessage):
-        assign_handler = AssignHandler(message=assign, connection=self.connector)
+        loopback_queue = self.connector.get_loopback_queue(assign.meta.reference)
+        assign_handler = LoopbackAssignHandler(assign, self.connector, loopback_queue) if loopback_queue else AssignHandler(message=assign, connection=self.connector)
         self.assign_handler_map[assign.meta.reference] = assign_handler
 
         await assign_handler.log(f"Assignment received", level=DebugLevel.INFO)
+        deadline = getattr(assign.meta.extensions, "deadline", None)
         try:
             try:
-                args, kwargs = await expandInputs(node=self.template.node, args=assign.data.args, kwargs=assign.data.kwargs) if self.expandInputs else (assign.data.args, assign.data.kwargs)
+                # Nobody waits for the result after the deadline, so expired work is skipped and running work aborted
+                if deadline is not None and deadline <= time.time(): raise AssignmentTimeoutError("Assignment exceeded its deadline")
+
+                args, kwargs = await expandInputs(node=self.template.node, args=assign.data.args, kwargs=assign.data.kwargs, lazy=self.lazyInputs) if self.expandInputs and not assign_handler.loopback else (assign.data.args, assign.data.kwargs)
            
-                await self._assign(assign_handler, args, kwargs) # We dont do all of the handling here, as we really want to have a generic class for Generators and Normal Functions
+                if deadline is None:
+                    await self._assign(assign_handler, args, kwargs) # We dont do all of the handling here, as we really want to have a generic class for Generators and Normal Functions
+                else:
+                    await self.assign_before(deadline, assign_handler, args, kwargs)
+
+            except AssignmentTimeoutError as e:
+                await assign_handler.log(f"Assignment exceeded its deadline", level=LogLevel.WARN)
+                await assign_handler.pass_exception(e)
             
             except Exception as e:
                 # As broad as possible to send further
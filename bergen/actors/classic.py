@@ -21,7 +21,7 @@ class ClassicFuncActor(ClassicActor):
     async def _assign(self, assign_handler: AssignHandler, args, kwargs):
         result = await self.assign(assign_handler, args, kwargs)
         try:
-            shrinked_returns = await shrinkOutputs(self.template.node, result) if self.shrinkOutputs else result
+            shrinked_returns = await shrinkOutputs(self.template.node, result) if self.shrinkOutputs and not assign_handler.loopback else result
             await assign_handler.pass_return(shrinked_returns)
         except Exception as e:
             await assign_handler.pass_exception(e)
@@ -37,7 +37,7 @@ class ClassicGenActor(ClassicActor):
 
     async def _assign(self, assign_handler: AssignHandler, args, kwargs):
         async for result in self.assign(assign_handler, args, kwargs):
-            lastresult = await shrinkOutputs(self.template.node, result) if self.shrinkOutputs else result
+            lastresult = await shrinkOutputs(self.template.node, result) if self.shrinkOutputs and not assign_handler.loopback else result
             await assign_handler.pass_yield(lastresult)
 
         await assign_handler.pass_done()
@@ -28,7 +28,7 @@ class FunctionalFuncActor(FunctionalActor):
         result = await self.assign(*args, **kwargs)
 
         try:
-            shrinked_returns = await shrinkOutputs(self.template.node, result) if self.shrinkOutputs else result
+            shrinked_returns = await shrinkOutputs(self.template.node, result) if self.shrinkOutputs and not assign_handler.loopback else result
             await assign_handler.pass_return(shrinked_returns)
         except Exception as e:
             await assign_handler.pass_exception(e)
@@ -49,7 +49,7 @@ class FunctionalGenActor(FunctionalActor):
 
         try:
             async for result in self.assign(*args, **kwargs):
-                lastresult = await shrinkOutputs(self.template.node, result) if self.shrinkOutputs else result
+                lastresult = await shrinkOutputs(self.template.node, result) if self.shrinkOutputs and not assign_handler.loopback else result
                 await assign_handler.pass_yield(lastresult)
 
             await assign_handler.pass_done()
@@ -59,6 +59,7 @@ class FunctionalGenActor(FunctionalActor):
 
 class FunctionalThreadedFuncActor(FunctionalActor):
     nworkers = 5
+    threaded = True
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
@@ -86,12 +87,12 @@ class FunctionalThreadedFuncActor(FunctionalActor):
 
 
 
-    def _assign_threaded(self, args, kwargs, queue, context):
+    def _assign_threaded(self, args, kwargs, queue, context, shrink=True):
         queue_context.set(queue)
         bounce_context.set(context)
         try:
             result = self.assign(*args, **kwargs)
-            lastresult = shrinkOutputsSync(self.template.node, result) if self.shrinkOutputs else result
+            lastresult = shrinkOutputsSync(self.template.node, result) if shrink else result
             queue.put(("return", lastresult))
             queue.join()
 
@@ -108,7 +109,7 @@ class FunctionalThreadedFuncActor(FunctionalActor):
         queue = janus.Queue()
 
         try:
-            threadedfut = self.loop.run_in_executor(self.threadpool, self._assign_threaded, args, kwargs, queue.sync_q, assign_handler.message.meta.context)
+            threadedfut = self.loop.run_in_executor(self.threadpool, self._assign_threaded, args, kwargs, queue.sync_q, assign_handler.message.meta.context, self.shrinkOutputs and not assign_handler.loopback)
             queuefut =  self.iterate_queue(queue.async_q, assign_handler, self.provide_handler)
 
             try:
@@ -135,6 +136,7 @@ class FunctionalThreadedFuncActor(FunctionalActor):
 
 class FunctionalThreadedGenActor(FunctionalActor):
     nworkers = 5
+    threaded = True
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
@@ -144,7 +146,7 @@ class FunctionalThreadedGenActor(FunctionalActor):
         raise NotImplementedError("")  
 
 
-    def _assign_threaded(self, args, kwargs, queue, event, context):
+    def _assign_threaded(self, args, kwargs, queue, event, context, shrink=True):
         queue_context.set(queue)
         bounce_context.set(context)
         try:
@@ -157,7 +159,7 @@ class FunctionalThreadedGenActor(FunctionalActor):
                     queue.put(("cancelled","Happy doneness"))
                     return
                     
-                lastresult = shrinkOutputsSync(self.template.node, result) if self.shrinkOutputs else result
+                lastresult = shrinkOutputsSync(self.template.node, result) if shrink else result
                 queue.put(("yield", lastresult))
                 queue.join()
         except Exception as e:
@@ -198,7 +200,7 @@ class FunctionalThreadedGenActor(FunctionalActor):
         event = threading.Event()
 
         try:
-            threadedfut = self.loop.run_in_executor(self.threadpool, self._assign_threaded, args, kwargs, queue.sync_q, event, assign_handler.message.meta.context)
+            threadedfut = self.loop.run_in_executor(self.threadpool, self._assign_threaded, args, kwargs, queue.sync_q, event, assign_handler.message.meta.context, self.shrinkOutputs and not assign_handler.loopback)
             queuefut =  self.iterate_queue(queue.async_q, assign_handler, self.provide_handler)
 
             try:
@@ -12,6 +12,8 @@ from bergen.logging import setLogging
 from bergen.auths.base import BaseAuthBackend
 from bergen.wards.base import BaseWard
 from bergen.postmans.base import BasePostman
+from bergen.transports.queues import BackpressurePolicy, QueueFactory
+from bergen.clients.runtime import ClientRuntime, SyncInLoopError, get_running_loop_or_none
 import logging
 
 from bergen.console import console
@@ -41,6 +43,18 @@ class BaseBergen:
             log_stream=False,
             auto_connect=False,
             capture_exceptions=False,
+            trusted_messages=False,
+            max_queue_size=0,
+            backpressure: BackpressurePolicy = BackpressurePolicy.BLOCK,
+            reservation_idle_timeout=30,
+            assign_cache_size=1024,
+            assign_cache_ttl=None,
+            assign_cache_path=None,
+            model_cache_size=0,
+            model_cache_ttl=60,
+            ward_batch_size=None,
+            ward_batch_delay=0,
+            persisted_queries=False,
             **kwargs) -> None:
         
         
@@ -59,6 +73,22 @@ class BaseBergen:
         self.config = config
         self.client_type = client_type
         self.capture_exceptions=False
+        self.trusted_messages = trusted_messages # Skips full validation of messages coming from the server
+        self.queue_factory = QueueFactory(max_queue_size, backpressure) # Bounds all message queues of this client
+
+        from bergen.contracts.pool import ReservationPool # Contracts import the client registry
+        self.reservation_pool = ReservationPool(idle_timeout=reservation_idle_timeout) # Keeps Reservations of Node.assign and Node.stream warm
+
+        from bergen.contracts.cache import AssignCache
+        self.assign_cache = AssignCache(maxsize=assign_cache_size, ttl=assign_cache_ttl, path=assign_cache_path) # Results of Nodes flagged deterministic
+        self.node_flags: Dict[str, dict] = {} # Flags of Nodes by id (see NodeExtender.flag)
+        self.model_cache_size = model_cache_size # Of the identity map of every Ward, off by default as cached gets can be up to model_cache_ttl seconds stale
+        self.model_cache_ttl = model_cache_ttl
+        self.ward_batch_size = ward_batch_size # Batch up to this many concurrent queries per Ward that can send batches (None or 1 sends every query on its own)
+        self.ward_batch_delay = ward_batch_delay # Seconds a batch waits for more queries, 0 batches the queries of one loop tick
+        from bergen.wards.pool import SessionPool
+        self.session_pool = SessionPool(default=config.http) # HTTP sessions the Wards share per server, tuned through config.http
+        self.persisted_queries = persisted_queries # Wards send the hash of a query before its text (automatic persisted queries)
 
         self.registered_hooks = Hooks()
 
@@ -73,6 +103,8 @@ class BaseBergen:
 
         self._provider = None
         self._entertainer = None
+        self._multiplexer = None
+        self._multiplexer_kwargs = {} # Settings the Multiplexed Websocket was created with
         self.negotiate_additionals = {}
 
         try:
@@ -82,6 +114,9 @@ class BaseBergen:
             self.loop = asyncio.new_event_loop()
             asyncio.set_event_loop(self.loop)
 
+        # The synchronous API runs the client on a loop in a background thread (started by negotiate)
+        self.runtime = ClientRuntime()
+
         if auto_connect:
             self.negotiate()
 
@@ -123,6 +158,10 @@ class BaseBergen:
                 logger.error("You cannot use the Websocket Postman without installing websockets")
                 raise e
 
+        elif settings.type == PostmanProtocol.MULTIPLEX:
+            from bergen.postmans.multiplex import MultiplexedPostman
+            postman = MultiplexedPostman(self, **settings.kwargs, hooks=self.registered_hooks)
+
         else:
             raise Exception(f"Postman couldn't be configured. No Postman for type {settings.type}")
 
@@ -139,6 +178,10 @@ class BaseBergen:
                 logger.error("You cannot use the Websocket Provider without installing websockets")
                 raise e
 
+        elif settings.type == ProviderProtocol.MULTIPLEX:
+            from bergen.provider.multiplex import MultiplexedProvider
+            provider = MultiplexedProvider(self, **settings.kwargs, hooks=self.registered_hooks)
+
         else:
             raise Exception(f"Provider couldn't be configured. No Provider for type {settings.type}")
 
@@ -155,14 +198,43 @@ class BaseBergen:
                 logger.error("You cannot use the Websocket Entertainer without installing websockets")
                 raise e
 
+        elif settings.type == HostProtocol.MULTIPLEX:
+            from bergen.entertainer.multiplex import MultiplexedEntertainer
+            provider = MultiplexedEntertainer(self, **settings.kwargs, hooks=self.registered_hooks)
+
         else:
             raise Exception(f"Entertainer couldn't be configured. No Entertainer for type {settings.type}")
 
         return provider
+
+    def getMultiplexer(self, **kwargs):
+        """Returns the shared multiplexed Websocket of this client
+
+        The first channel that asks for it creates it with its settings kwargs,
+        all other channels reuse the same connection. As it is already connected by
+        then, settings of later channels that differ are ignored with a warning."""
+        if self._multiplexer is None:
+            try:
+                from bergen.transports.multiplex import MultiplexedWebsocket
+                self._multiplexer = MultiplexedWebsocket(self, **kwargs)
+                self._multiplexer_kwargs = kwargs
+            except ImportError as e:
+                logger.error("You cannot use the Multiplexed Websocket without installing websockets")
+                raise e
+
+        else:
+            conflicts = {key: value for key, value in kwargs.items() if key not in self._multiplexer_kwargs or self._multiplexer_kwargs[key] != value}
+            if conflicts:
+                logger.warning(f"The Multiplexed Websocket was already created with {self._multiplexer_kwargs}, ignoring the differing settings {conflicts}")
+
+        return self._multiplexer
     
     async def negotiate_async(self):
         from bergen.schemas.arkitekt.mutations.negotiate import NEGOTIATION_GQL
 
+        # Connections, queues and futures of this client belong to the loop it negotiated on
+        self.loop = get_running_loop_or_none() or self.loop
+
         # Instantiate our Main Ward, this is only for Nodes and Pods
         self.main_ward = MainWard(self)
         await self.main_ward.configure()
@@ -254,6 +326,8 @@ class BaseBergen:
 
 
     async def disconnect_async(self, client_type=None):
+        await self.reservation_pool.close()
+        await self.assign_cache.close()
         await self.main_ward.disconnect()
 
         if self.postman: await self.postman.disconnect()
@@ -262,11 +336,28 @@ class BaseBergen:
 
         ward_registry = get_ward_registry()
         await asyncio.gather(*[ward.disconnect() for ward in ward_registry.wards])
+        await self.session_pool.close()
         print("Sucessfulyl disconnected")
 
+    def run(self, coro):
+        """Runs a coroutine on the loop of this client and blocks until its result
+
+        This is what the synchronous API builds on, it can be called from any thread
+        except the one running the client loop (use the async API there).
+        """
+        if get_running_loop_or_none() is self.loop:
+            coro.close()
+            raise SyncInLoopError("You cannot call the synchronous API from within the loop of the client, please use the async API (e.g. Node.asyncs, assign_async)")
+
+        if self.loop.is_running():
+            return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+        return self.loop.run_until_complete(coro)
+
     def negotiate(self):
-        assert not self.loop.is_running(), "You cannot negotiate with an already running Event loop, please ue negotiate_async"
-        self.loop.run_until_complete(self.negotiate_async())
+        assert get_running_loop_or_none() is None, "You cannot negotiate with an already running Event loop, please ue negotiate_async"
+        self.loop = self.runtime.start()
+        self.run(self.negotiate_async())
 
 
     def getUser(self) -> User:
@@ -286,6 +377,82 @@ class BaseBergen:
         return self._extensions[service]
     
         
+    def getQueueStats(self) -> Dict[str, dict]:
+        """Returns the live depth counters of all message queues of this client
+
+        Returns:
+            Dict[str, dict]: The counters (queues, depth, maxsize, high_watermark, dropped, failed) by queue name
+        """
+        return self.queue_factory.stats()
+
+    def getReferenceStats(self) -> dict:
+        """Returns the number of Assignments and Reservations the postman currently tracks
+
+        Returns:
+            dict: The counters (assignments, reservations, evicted by reason)
+        """
+        return self.postman.getReferenceStats()
+
+    def getReservationPoolStats(self) -> dict:
+        """Returns the counters of the Reservation pool used by Node.assign and Node.stream
+
+        Returns:
+            dict: The counters (reservations, leased, hits, misses, expired, discarded)
+        """
+        return self.reservation_pool.stats()
+
+    def getAssignCacheStats(self) -> dict:
+        """Returns the counters of the Assign Cache
+
+        Returns:
+            dict: The counters (entries, inflight, hits, disk_hits, misses, collapsed, evicted, expired)
+        """
+        return self.assign_cache.stats()
+
+    def getQueryCacheStats(self) -> dict:
+        """Returns the counters of the process wide cache of parsed queries
+
+        Returns:
+            dict: The counters (entries, hits, misses) of matches, documents and typed queries
+        """
+        from bergen.query import get_query_cache
+        return get_query_cache().stats()
+
+    def getWardBatchStats(self) -> dict:
+        """Returns the counters of the query batching of the Wards that can send batches (empty if batching is off)
+
+        Returns:
+            dict: The counters (pending, queries, batches, largest) by Ward
+        """
+        wards = {"main": self.main_ward, **get_ward_registry().distinctWardMap}
+        return {distinct: ward.batcher.stats() for distinct, ward in wards.items() if ward.batcher is not None}
+
+    def getSessionPoolStats(self) -> dict:
+        """Returns the counters of the HTTP sessions the Wards share
+
+        Returns:
+            dict: The limits and counters (acquired, requests, connections, reused, dns_hits, dns_misses) by server
+        """
+        return self.session_pool.stats()
+
+    def getPersistedQueryStats(self) -> dict:
+        """Returns the counters of the persisted queries of the Wards
+
+        Returns:
+            dict: The counters (enabled, registered, hashed, not_found, reregistered) by Ward
+        """
+        wards = {"main": self.main_ward, **get_ward_registry().distinctWardMap}
+        return {distinct: ward.persisted.stats() for distinct, ward in wards.items()}
+
+    def getModelCacheStats(self) -> dict:
+        """Returns the counters of the model caches of the Wards
+
+        Returns:
+            dict: The counters (entries, hits, misses, evicted, expired, invalidated) by Ward
+        """
+        wards = {"main": self.main_ward, **get_ward_registry().distinctWardMap}
+        return {distinct: ward.model_cache.stats() for distinct, ward in wards.items()}
+
     def getWard(self) -> BaseWard:
         return self.main_ward
 
@@ -321,7 +488,8 @@ class BaseBergen:
 
 
     def disconnect(self):
-        self.loop.run_until_complete(self.disconnect_async())
+        self.run(self.disconnect_async())
+        self.runtime.stop()
 
 
     def __enter__(self):
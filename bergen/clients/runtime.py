@@ -0,0 +1,83 @@
+from typing import Awaitable, Optional
+import asyncio
+import concurrent.futures
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class SyncInLoopError(RuntimeError):
+    pass
+
+
+def get_running_loop_or_none() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    except AttributeError:
+        # Python 3.6 has no get_running_loop
+        loop = asyncio.get_event_loop()
+        return loop if loop.is_running() else None
+
+
+class ClientRuntime:
+    """ An event loop running forever in a daemon thread
+
+    The synchronous API of a client submits its coroutines to this loop, so any number of
+    threads can block on results at the same time while the connections of the client
+    (postman, provider, entertainer) are served by the one loop in the background.
+    """
+
+    def __init__(self, name: str = "bergen-runtime") -> None:
+        self.name = name
+        self.loop: asyncio.AbstractEventLoop = None
+        self.thread: threading.Thread = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        if self.is_running: return self.loop
+
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(started.set)
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name=self.name, daemon=True)
+        self.thread.start()
+        started.wait()
+        logger.info(f"Started {self.name} loop thread")
+        return self.loop
+
+    def submit(self, coro: Awaitable) -> concurrent.futures.Future:
+        assert self.is_running, "The Runtime was not started"
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self, timeout: float = 5):
+        if not self.is_running: return
+
+        all_tasks = getattr(asyncio, "all_tasks", None) or asyncio.Task.all_tasks # Python 3.6
+        current_task = getattr(asyncio, "current_task", None) or asyncio.Task.current_task
+
+        async def shutdown():
+            tasks = [task for task in all_tasks(self.loop) if task is not current_task(self.loop)]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            self.submit(shutdown()).result(timeout)
+        except concurrent.futures.TimeoutError:
+            logger.warning(f"{self.name} tasks did not finish within {timeout} seconds")
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+        self.loop.close()
+        self.thread = None
@@ -3,11 +3,22 @@ from typing import List, Optional
 from pydantic.main import BaseModel
 
 
+class HttpConfig(BaseModel):
+    """The connection pool of the HTTP session the Wards share per server"""
+    limit: int = 100 # Connections of a session, 0 is unlimited
+    limit_per_host: int = 0
+    keepalive_timeout: float = 15 # Seconds an idle connection is kept open
+    dns_cache_ttl: Optional[int] = 10 # Seconds resolved hosts are cached, None caches them forever
+    timeout: Optional[float] = 300 # Seconds a request may take in total, None waits forever
+    connect_timeout: Optional[float] = None
+
+
 class ArkitektConfig(BaseModel):
     secure: bool
     host: str
     port: int
     internal: bool = False
+    http: HttpConfig = HttpConfig()
 
     def __str__(self) -> str:
         return f"{'Internal' if self.internal else 'Public'} {'Secure' if self.secure else 'Insecure'} Connection to Arkitekt on {self.host}:{self.port}"
@@ -1 +1,2 @@
-from .reservation import Reservation
\ No newline at end of file
+from .reservation import Reservation
+from .group import ReservationGroup
\ No newline at end of file
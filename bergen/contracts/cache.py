@@ -0,0 +1,164 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import shelve
+import time
+
+logger = logging.getLogger(__name__)
+
+
+MISSING = object()
+
+
+class AssignCache:
+    """ Caches the results of deterministic Nodes
+
+    Results are keyed by the node id and the shrinked args and kwargs of the assignment.
+    The in memory tier is an LRU of maxsize entries, the optional disk tier (a shelve at path)
+    keeps results across runs and is only read on a memory miss. The shelve stays open while
+    the cache is used and is only accessed from one worker thread, so disk I/O never blocks
+    the loop. Entries expire ttl seconds after they were stored (None keeps them until they
+    are evicted). Identical calls that arrive while the first one is still running wait for
+    its result instead of assigning again (single-flight), failed calls are never cached.
+    Every caller gets its own deep copy of the result, mutating it doesn't change the cache.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, path: Optional[str] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.entries: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.executor = ThreadPoolExecutor(max_workers=1) if path else None # The shelve is not thread safe
+        self.db: Optional[shelve.Shelf] = None
+        self.writes = set()
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "collapsed": 0, "evicted": 0, "expired": 0}
+
+    @staticmethod
+    def get_key(node_id, args, kwargs, *variant) -> str:
+        payload = json.dumps([node_id, args, kwargs, variant], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def is_expired(self, expires: Optional[float]) -> bool:
+        return expires is not None and expires <= time.time()
+
+    def get(self, key: str) -> Any:
+        """Returns the result cached in memory or MISSING"""
+        if key in self.entries:
+            expires, value = self.entries[key]
+            if not self.is_expired(expires):
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return value
+
+            del self.entries[key]
+            self.counters["expired"] += 1
+
+        return MISSING
+
+    def open_db(self) -> shelve.Shelf:
+        # Only called on the worker thread
+        if self.db is None: self.db = shelve.open(self.path)
+        return self.db
+
+    def read_disk(self, key: str):
+        try:
+            return self.open_db().get(key)
+        except Exception:
+            logger.exception(f"Could not read the Assign Cache at {self.path}")
+            return None
+
+    def write_disk(self, key: str, entry: Tuple[Optional[float], Any]):
+        try:
+            db = self.open_db()
+            db[key] = entry
+            db.sync()
+        except Exception:
+            logger.exception(f"Could not write to the Assign Cache at {self.path}")
+
+    async def get_async(self, key: str) -> Any:
+        """Returns the cached result (from memory or disk) or MISSING"""
+        value = self.get(key)
+        if value is not MISSING or not self.path:
+            return value
+
+        entry = await asyncio.get_event_loop().run_in_executor(self.executor, self.read_disk, key)
+        if entry is not None and not self.is_expired(entry[0]):
+            self.counters["disk_hits"] += 1
+            self.remember(key, entry)
+            return entry[1]
+
+        return MISSING
+
+    def remember(self, key: str, entry: Tuple[Optional[float], Any]):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.counters["evicted"] += 1
+
+    def set(self, key: str, value: Any):
+        entry = (time.time() + self.ttl if self.ttl is not None else None, value)
+        self.remember(key, entry)
+
+        if self.path:
+            # Written in the background, flush waits for the pending writes
+            write = asyncio.get_event_loop().run_in_executor(self.executor, self.write_disk, key, entry)
+            self.writes.add(write)
+            write.add_done_callback(self.writes.discard)
+
+    def finish(self, key: str, task: asyncio.Future):
+        self.inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self.set(key, task.result())
+
+    async def get_or_run(self, key: str, assign: Callable[[], Awaitable]) -> Any:
+        """Returns a copy of the cached result for key, or runs assign (once for all concurrent callers) and caches its result"""
+        value = await self.get_async(key)
+        if value is not MISSING:
+            return copy.deepcopy(value)
+
+        task = self.inflight.get(key)
+        if task is None:
+            self.counters["misses"] += 1
+            task = asyncio.ensure_future(assign())
+            task.add_done_callback(lambda task: self.finish(key, task))
+            self.inflight[key] = task
+        else:
+            self.counters["collapsed"] += 1
+
+        # Shielded, so a caller that gets cancelled doesn't cancel the assignment for the others
+        return copy.deepcopy(await asyncio.shield(task))
+
+    async def flush(self):
+        """Waits until every result is written to disk"""
+        if self.writes: await asyncio.wait(list(self.writes))
+
+    async def clear(self):
+        self.entries.clear()
+        if self.path:
+            await self.flush()
+            await asyncio.get_event_loop().run_in_executor(self.executor, lambda: self.open_db().clear())
+
+    async def close(self):
+        """Writes the pending results and closes the shelve"""
+        if not self.path: return
+        await self.flush()
+        await asyncio.get_event_loop().run_in_executor(self.executor, self.close_db)
+
+    def close_db(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "inflight": len(self.inflight),
+            **self.counters,
+        }
@@ -2,4 +2,21 @@ class ReservationException(Exception):
     pass
 
 class AssignmentException(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class AssignmentTimeoutError(AssignmentException):
+    pass
+
+class AssignmentCancelledError(AssignmentException):
+    pass
+
+class AssignmentCriticalError(AssignmentException):
+    """The Node failed, type is the name of the exception it raised"""
+
+    def __init__(self, message: str, type: str = None) -> None:
+        super().__init__(message)
+        self.type = type
+
+class AssignmentRetryError(AssignmentCriticalError):
+    """Raised in a Node if the assignment should be sent again (it reaches the caller as ASSIGN_RETRY)"""
+    pass
@@ -0,0 +1,262 @@
+from bergen.messages.postman.reserve.reserve_transition import ReserveState
+from bergen.contracts.reservation import CouldNotReserveError, Reservation, get_deadline, is_flagged
+from bergen.contracts.retry import RetryPolicy
+from bergen.registries.client import get_current_client
+from bergen.schema import Node
+from collections import deque
+from typing import Dict, List, Optional, Set
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ReservationGroup:
+    """ Reserves size provisions of the same Node and spreads assignments over them
+
+    Every assignment goes to the member with the fewest outstanding assignments. Members
+    that move into an exit state (ERROR, CANCELLED or a critical error) are dropped and
+    replaced in the background, while no member is active assignments wait for the next one.
+    If spread_providers is set and multiple providers are given, member i reserves on
+    providers[i % len(providers)], so the group is spread across the providers.
+
+    Assignments to Nodes flagged idempotent (node.flag(idempotent=True)) can be hedged: if
+    an assignment has not returned after hedge_after seconds (or, once min_hedge_samples
+    assignments finished, after the hedge_percentile of their latencies) the same assignment
+    is sent to a second member. The first result wins and the other assignment is cancelled.
+
+    With a retry policy failed assignments are sent again, preferably to a member that has
+    not failed the assignment yet.
+
+        async with node.reserve_group(3, providers=["a", "b", "c"]) as group:
+            results = await group.map(range(100), concurrency=12)
+
+    Args:
+        node (Node): The Node to reserve
+        size (int, optional): The number of Reservations. Defaults to 2.
+        spread_providers (bool, optional): Give every member one of the providers. Defaults to True.
+        replace_delay (float, optional): Seconds between attempts to replace a failed member. Defaults to 1.
+        hedge_after (float, optional): Seconds until an assignment is hedged. Defaults to None (no hedging).
+        hedge_percentile (float, optional): Latency percentile (0-100) after which an assignment is hedged. Defaults to None.
+        min_hedge_samples (int, optional): Finished assignments needed before hedge_percentile is used. Defaults to 20.
+        retry (RetryPolicy, optional): Retries failed assignments on the members. Defaults to None.
+        **params: Passed to every Reservation (ReserveParams and Reservation kwargs)
+    """
+
+    # The bulk helpers only need assign_async and loop, so they are shared with Reservation
+    imap = Reservation.imap
+    map = Reservation.map
+
+    def __init__(self, node: Node, size: int = 2, spread_providers=True, replace_delay: float = 1,
+            hedge_after: float = None, hedge_percentile: float = None, min_hedge_samples: int = 20, retry: RetryPolicy = None, loop=None, **params) -> None:
+        assert size > 0, "A Reservation Group needs at least one member"
+        if hedge_after is not None or hedge_percentile is not None:
+            assert is_flagged(node, "idempotent"), "Only assignments to Nodes flagged idempotent can be hedged"
+
+        self.node = node
+        self.size = size
+        self.spread_providers = spread_providers
+        self.replace_delay = replace_delay
+        self.hedge_after = hedge_after
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_samples = min_hedge_samples
+        self.latencies = deque(maxlen=max(100, min_hedge_samples)) # Of the last successful assignments
+        self.retry = retry
+        self.params = params
+        self.loop = loop or get_current_client().loop
+
+        self.members: List[Reservation] = []
+        self.outstanding: Dict[Reservation, int] = {}
+        self.has_members = asyncio.Event()
+        self.adding: List[asyncio.Task] = []
+        self.ending: List[asyncio.Task] = []
+        self.cancelling: Set[asyncio.Task] = set() # Losing hedged assignments waiting for their unassign
+        self.replaced = 0
+        self.hedged = 0
+        self.hedges_won = 0
+        self.is_closing = False
+
+    def build_reservation(self, index: int) -> Reservation:
+        params = dict(self.params)
+        providers = params.get("providers")
+        if self.spread_providers and providers and len(providers) > 1:
+            params["providers"] = [providers[index % len(providers)]]
+
+        return self.node.reserve(transition_hook=self.on_transition, loop=self.loop, **params)
+
+    def is_healthy(self, reservation: Reservation) -> bool:
+        return reservation.current_state not in reservation.exit_states and reservation.current_state != ReserveState.CRITICAL
+
+    async def add_member(self, index: int):
+        """Reserves a new member, retrying every replace_delay seconds until it is active"""
+        while not self.is_closing:
+            reservation = self.build_reservation(index)
+            try:
+                await reservation.start()
+            except CouldNotReserveError as e:
+                logger.warning(f"Could not reserve member {index} of the group for {self.node.name}: {e.__cause__}. Retrying in {self.replace_delay} seconds")
+                await asyncio.sleep(self.replace_delay)
+                continue
+
+            self.members.append(reservation)
+            self.outstanding[reservation] = 0
+            self.has_members.set()
+            return
+
+    async def on_transition(self, reservation: Reservation, state: ReserveState):
+        if state in reservation.exit_states and reservation in self.outstanding:
+            # Called from the stream worker of the reservation, so it is ended from a different task
+            self.replace(reservation)
+
+    def replace(self, reservation: Reservation):
+        if self.is_closing or reservation not in self.members: return
+        logger.warning(f"Member {reservation.reference} of the group for {self.node.name} is {reservation.current_state}. Replacing it")
+
+        index = self.members.index(reservation)
+        self.members.remove(reservation)
+        if not self.members: self.has_members.clear()
+        self.replaced += 1
+
+        self.ending.append(self.loop.create_task(self.end_member(reservation)))
+        self.adding.append(self.loop.create_task(self.add_member(index)))
+
+    async def end_member(self, reservation: Reservation):
+        try:
+            await reservation.end()
+        except Exception:
+            logger.exception(f"Could not unreserve member {reservation.reference}")
+        self.outstanding.pop(reservation, None)
+
+    async def pick(self, avoid: List[Reservation] = []) -> Reservation:
+        """Returns the healthy member with the fewest outstanding assignments, members in avoid only if there is no other"""
+        while True:
+            for reservation in list(self.members):
+                if not self.is_healthy(reservation): self.replace(reservation)
+
+            if self.members:
+                candidates = [reservation for reservation in self.members if reservation not in avoid] or self.members
+                return min(candidates, key=lambda reservation: self.outstanding[reservation])
+
+            await self.has_members.wait()
+
+    def get_hedge_delay(self) -> Optional[float]:
+        if self.hedge_percentile is not None and len(self.latencies) >= self.min_hedge_samples:
+            latencies = sorted(self.latencies)
+            return latencies[min(len(latencies) - 1, int(len(latencies) * self.hedge_percentile / 100))]
+        return self.hedge_after
+
+    async def assign_member(self, reservation: Reservation, *args, failed: List[Reservation] = None, **kwargs):
+        self.outstanding[reservation] += 1
+        start = time.monotonic()
+        try:
+            result = await reservation.assign_async(*args, **kwargs)
+            self.latencies.append(time.monotonic() - start)
+            return result
+        except Exception:
+            if failed is not None: failed.append(reservation)
+            raise
+        finally:
+            if reservation in self.outstanding: self.outstanding[reservation] -= 1
+
+    async def assign_async(self, *args, retry: RetryPolicy = None, **kwargs):
+        retry = self.retry if retry is None else retry
+        if not retry:
+            return await self.assign_once(*args, **kwargs)
+
+        # Every attempt shares the deadline of the whole assignment
+        failed: List[Reservation] = []
+        deadline = get_deadline(kwargs.pop("timeout", None), kwargs.pop("deadline", None))
+        return await retry.run(lambda attempt: self.assign_once(*args, failed=failed, deadline=deadline, retry=False, **kwargs), deadline=deadline)
+
+    async def assign_once(self, *args, failed: List[Reservation] = None, **kwargs):
+        reservation = await self.pick(failed or [])
+        delay = self.get_hedge_delay()
+        if delay is None:
+            return await self.assign_member(reservation, *args, failed=failed, **kwargs)
+
+        primary = self.loop.create_task(self.assign_member(reservation, *args, failed=failed, **kwargs))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            siblings = [member for member in self.members if member is not reservation and self.is_healthy(member)]
+            if not done and siblings:
+                self.hedged += 1
+                sibling = min(siblings, key=lambda member: self.outstanding[member])
+                tasks.append(self.loop.create_task(self.assign_member(sibling, *args, failed=failed, **kwargs)))
+
+            # The first result wins, a failure only counts once no other assignment is left
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded:
+                    if succeeded[0] is not primary: self.hedges_won += 1
+                    return succeeded[0].result()
+                if not pending:
+                    return primary.result()
+
+        finally:
+            # Cancelling the losing assignment sends its unassign, the winner doesn't wait for its confirmation
+            losers = [task for task in tasks if not task.done()]
+            for task in losers:
+                task.cancel()
+
+            if losers:
+                cancelling = self.loop.create_task(asyncio.wait(losers))
+                self.cancelling.add(cancelling)
+                cancelling.add_done_callback(self.cancelling.discard)
+
+    async def stream(self, *args, **kwargs):
+        # Streams are never hedged, their items can't be taken back
+        reservation = await self.pick()
+        self.outstanding[reservation] += 1
+        try:
+            async for result in reservation.stream(*args, **kwargs):
+                yield result
+        finally:
+            if reservation in self.outstanding: self.outstanding[reservation] -= 1
+
+    async def start(self):
+        return await self.__aenter__()
+
+    async def end(self):
+        await self.__aexit__(None, None, None)
+
+    async def __aenter__(self):
+        self.is_closing = False
+        reservations = [self.build_reservation(index) for index in range(self.size)]
+        results = await asyncio.gather(*[reservation.start() for reservation in reservations], return_exceptions=True)
+
+        for index, (reservation, result) in enumerate(zip(reservations, results)):
+            if isinstance(result, BaseException):
+                logger.warning(f"Could not reserve member {index} of the group for {self.node.name}. Retrying in the background")
+                self.adding.append(self.loop.create_task(self.add_member(index)))
+            else:
+                self.members.append(reservation)
+                self.outstanding[reservation] = 0
+
+        if not self.members:
+            await self.__aexit__(None, None, None)
+            raise CouldNotReserveError(f"Could not reserve any of the {self.size} Reservations for Node {self.node}") from results[0]
+
+        self.has_members.set()
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        self.is_closing = True
+        for task in self.adding:
+            task.cancel()
+
+        members, self.members = self.members, []
+        self.has_members.clear()
+        await asyncio.gather(*[self.end_member(reservation) for reservation in members], *self.adding, *self.ending, *self.cancelling, return_exceptions=True)
+        self.adding, self.ending = [], []
+
+    def stats(self) -> dict:
+        return {
+            "members": [{"reference": reservation.reference, "state": reservation.current_state, "outstanding": self.outstanding.get(reservation, 0)} for reservation in self.members],
+            "replaced": self.replaced,
+            "hedged": self.hedged,
+            "hedges_won": self.hedges_won,
+        }
@@ -0,0 +1,166 @@
+from bergen.messages.postman.reserve.params import ReserveParams
+from bergen.contracts.reservation import Reservation
+from bergen.schema import Node
+from typing import Dict, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PooledReservation:
+
+    def __init__(self, key: Tuple[str, str, str], reservation: Reservation) -> None:
+        self.key = key
+        self.reservation = reservation
+        self.ready: asyncio.Future = asyncio.ensure_future(reservation.start())
+        self.leases = 0
+        self.last_used = time.monotonic()
+        self.idle_handle: asyncio.TimerHandle = None
+
+    @property
+    def is_broken(self) -> bool:
+        if not self.ready.done(): return False
+        if self.ready.cancelled() or self.ready.exception() is not None: return True
+        return self.reservation.current_state in self.reservation.exit_states
+
+    def cancel_idle(self):
+        if self.idle_handle: self.idle_handle.cancel()
+        self.idle_handle = None
+
+
+class ReservationLease:
+    """Async context manager that borrows a Reservation from the pool and gives it back on exit"""
+
+    def __init__(self, pool: "ReservationPool", node: Node, params: dict) -> None:
+        self.pool = pool
+        self.node = node
+        self.params = params
+        self.entry: PooledReservation = None
+
+    async def __aenter__(self) -> Reservation:
+        self.entry = await self.pool.acquire(self.node, self.params)
+        return self.entry.reservation
+
+    async def __aexit__(self, type, value, traceback):
+        self.pool.release(self.entry)
+
+
+class ReservationPool:
+    """ Keeps Reservations warm between calls of Node.assign and Node.stream
+
+    Reservations are keyed by the node and their params (ReserveParams and the remaining
+    Reservation kwargs), concurrent callers with the same key share one Reservation (the
+    first caller reserves, everyone else waits for it to become active). Once nobody holds
+    a Reservation anymore it is unreserved after idle_timeout seconds, an idle_timeout of None
+    keeps it until the pool is closed. Reservations that failed or reached an exit state are
+    replaced on the next call.
+    """
+
+    def __init__(self, idle_timeout: Optional[float] = 30) -> None:
+        self.idle_timeout = idle_timeout
+        self.entries: Dict[Tuple[str, str, str], PooledReservation] = {}
+        self.closing: Set[asyncio.Future] = set()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "discarded": 0}
+
+    @staticmethod
+    def get_key(node: Node, params: dict) -> Tuple[str, str, str]:
+        reserve_params = ReserveParams(**{key: value for key, value in params.items() if key in ReserveParams.__fields__})
+        others = {key: value for key, value in params.items() if key not in ReserveParams.__fields__}
+        return str(node.id), reserve_params.json(), json.dumps(others, sort_keys=True, default=repr)
+
+    def lease(self, node: Node, **params) -> ReservationLease:
+        """Borrows a Reservation for node
+
+            async with pool.lease(node, providers=["vanilla"]) as reservation:
+                await reservation.assign_async(1, 2)
+        """
+        return ReservationLease(self, node, params)
+
+    async def acquire(self, node: Node, params: dict) -> PooledReservation:
+        key = self.get_key(node, params)
+        entry = self.entries.get(key)
+
+        if entry is not None and entry.is_broken:
+            self.discard(entry)
+            entry = None
+
+        if entry is None:
+            self.counters["misses"] += 1
+            entry = PooledReservation(key, node.reserve(**params))
+            self.entries[key] = entry
+        else:
+            self.counters["hits"] += 1
+
+        entry.leases += 1
+        entry.cancel_idle()
+
+        try:
+            # Shielded, a caller that gets cancelled doesn't cancel the reservation for everyone else
+            await asyncio.shield(entry.ready)
+        except BaseException:
+            self.release(entry)
+            raise
+
+        return entry
+
+    def release(self, entry: PooledReservation):
+        entry.leases -= 1
+        entry.last_used = time.monotonic()
+
+        if entry.is_broken:
+            self.discard(entry)
+            return
+
+        if entry.leases == 0 and self.idle_timeout is not None:
+            entry.idle_handle = asyncio.get_event_loop().call_later(self.idle_timeout, self.expire, entry)
+
+    def expire(self, entry: PooledReservation):
+        if entry.leases > 0 or self.entries.get(entry.key) is not entry: return
+        logger.info(f"Unreserving idle Reservation {entry.reservation.reference}")
+        del self.entries[entry.key]
+        self.counters["expired"] += 1
+        self.end(entry)
+
+    def discard(self, entry: PooledReservation):
+        if self.entries.get(entry.key) is entry:
+            del self.entries[entry.key]
+            self.counters["discarded"] += 1
+        entry.cancel_idle()
+        if entry.leases == 0: self.end(entry)
+
+    def end(self, entry: PooledReservation):
+        entry.cancel_idle()
+        task = asyncio.ensure_future(self.unreserve(entry))
+        self.closing.add(task)
+        task.add_done_callback(self.closing.discard)
+
+    async def unreserve(self, entry: PooledReservation):
+        try:
+            await entry.ready
+        except BaseException:
+            return # Never became active, nothing to unreserve
+
+        try:
+            await entry.reservation.end()
+        except Exception:
+            logger.exception(f"Could not unreserve pooled Reservation {entry.reservation.reference}")
+
+    async def close(self):
+        """Unreserves all pooled Reservations"""
+        entries = list(self.entries.values())
+        self.entries.clear()
+        for entry in entries:
+            self.end(entry)
+
+        if self.closing:
+            await asyncio.gather(*self.closing, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "reservations": len(self.entries),
+            "leased": sum(entry.leases for entry in self.entries.values()),
+            **self.counters,
+        }
@@ -3,7 +3,9 @@ from bergen.messages.postman.log import LogLevel
 from contextvars import Context
 from bergen.messages.postman.reserve.reserve_transition import ReserveState
 from bergen import messages
-from bergen.contracts.exceptions import AssignmentException
+from bergen.contracts.exceptions import AssignmentCancelledError, AssignmentCriticalError, AssignmentException, AssignmentRetryError, AssignmentTimeoutError
+from bergen.contracts.retry import RetryPolicy
+from bergen.transports.queues import QueueFullError
 from bergen.registries.client import get_current_client
 from bergen.schema import Node, NodeType
 from bergen.monitor import Monitor, current_monitor
@@ -12,8 +14,11 @@ from bergen.messages import *
 from bergen.utils import *
 from rich.table import Table
 from rich.panel import Panel
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
 import asyncio
 import logging
+import time
+import uuid
 from bergen.console import console
 
 logger = logging.getLogger(__name__)
@@ -34,6 +39,19 @@ class IncorrectStateForAssignation(ReservationError):
     pass
 
 
+def is_flagged(node: Node, flag: str) -> bool:
+    """Returns if the node was flagged on the current client (see NodeExtender.flag)"""
+    is_flagged = getattr(node, "is_flagged", None)
+    return bool(is_flagged and is_flagged(flag))
+
+
+def get_deadline(timeout: Optional[float] = None, deadline: Optional[float] = None) -> Optional[float]:
+    """Returns the earlier of deadline and now + timeout as a unix timestamp (None if neither is set)"""
+    if timeout is not None:
+        deadline = min(deadline, time.time() + timeout) if deadline is not None else time.time() + timeout
+    return deadline
+
+
 
 
 class Reservation:
@@ -48,6 +66,11 @@ class Reservation:
         enter_on=[ReserveState.ACTIVE], 
         exit_on=[ReserveState.ERROR, ReserveState.CANCELLED],
         context: Context =None,
+        loopback=False,
+        timeout: float = None,
+        cancel_timeout: float = 5,
+        cache: bool = None,
+        retry: RetryPolicy = None,
         loop=None,
          **params) -> None:
 
@@ -66,6 +89,13 @@ class Reservation:
         self.params = ReserveParams(**params)
         self.with_log = with_log or (self.monitor.log if self.monitor else None)
         self.context = context # with_bounced allows us forward bounced checks
+        # Assignments to a provision of this process skip the network. Opt-in, as the actor then gets the raw args
+        # and its raw returns come back (nothing is shrunk or expanded), unlike the models of a remote call
+        self.loopback = loopback
+        self.timeout = timeout # Seconds to wait for the Reservation to become active
+        self.cancel_timeout = cancel_timeout # Seconds to wait for a cancelled Assignment to confirm its end
+        self.cache = cache # Cache results in the Assign Cache of the client, None follows the deterministic flag of the node
+        self.retry = retry # Default RetryPolicy of assign_async
 
 
         if self.context:
@@ -134,34 +164,148 @@ class Reservation:
         return Panel(columns, title="Reservation")
 
 
-    async def assign_async(self, *args, bypass_shrink=False, bypass_expand=False, persist=True, with_log=True, context=None, **kwargs):
+    def get_loopback_provision(self) -> Optional[str]:
+        """Returns the provision if this Reservation is served by an Actor of this process"""
+        if not self.loopback or self.client._entertainer is None:
+            return None
+        return self.client._entertainer.get_loopback_provision(self.reference, self.provision)
+
+    async def send_assignment(self, message_queue, args, kwargs, bypass_shrink=False, persist=True, with_log=True, context=None, deadline=None):
+        """Sends an assignment whose messages will arrive on message_queue
+
+        If the provision runs in this process the assignment is handed to its Actor directly,
+        skipping serialization and shrinking (the server is still told about it). Inputs that
+        are already shrinked (bypass_shrink) are always sent through the server.
+
+        Returns:
+            Tuple[str, bool]: The reference of the assignment and if it was dispatched in process
+        """
+        # Shrinked inputs go through the server, the Actor only expands inputs that weren't dispatched in process
+        provision = self.get_loopback_provision() if not bypass_shrink else None
+        if provision:
+            entertainer = self.client._entertainer
+            assign_reference = str(uuid.uuid4())
+            # The server is told first, so it knows the assignment before the Actor reports its state
+            entertainer.expect_loopback(provision, assign_reference, message_queue)
+            try:
+                await self._postman.send_loopback_assign(assign_reference, self.reference, with_log=with_log, persist=persist, context=context, deadline=deadline)
+            except BaseException:
+                entertainer.release_loopback(assign_reference)
+                raise
+
+            await entertainer.loopback(provision, assign_reference, self.reference, list(args), kwargs, context=context, deadline=deadline)
+            return assign_reference, True
+
+        shrinked_args, shrinked_kwargs = await shrinkInputs(self.node, args, kwargs) if not bypass_shrink else (args, kwargs)
+        assign_reference = await self._postman.stream_assign_to_queue(message_queue, self.reference, shrinked_args=shrinked_args, shrinked_kwargs=shrinked_kwargs, with_log=with_log, persist=persist, context=context, deadline=deadline)
+        return assign_reference, False
+
+    def uses_cache(self, cache: Optional[bool] = None) -> bool:
+        if cache is not None: return cache
+        if self.cache is not None: return self.cache
+        return is_flagged(self.node, "deterministic")
+
+    async def receive(self, message_queue: asyncio.Queue, deadline: Optional[float]):
+        """Gets the next message of an assignment, raises an asyncio.TimeoutError once the deadline passed"""
+        if deadline is None:
+            return await message_queue.get()
+
+        remaining = deadline - time.time()
+        if remaining <= 0: raise asyncio.TimeoutError()
+        return await asyncio.wait_for(message_queue.get(), remaining)
+
+    async def cancel_assignment(self, assign_reference: str, message_queue: asyncio.Queue, context=None) -> bool:
+        """Requests the cancellation of an assignment and waits (at most cancel_timeout seconds) until it ended
+
+        Returns:
+            bool: If the end of the assignment was confirmed in time
+        """
+        unassign_reference = await self._postman.send_unassign(assign_reference, context=context, queue=message_queue)
+        deadline = time.time() + self.cancel_timeout if self.cancel_timeout is not None else None
+
+        try:
+            while True:
+                message = await self.receive(message_queue, deadline)
+
+                if isinstance(message, AssignCancelledMessage):
+                    if message.data.canceller != unassign_reference:
+                        self.log("Canceller does not match our Cancellation Request, Race Condition?")
+                    return True
+
+                elif isinstance(message, (AssignReturnMessage, AssignDoneMessage, AssignCriticalMessage, AssignRetryMessage)):
+                    return True # Finished before the cancellation arrived, no cancelled message will follow
+
+                elif isinstance(message, (UnassignDoneMessage, UnassignCriticalMessage)):
+                    return True # The Actor confirmed (or had already finished), an assignment cancelled before it started sends nothing else
+
+                elif isinstance(message, AssignLogMessage):
+                    self.log(message.data.message, message.data.level)
+
+                else:
+                    logger.warning(f"Unexpected message while cancelling {assign_reference}: {message}")
+
+        except asyncio.TimeoutError:
+            self.log(f"Cancellation of {assign_reference} was not confirmed within {self.cancel_timeout} seconds. Giving up on it", level=LogLevel.WARN)
+            return False
+
+        finally:
+            # Late messages of the assignment are no longer of interest
+            await self._postman.delete_assignqueue(assign_reference)
+            await self._postman.delete_assignqueue(unassign_reference)
+
+    async def assign_async(self, *args, bypass_shrink=False, bypass_expand=False, persist=True, with_log=True, context=None, timeout: float = None, deadline: float = None, cache: bool = None, retry: RetryPolicy = None, **kwargs):
+        """Assigns to the Reservation and returns the result
+
+        Args:
+            timeout (float, optional): Seconds until the assignment is cancelled. Defaults to None.
+            deadline (float, optional): Unix timestamp at which the assignment is cancelled (the earlier of timeout and deadline counts). Defaults to None.
+            cache (bool, optional): Look up and store the result in the Assign Cache of the client. Defaults to the cache setting of the Reservation.
+            retry (RetryPolicy, optional): Sends failed assignments again, False disables retries. Defaults to the retry policy of the Reservation.
+        """
         assert self.node.type == NodeType.FUNCTION, "You cannot assign to a Generator Node, use the stream Method!"
 
         if self.current_state in self.exit_states:
             raise IncorrectStateForAssignation(f"Current State {self.current_state} is an Element of Exit States {self.exit_states}")
 
+        if self.uses_cache(cache):
+            # Shrinked once, for the key and the assignment
+            shrinked_args, shrinked_kwargs = await shrinkInputs(self.node, args, kwargs) if not bypass_shrink else (args, kwargs)
+            key = self.client.assign_cache.get_key(self.node.id, shrinked_args, shrinked_kwargs, bypass_expand)
+            return await self.client.assign_cache.get_or_run(key, lambda: self.assign_async(*shrinked_args, bypass_shrink=True, bypass_expand=bypass_expand, persist=persist, with_log=with_log, context=context, timeout=timeout, deadline=deadline, cache=False, retry=retry, **shrinked_kwargs))
+
+        retry = self.retry if retry is None else retry
+        deadline = get_deadline(timeout, deadline)
+        if retry:
+            # Every attempt shares the deadline of the whole assignment
+            return await retry.run(lambda attempt: self.assign_async(*args, bypass_shrink=bypass_shrink, bypass_expand=bypass_expand, persist=persist, with_log=with_log, context=context, deadline=deadline, cache=False, retry=False, **kwargs), deadline=deadline)
+
         self.log(f"Streaming!", level=LogLevel.INFO)
-        message_queue = asyncio.Queue()
+        if deadline is not None and deadline <= time.time():
+            raise AssignmentTimeoutError("The deadline of the Assignment passed before it was sent")
 
-        shrinked_args, shrinked_kwargs = await shrinkInputs(self.node, args, kwargs) if not bypass_shrink else (args, kwargs)
-        assign_reference = await self._postman.stream_assign_to_queue(message_queue, self.reference, shrinked_args=shrinked_args, shrinked_kwargs=shrinked_kwargs, with_log=with_log, context=context or self.context)
+        message_queue = self.client.queue_factory.create("assignment", failable=True)
+
+        assign_reference, loopback = await self.send_assignment(message_queue, args, kwargs, bypass_shrink=bypass_shrink, persist=persist, with_log=with_log, context=context or self.context, deadline=deadline)
 
         try:
             while True:
-                message = await message_queue.get()
+                message = await self.receive(message_queue, deadline)
 
                 if isinstance(message, AssignReturnMessage):
-                    outs = await expandOutputs(self.node, message.data.returns) if not bypass_expand else message.data.returns    
+                    outs = await expandOutputs(self.node, message.data.returns) if not (bypass_expand or loopback) else message.data.returns    
                     return outs
 
                 elif isinstance(message, AssignCancelledMessage):
-                    raise AssignmentException(f"Assignment was cancelled from a different Agent: ID: {message.data.canceller}")
+                    raise AssignmentCancelledError(f"Assignment was cancelled from a different Agent: ID: {message.data.canceller}")
 
                 elif isinstance(message, AssignLogMessage):
                     self.log(message.data.message, message.data.level)
 
                 elif isinstance(message, AssignCriticalMessage):
-                    raise AssignmentException(message.data.message)
+                    raise AssignmentCriticalError(message.data.message, type=message.data.type)
+
+                elif isinstance(message, AssignRetryMessage):
+                    raise AssignmentRetryError(message.data.message, type=message.data.type)
 
                 elif isinstance(message, AssignYieldsMessage):
                     raise AssignmentException("Received a Yield from a Node that should never yield! CRITICAL PROTOCOL EXCEPTION")
@@ -169,56 +313,65 @@ class Reservation:
                 else:
                     raise UnknownMessageError(message)
 
+        except QueueFullError as e:
+            await self._postman.send_unassign(assign_reference, context=context)
+            raise AssignmentException(f"Assignment could not keep up with its incoming messages: {e}") from e
+
+        except asyncio.TimeoutError as e:
+            self.log(f"Assignment exceeded its deadline", level=LogLevel.WARN)
+            await self.cancel_assignment(assign_reference, message_queue, context=context)
+            raise AssignmentTimeoutError(f"Assignment {assign_reference} did not finish before its deadline") from e
 
         except asyncio.CancelledError as e:
             self.log("Assigment Required Cancellation", level=LogLevel.INFO)
+            await self.cancel_assignment(assign_reference, message_queue, context=context)
+            raise e
 
-            unassign_reference = await self._postman.send_unassign(assign_reference, context=context)
-
-            while True:
-                message = await message_queue.get()
-                if isinstance(message, AssignCancelledMessage):
-
-                    if message.data.canceller != unassign_reference:
-                        self.log("Canceller does not match our Cancellation Request, Race Condition?")
-                    raise e
-
-                else:
-                    print("Raced Condition",message)
 
 
+    async def stream(self, *args, bypass_shrink=False, bypass_expand=False, persist=True, context=None, with_log=True, timeout: float = None, deadline: float = None, **kwargs):
+        """Assigns to the Reservation and yields the results
 
-    async def stream(self, *args, bypass_shrink=False, bypass_expand=False, persist=True, context=None, with_log=True, **kwargs):
+        Args:
+            timeout (float, optional): Seconds until the whole stream is cancelled. Defaults to None.
+            deadline (float, optional): Unix timestamp at which the stream is cancelled (the earlier of timeout and deadline counts). Defaults to None.
+        """
         assert self.node.type == NodeType.GENERATOR, "You cannot stream a Function Node, use the assign Method!"
 
         if self.current_state in self.exit_states:
             raise IncorrectStateForAssignation(f"Current State {self.current_state} is an Element of Exit States {self.exit_states}")
 
         self.log(f"Assigning!", level=LogLevel.INFO)
-        message_queue = asyncio.Queue()
+        deadline = get_deadline(timeout, deadline)
+        if deadline is not None and deadline <= time.time():
+            raise AssignmentTimeoutError("The deadline of the Assignment passed before it was sent")
 
-        shrinked_args, shrinked_kwargs = await shrinkInputs(self.node, args, kwargs) if not bypass_shrink else (args, kwargs)
-        assign_reference = await self._postman.stream_assign_to_queue(message_queue, self.reference, shrinked_args=shrinked_args, shrinked_kwargs=shrinked_kwargs, with_log=with_log, context=context or self.context)
+        message_queue = self.client.queue_factory.create("assignment", failable=True)
+
+        assign_reference, loopback = await self.send_assignment(message_queue, args, kwargs, bypass_shrink=bypass_shrink, persist=persist, with_log=with_log, context=context or self.context, deadline=deadline)
 
         try:
             while True:
-                message = await message_queue.get()
+                message = await self.receive(message_queue, deadline)
 
                 if isinstance(message, AssignYieldsMessage):
-                    outs = await expandOutputs(self.node, message.data.returns) if not bypass_expand else message.data.returns    
+                    outs = await expandOutputs(self.node, message.data.returns) if not (bypass_expand or loopback) else message.data.returns    
                     yield outs
 
                 elif isinstance(message, AssignDoneMessage):   
                     break
 
                 elif isinstance(message, AssignCancelledMessage):
-                    raise AssignmentException(f"Assignment was cancelled from a different Agent: ID: {message.data.canceller}")
+                    raise AssignmentCancelledError(f"Assignment was cancelled from a different Agent: ID: {message.data.canceller}")
 
                 elif isinstance(message, AssignLogMessage):
                     self.log(message.data.message, message.data.level)
 
                 elif isinstance(message, AssignCriticalMessage):
-                    raise AssignmentException(message.data.message)
+                    raise AssignmentCriticalError(message.data.message, type=message.data.type)
+
+                elif isinstance(message, AssignRetryMessage):
+                    raise AssignmentRetryError(message.data.message, type=message.data.type)
 
                 elif isinstance(message, AssignReturnMessage):
                     raise AssignmentException("Received a Return from a Node that should never return! CRITICAL PROTOCOL EXCEPTION")
@@ -226,28 +379,85 @@ class Reservation:
                 else:
                     raise UnknownMessageError(message)
 
+        except QueueFullError as e:
+            await self._postman.send_unassign(assign_reference, context=context)
+            raise AssignmentException(f"Assignment could not keep up with its incoming messages: {e}") from e
+
+        except asyncio.TimeoutError as e:
+            self.log(f"Stream exceeded its deadline", level=LogLevel.WARN)
+            await self.cancel_assignment(assign_reference, message_queue, context=context)
+            raise AssignmentTimeoutError(f"Assignment {assign_reference} did not finish before its deadline") from e
 
         except asyncio.CancelledError as e:
             self.log("Assigment Required Cancellation", level=LogLevel.INFO)
+            await self.cancel_assignment(assign_reference, message_queue, context=context)
+            raise e
 
-            unassign_reference = await self._postman.send_unassign(assign_reference, context=context)
 
-            while True:
-                message = await message_queue.get()
 
-                if isinstance(message, AssignCancelledMessage):
+    async def imap(self, iterable: Iterable, concurrency: int = 10, ordered=True, **kwargs) -> AsyncIterator[Any]:
+        """Assigns every item of iterable, keeping up to concurrency assignments in flight
 
-                    if message.data.canceller != unassign_reference:
-                        self.log("Canceller does not match our Cancellation Request, Race Condition?")
-                    raise e
+        Every item holds the args of one assignment (items that are not tuples are passed as the only arg),
+        kwargs are passed to every assign_async call. Results are yielded in the order of iterable,
+        or as they complete if ordered is False. If one assignment fails (or the iteration is stopped),
+        the assignments in flight are cancelled and the exception is raised.
 
-                elif isinstance(message, AssignLogMessage):
-                    self.log(message.data.message, message.data.level)
+        Args:
+            iterable (Iterable): The args of the assignments
+            concurrency (int, optional): Maximum number of assignments in flight. Defaults to 10.
+            ordered (bool, optional): Yield in input order. Defaults to True.
+        """
+        assert concurrency > 0, "Concurrency needs to be at least 1"
+        items = enumerate(iterable)
+        pending: Dict[asyncio.Task, int] = {}
+        finished: Dict[int, Any] = {} # Results that are waiting for their predecessors (ordered only)
+        next_index = 0
+
+        def dispatch():
+            for index, item in items:
+                args = item if isinstance(item, tuple) else (item,)
+                pending[self.loop.create_task(self.assign_async(*args, **kwargs))] = index
+                if len(pending) >= concurrency: return
 
-                else:
-                    print("Raced Condition",message)
+        try:
+            dispatch()
+            while pending:
+                done, _ = await asyncio.wait(list(pending.keys()), return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    index = pending.pop(task)
+                    result = task.result()
+
+                    if ordered:
+                        finished[index] = result
+                    else:
+                        yield result
+
+                dispatch()
 
+                while next_index in finished:
+                    yield finished.pop(next_index)
+                    next_index += 1
 
+        finally:
+            for task in pending:
+                task.cancel()
+            # Retrieves the exceptions of every other task (failed in the same round or cancelled), we raise the first failure
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def map(self, iterable: Iterable, concurrency: int = 10, ordered=True, **kwargs) -> List[Any]:
+        """Assigns every item of iterable with bounded concurrency and returns the results (see imap)
+
+        Args:
+            iterable (Iterable): The args of the assignments
+            concurrency (int, optional): Maximum number of assignments in flight. Defaults to 10.
+            ordered (bool, optional): Return the results in input order. Defaults to True.
+
+        Returns:
+            List[Any]: The results
+        """
+        return [result async for result in self.imap(iterable, concurrency=concurrency, ordered=ordered, **kwargs)]
 
     async def stream_worker(self, queue: asyncio.Queue):
         try:
@@ -291,18 +501,23 @@ class Reservation:
                 self.enter_future.set_exception(e)
             raise e
 
+        finally:
+            # Nobody listens to this reference anymore (exit states other than ERROR and CANCELLED aren't evicted by the registry)
+            if self.reference is not None: self._postman.references.evict(self.reference)
+
 
     async def cancel(self):
+        if self.client._entertainer is not None: self.client._entertainer.forget_reservation(self.reference)
         await self._postman.send_unreserve(self.reference, context=self.context)
 
     async def start(self):
         return await self.__aenter__()
 
     async def end(self):
-        await self.__aexit__()
+        await self.__aexit__(None, None, None)
 
     async def __aenter__(self):
-        self.reservation_queue = asyncio.Queue()
+        self.reservation_queue = self.client.queue_factory.create("reservation")
         self.is_closing = False
         
         self.enter_future = self.loop.create_future()
@@ -311,9 +526,17 @@ class Reservation:
         print("Reached Here")
 
         try:
-            self.enter_state = await self.enter_future
+            self.enter_state = await asyncio.wait_for(asyncio.shield(self.enter_future), self.timeout)
             return self
 
+        except asyncio.TimeoutError as e:
+            # The worker is stopped first, so the unreserve can't overtake its reserve
+            self.is_closing = True
+            self.stream_task.cancel()
+            await asyncio.wait([self.stream_task])
+            await self.cancel()
+            raise CouldNotReserveError(f"Reservation {self.reference} for Node {self.node} did not become active within {self.timeout} seconds") from e
+
         except Exception as e:
             raise CouldNotReserveError(f"Could not Reserve Reservation {self.reference} for Node {self.node}") from e
 
@@ -337,18 +560,15 @@ class Reservation:
 
     
     def assign(self, *args, bypass_shrink=False, bypass_expand=False, persist=True, **kwargs):
-        if False:
-            return self.loop.run_until_complete(self.assign_async(*args, bypass_shrink=bypass_shrink, bypass_expand=bypass_expand, persist=persist, **kwargs))
-        else:
-            return self.assign_async(*args, bypass_shrink=bypass_shrink, bypass_expand=bypass_expand, persist=persist, **kwargs)
+        """Assigns synchronously (see assign_async), safe to call from many threads at once"""
+        return self.client.run(self.assign_async(*args, bypass_shrink=bypass_shrink, bypass_expand=bypass_expand, persist=persist, **kwargs))
 
     def __enter__(self):
         self.in_sync = True
-        future = self.loop.run_until_complete(self.__aenter__())
-        return future
+        return self.client.run(self.__aenter__())
 
     def __exit__(self, *args, **kwargs):
-        return  self.loop.run_until_complete(self.__aexit__(*args, **kwargs))
+        return self.client.run(self.__aexit__(*args, **kwargs))
 
 
 
@@ -0,0 +1,79 @@
+from bergen.contracts.exceptions import AssignmentCancelledError, AssignmentRetryError, AssignmentTimeoutError
+from typing import Any, Awaitable, Callable, Optional, Tuple, Union
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy:
+    """ Decides if and when a failed assignment is sent again
+
+    An exception is retried if it is an instance of one of the classes in retry_on, or if a
+    string in retry_on is the name of the exception raised in the Node (see
+    AssignmentCriticalError.type), and is not an instance of a class in ignore. Before
+    attempt n + 1 the policy waits backoff * multiplier ** (n - 1) seconds (at most max_backoff,
+    plus up to jitter of that as random jitter). By default only AssignmentRetryError, which
+    Nodes raise to ask for a retry, is retried; broader retry_on opt in to other failures.
+
+        policy = RetryPolicy(max_attempts=5, retry_on=(AssignmentRetryError, "ConnectionError"))
+        async with node.reserve(retry=policy) as reservation:
+            ...
+
+    Args:
+        max_attempts (int, optional): Attempts including the first one. Defaults to 3.
+        backoff (float, optional): Seconds before the first retry. Defaults to 0.5.
+        multiplier (float, optional): Growth of the backoff per retry. Defaults to 2.
+        max_backoff (float, optional): Upper bound of the backoff. Defaults to 30.
+        jitter (float, optional): Fraction of the backoff added at random. Defaults to 0.1.
+        retry_on (tuple, optional): Exception classes or names of Node exceptions to retry. Defaults to (AssignmentRetryError,).
+        ignore (tuple, optional): Exception classes that are never retried. Defaults to timeouts and cancellations.
+    """
+
+    def __init__(self, max_attempts: int = 3, backoff: float = 0.5, multiplier: float = 2, max_backoff: float = 30, jitter: float = 0.1,
+            retry_on: Tuple[Union[type, str], ...] = (AssignmentRetryError,),
+            ignore: Tuple[type, ...] = (AssignmentTimeoutError, AssignmentCancelledError)) -> None:
+        assert max_attempts > 0, "A Retry Policy needs at least one attempt"
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.multiplier = multiplier
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_on = retry_on
+        self.ignore = ignore
+
+    def should_retry(self, exception: BaseException, attempt: int) -> bool:
+        if attempt >= self.max_attempts or isinstance(exception, self.ignore): return False
+
+        for condition in self.retry_on:
+            if isinstance(condition, str):
+                if getattr(exception, "type", None) == condition: return True
+            elif isinstance(exception, condition):
+                return True
+
+        return False
+
+    def get_delay(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.backoff * self.multiplier ** (attempt - 1))
+        return delay + delay * self.jitter * random.random()
+
+    async def run(self, assign: Callable[[int], Awaitable], deadline: Optional[float] = None) -> Any:
+        """Calls assign with the number of the attempt until it succeeds or the failure is not retried
+
+        No retry is started that could only begin after the deadline (unix timestamp).
+        """
+        attempt = 1
+        while True:
+            try:
+                return await assign(attempt)
+            except Exception as e:
+                if not self.should_retry(e, attempt): raise
+
+                delay = self.get_delay(attempt)
+                if deadline is not None and time.time() + delay >= deadline: raise
+
+                logger.warning(f"Attempt {attempt} of {self.max_attempts} failed with {e!r}. Retrying in {delay:.2f} seconds")
+                await asyncio.sleep(delay)
+                attempt += 1
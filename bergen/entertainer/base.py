@@ -6,9 +6,11 @@ from bergen.handlers.unprovide import UnprovideHandler
 from bergen.clients.base import BaseBergen
 from bergen.handlers.base import Connector
 from bergen.messages import *
+from bergen.messages.postman.assign.bounced_forwarded_assign import DataModel as ForwardedAssignDataModel, MetaExtensionsModel as ForwardedAssignMetaExtensionsModel, MetaModel as ForwardedAssignMetaModel
 from bergen.hookable.base import Hookable
 import logging
-from typing import Dict, Type
+from typing import Dict, Optional, Type
+from collections import OrderedDict
 from bergen.models import Pod
 from bergen.actors.base import Actor
 from functools import partial
@@ -30,7 +32,7 @@ class TaskAlreadyDoneError(ProtocolError):
 
 class BaseEntertainer(Hookable):
     ''' Is a mixin for Our Bergen '''
-    def __init__(self, client: BaseBergen, raise_exceptions_local=False, loop=None, **kwargs) -> None:
+    def __init__(self, client: BaseBergen, raise_exceptions_local=False, loop=None, max_loopback_references=10000, **kwargs) -> None:
         super().__init__(**kwargs)
         self.provisions = {}
         self.raise_exceptions_local = raise_exceptions_local
@@ -55,6 +57,13 @@ class BaseEntertainer(Hookable):
         self.entertainments = {}
         self.assignments = {}
 
+        # In process Assignments (see loopback), the reservation_provision_map is learned from forwarded assignments
+        # and forgets reservations when they end, when their provision ends or when it outgrows max_loopback_references
+        self.reservation_provision_map: "OrderedDict[str, str]" = OrderedDict()
+        self.loopback_queues: Dict[str, asyncio.Queue] = {}
+        self.loopback_references: "OrderedDict[str, None]" = OrderedDict()
+        self.max_loopback_references = max_loopback_references
+
         self.pending = []
 
         self.tasks = []
@@ -96,6 +105,16 @@ class BaseEntertainer(Hookable):
         elif isinstance(message, BouncedForwardedAssignMessage):
             assert message.data.provision is not None, "Received assignation that had no Provision???"
             assert message.data.provision in self.provision_actor_queue_map, f"Provision not entertained {message.data.provision} {self.provision_actor_queue_map}"
+            self.reservation_provision_map[message.data.reservation] = message.data.provision
+            self.reservation_provision_map.move_to_end(message.data.reservation)
+            while len(self.reservation_provision_map) > self.max_loopback_references:
+                self.reservation_provision_map.popitem(last=False)
+
+            if message.meta.reference in self.loopback_references:
+                # The bookkeeping copy of an assignment that already runs in process
+                del self.loopback_references[message.meta.reference]
+                return
+
             await self.provision_actor_queue_map[message.data.provision].put(message)
             self.all_pod_assignments[message.meta.reference] = message.data.provision # Run in parallel
 
@@ -117,6 +136,58 @@ class BaseEntertainer(Hookable):
                 
 
 
+    def get_loopback_provision(self, reservation: str, provision: str = None) -> Optional[str]:
+        """Returns the provision if a reservation is served by a running Actor of this process
+
+        Args:
+            reservation (str): The reference of the Reservation
+            provision (str, optional): The provision the Reservation asked for. Defaults to the provision its assignments were forwarded to.
+        """
+        provision = provision or self.reservation_provision_map.get(reservation)
+        if provision in self.provision_actor_queue_map and not self.provision_actor_run_map[provision].done():
+            return provision
+        return None
+
+    def forget_reservation(self, reservation: str):
+        """Called when a Reservation of this process ends"""
+        self.reservation_provision_map.pop(reservation, None)
+
+    def forget_provision(self, provision: str):
+        for reservation in [reservation for reservation, mapped in self.reservation_provision_map.items() if mapped == provision]:
+            del self.reservation_provision_map[reservation]
+
+    def expect_loopback(self, provision: str, reference: str, queue: asyncio.Queue):
+        """Registers an assignment that will be dispatched in process, before the server is told about it
+
+        The Actor puts the messages of the assignment on queue, its copy forwarded by the server is
+        dropped in on_message.
+        """
+        self.loopback_queues[reference] = queue
+        self.loopback_references[reference] = None
+        while len(self.loopback_references) > self.max_loopback_references:
+            self.loopback_references.popitem(last=False)
+
+        self.all_pod_assignments[reference] = provision
+
+    def release_loopback(self, reference: str):
+        """Drops an expected assignment that was never dispatched"""
+        self.loopback_queues.pop(reference, None)
+        self.loopback_references.pop(reference, None)
+        self.all_pod_assignments.pop(reference, None)
+
+    async def loopback(self, provision: str, reference: str, reservation: str, args, kwargs, context=None, deadline=None):
+        """Dispatches an assignment straight to the queue of a local Actor
+
+        Args and kwargs are passed as they are (nothing gets shrinked or expanded). The assignment
+        must be registered with expect_loopback and sent to the server (with send_loopback_assign)
+        under the same reference first, so the server knows it before the Actor reports on it.
+        """
+        assign = BouncedForwardedAssignMessage.construct(
+            data=ForwardedAssignDataModel.construct(reservation=reservation, provision=provision, args=args, kwargs=kwargs),
+            meta=ForwardedAssignMetaModel.construct(reference=reference, extensions=ForwardedAssignMetaExtensionsModel.construct(progress=None, callback=None, deadline=deadline), context=context)
+        )
+        await self.provision_actor_queue_map[provision].put(assign)
+
     async def deactivateProvision(self, bounced_unprovide: BouncedUnprovideMessage):
         # Where should we do this?
         future = self.loop.create_future()
@@ -183,13 +254,14 @@ class BaseEntertainer(Hookable):
         ''' Takes an instance of a pod, asks arnheim to activate it and accepts requests on it,
         cancel this task to unprovide your local implementatoin '''
         provision_reference = bounced_provide.meta.reference # We register Actors unter its provision
-        actor = actorClass(self.connector)
+        actor = actorClass(self.connector, queue=self.client.queue_factory.create("actor"))
 
         try:
             self.provision_actor_map[provision_reference] = actor
             self.provision_actor_queue_map[provision_reference] = actor.queue
             run_task = create_task(actor.run(bounced_provide))
             run_task.add_done_callback(partial(self.actor_cancelled, actor))
+            run_task.add_done_callback(lambda task: self.forget_provision(provision_reference))
             self.provision_actor_run_map[provision_reference] = run_task
 
         except Exception as e:
@@ -0,0 +1,32 @@
+from bergen.clients.base import BaseBergen
+from bergen.messages.base import MessageModel
+from bergen.entertainer.base import BaseEntertainer
+from bergen.transports.multiplex import ENTERTAINER_CHANNEL, MultiplexedWebsocket
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class MultiplexedEntertainer(BaseEntertainer):
+    ''' An Entertainer that receives over the clients shared MultiplexedWebsocket '''
+
+    def __init__(self, client: BaseBergen, hooks=None, loop=None, raise_exceptions_local=False, max_loopback_references=10000, **transport_kwargs) -> None:
+        super().__init__(client, hooks=hooks, loop=loop, raise_exceptions_local=raise_exceptions_local, max_loopback_references=max_loopback_references)
+        self.transport_kwargs = transport_kwargs
+        self.multiplexer: MultiplexedWebsocket = None
+
+    async def connect(self):
+        self.multiplexer = self.client.getMultiplexer(**self.transport_kwargs)
+        await self.multiplexer.attach(ENTERTAINER_CHANNEL, self)
+
+    async def disconnect(self):
+        for reference, task in self.assignments.items():
+            if not task.done():
+                logger.info(f"Cancelling Assignment {task}")
+                task.cancel()
+
+        await self.multiplexer.detach(ENTERTAINER_CHANNEL)
+
+    async def forward(self, message: MessageModel):
+        await self.multiplexer.forward(ENTERTAINER_CHANNEL, message)
@@ -2,7 +2,10 @@
 from bergen.clients.base import BaseBergen
 from websockets.exceptions import ConnectionClosedError
 from bergen.messages.base import MessageModel
-from bergen.messages.utils import expandToMessage
+from bergen.messages.utils import get_message_decoder
+from bergen.messages.codecs import get_codec
+from bergen.transports.batching import collect_batch, encode_batch
+from bergen.transports.reconnect import Backoff, ReconnectManager, ReplayBuffer, acknowledging, replay
 import json
 from bergen.entertainer.base import BaseEntertainer
 import logging
@@ -22,19 +25,24 @@ logger = logging.getLogger()
 class WebsocketEntertainer(BaseEntertainer):
     ''' Is a mixin for Our Bergen '''
 
-    def __init__(self, client: BaseBergen, **kwargs) -> None:
+    def __init__(self, client: BaseBergen, trusted=None, codec=None, max_batch_size=1, max_batch_delay=0, auto_reconnect=True, reconnect_base_delay=1, reconnect_max_delay=30, replay_buffer_size=0, **kwargs) -> None:
         super().__init__(client, **kwargs)
         self.websocket_host = client.config.host
         self.websocket_port = client.config.port
         self.websocket_protocol = "wss" if client.config.secure else "ws"
+        self.decode = get_message_decoder(trusted=trusted if trusted is not None else client.trusted_messages)
+        self.codec = get_codec(codec)
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
         
-        self.auto_reconnect= True
-        self.allowed_retries = 2
-        self.current_retries = 0
+        self.auto_reconnect = auto_reconnect
+        self.replay_buffer_size = replay_buffer_size
+        self.reconnect_manager = ReconnectManager("Entertainer", self.connect_websocket, self.session, auto_reconnect=auto_reconnect, backoff=Backoff(reconnect_base_delay, reconnect_max_delay), style="[red]")
 
     async def connect(self):
-        self.incoming_queue = asyncio.Queue()
-        self.outgoing_queue = asyncio.Queue()
+        self.incoming_queue = self.client.queue_factory.create("entertainer.incoming", raw=True)
+        self.outgoing_queue = self.client.queue_factory.create("entertainer.outgoing")
+        self.replay_buffer = ReplayBuffer(self.replay_buffer_size)
         self.tasks = []
 
         self.startup_task = create_task(self.startup())
@@ -45,6 +53,8 @@ class WebsocketEntertainer(BaseEntertainer):
                 logger.info(f"Cancelling Assignment {task}")
                 task.cancel()
 
+        if self.startup_task: self.startup_task.cancel()
+
         if self.connection: await self.connection.close()
 
         if self.pending:
@@ -55,23 +65,9 @@ class WebsocketEntertainer(BaseEntertainer):
 
         
     async def startup(self):
-        try:
-            await self.connect_websocket()
-        except Exception as e:
-
-            logger.error(f"[red] Connection attempt as Entertainer failed")
-            self.current_retries += 1
-            if self.auto_reconnect:
-                sleeping_time = (self.current_retries + 1)
-                console.print(f"[red] Trying to Reconnect as Entertainer in {sleeping_time} seconds")
-                await asyncio.sleep(sleeping_time)
-                await self.startup()
-            else:
-                console.print("[red] Entertainer: No reconnecting attempt envisioned. Shutting Down!")
-                console.print_exception()
-
-        console.print("[red] Successfully established Entertainer Connection")
+        await self.reconnect_manager.run()
 
+    async def session(self):
         self.consumer_task = create_task(
             self.consumer()
         )
@@ -84,13 +80,16 @@ class WebsocketEntertainer(BaseEntertainer):
             self.workers()
         )
 
+        self.acknowledging_task = create_task(
+            acknowledging(self.connection, self.replay_buffer)
+        )
+
         done, self.pending = await asyncio.wait(
-            [self.consumer_task, self.worker_task, self.producer_task],
+            [self.consumer_task, self.worker_task, self.producer_task, self.acknowledging_task],
             return_when=asyncio.FIRST_EXCEPTION
         )
 
         logger.error(f"Lost connection inbetween everything :( {[ task.exception() for task in done]}")
-        logger.error(f'Reconnecting')
 
         try:
             for task in done:
@@ -107,8 +106,6 @@ class WebsocketEntertainer(BaseEntertainer):
             task.cancel()
 
         if self.connection: await self.connection.close()
-        self.current_retries = 0 # reset retries after one successfull connection
-        await self.startup() # Attempt to ronnect again
         
 
     async def connect_websocket(self):
@@ -130,11 +127,15 @@ class WebsocketEntertainer(BaseEntertainer):
             await self.incoming_queue.put(message)
 
     async def producer(self):
+        await replay(self.connection, self.replay_buffer, lambda batch: encode_batch(batch, self.codec), self.max_batch_size)
+
         while True:
-            message = await self.outgoing_queue.get()
-            await self.connection.send(message.to_channels())
+            messages = await collect_batch(self.outgoing_queue, self.max_batch_size, self.max_batch_delay)
+            self.replay_buffer.add(messages)
+            await self.connection.send(encode_batch(messages, self.codec))
 
-            self.outgoing_queue.task_done()
+            for message in messages:
+                self.outgoing_queue.task_done()
 
     async def forward(self, message: MessageModel):
         await self.outgoing_queue.put(message)
@@ -143,9 +144,9 @@ class WebsocketEntertainer(BaseEntertainer):
     async def workers(self):
         while True:
             message_str = await self.incoming_queue.get()
-            message = expandToMessage(json.loads(message_str))
-            logger.info(f"Received Message {message}")
-            await self.on_message(message)
+            for message in self.decode(message_str):
+                logger.info(f"Received Message {message}")
+                await self.on_message(message)
             self.incoming_queue.task_done()
 
 
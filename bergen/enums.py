@@ -3,12 +3,15 @@ from enum import Enum
 
 class HostProtocol(str, Enum):
     WEBSOCKET = "WEBSOCKET"
+    MULTIPLEX = "MULTIPLEX"
 
 class ProviderProtocol(str, Enum):
     WEBSOCKET = "WEBSOCKET"
+    MULTIPLEX = "MULTIPLEX"
 
 class PostmanProtocol(str, Enum):
     WEBSOCKET = "WEBSOCKET"
+    MULTIPLEX = "MULTIPLEX"
     KAFKA = "KAFKA"
     RABBITMQ = "RABBITMQ"
 
@@ -1,7 +1,8 @@
 import asyncio
-from bergen.legacy.utils import get_running_loop
+from bergen.clients.runtime import get_running_loop_or_none
 from typing import Any
 from bergen.contracts.reservation import Reservation
+from bergen.contracts.group import ReservationGroup
 from bergen.contracts.interaction import Interaction
 
 from bergen.monitor.monitor import Monitor
@@ -62,6 +63,22 @@ class NodeExtender(AssignationUIMixin):
     def reserve(self, loop=None, monitor: Monitor = None, ignore_node_exceptions=False, bounced=None, **params) -> Reservation:
         return Reservation(self, loop=loop, monitor=monitor, ignore_node_exceptions=ignore_node_exceptions, bounced=bounced, **params)
 
+    def reserve_group(self, size: int = 2, loop=None, **params) -> ReservationGroup:
+        return ReservationGroup(self, size=size, loop=loop, **params)
+
+    def flag(self, **flags) -> "NodeExtender":
+        """Sets flags of this Node on the current client
+
+        Flags are stored by node id, so they hold for every instance of the Node.
+
+            node.flag(deterministic=True) # Results are cached in the Assign Cache of the client
+        """
+        get_current_client().node_flags.setdefault(str(self.id), {}).update(flags)
+        return self
+
+    def is_flagged(self, flag: str) -> bool:
+        return bool(get_current_client().node_flags.get(str(self.id), {}).get(flag, False))
+
    
 
     def _repr_html_(self: Node):
@@ -80,28 +97,26 @@ class NodeExtender(AssignationUIMixin):
 
 
     async def assign(self, *args, reserve_params: dict = {}, **kwargs):
-        async with self.reserve(**reserve_params) as res:
-            return await res.assign(*args, **kwargs)
+        async with get_current_client().reservation_pool.lease(self, **reserve_params) as res:
+            return await res.assign_async(*args, **kwargs)
 
     async def stream(self, *args, reserve_params: dict = {}, **kwargs):
-        async with self.reserve(**reserve_params) as res:
+        async with get_current_client().reservation_pool.lease(self, **reserve_params) as res:
             async for result in res.stream(*args, **kwargs):
                 yield result
 
         
 
 
-    def __call__(self, *args: Any,  reserve_params: ReserveParams = None, **kwargs) -> Any:
-        try:
-            loop = get_running_loop()
-        except RuntimeError:
+    def __call__(self, *args: Any,  reserve_params: dict = {}, **kwargs) -> Any:
+        if get_running_loop_or_none() is None:
             assert self.type == NodeType.FUNCTION, "Can only call node functions syncronoicouly"
-            self._loop.run_until_complete()
+            return get_current_client().run(self.assign(*args, reserve_params=reserve_params, **kwargs))
         else:
             if self.type == NodeType.GENERATOR:
-                return self.stream(*args, **kwargs)
+                return self.stream(*args, reserve_params=reserve_params, **kwargs)
             if self.type == NodeType.FUNCTION:
-                return self.assign(*args, **kwargs)
+                return self.assign(*args, reserve_params=reserve_params, **kwargs)
 
 
     def __rich__(self):
@@ -1,4 +1,4 @@
-from .assign import AssignHandler
+from .assign import AssignHandler, LoopbackAssignHandler
 from .provide import ProvideHandler
 from .reserve import ReserveHandler
 from .unassign import UnassignHandler
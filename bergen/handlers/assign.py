@@ -2,11 +2,16 @@ from bergen.messages.postman.assign.assign_cancelled import AssignCancelledMessa
 from bergen.messages.postman.log import LogLevel
 from bergen.debugging import DebugLevel
 from bergen.handlers.base import ContractHandler
-from bergen.messages import BouncedForwardedAssignMessage, AssignYieldsMessage, AssignLogMessage, AssignDoneMessage, AssignReturnMessage, AssignCriticalMessage
+from bergen.messages import BouncedForwardedAssignMessage, AssignYieldsMessage, AssignLogMessage, AssignDoneMessage, AssignReturnMessage, AssignCriticalMessage, AssignRetryMessage
+from bergen.contracts.exceptions import AssignmentRetryError
+from bergen.messages.postman.assign.assign_return import DataModel as ReturnDataModel, MetaModel as ReturnMetaModel
+from bergen.messages.postman.assign.assign_yield import DataModel as YieldDataModel, MetaModel as YieldMetaModel
 from bergen.console import console
+import asyncio
 
 
 class AssignHandler(ContractHandler[BouncedForwardedAssignMessage]):
+    loopback = False
 
     @property
     def meta(self):
@@ -37,5 +42,46 @@ class AssignHandler(ContractHandler[BouncedForwardedAssignMessage]):
         await self.forward(return_message)
 
     async def pass_exception(self, exception):
+        if isinstance(exception, AssignmentRetryError):
+            await self.forward(AssignRetryMessage(data={"message": str(exception), "type": str(exception.__class__.__name__)}, meta=self.meta))
+            return
+
         error_message = AssignCriticalMessage(data={"message": str(exception), "type": str(exception.__class__.__name__)}, meta=self.meta)
-        await self.forward(error_message)
\ No newline at end of file
+        await self.forward(error_message)
+
+
+
+class LoopbackAssignHandler(AssignHandler):
+    """ Handles an assignment that was dispatched by a Reservation in the same process
+
+    Messages are put on the callers queue with their plain Python values (nothing is shrinked
+    or serialized). The server only receives the state changes for its bookkeeping, returns
+    and yields are sent without their values and logs are not sent at all."""
+    loopback = True
+
+    def __init__(self, message: BouncedForwardedAssignMessage, connection, queue: asyncio.Queue) -> None:
+        super().__init__(message, connection)
+        self.queue = queue
+
+    async def log(self, message, level=LogLevel.INFO):
+        # The caller runs in this process and displays it, printing it here too would only duplicate it
+        await self.pass_log(str(message), level=level)
+
+    async def pass_yield(self, value):
+        # Not validated, value is whatever the Actor yielded
+        await self.forward(AssignYieldsMessage.construct(data=YieldDataModel.construct(returns=value), meta=YieldMetaModel(**self.meta)))
+
+    async def pass_return(self, value):
+        await self.forward(AssignReturnMessage.construct(data=ReturnDataModel.construct(returns=value), meta=ReturnMetaModel(**self.meta)))
+
+    async def forward(self, message):
+        await self.queue.put(message)
+
+        if isinstance(message, AssignLogMessage): return
+        if isinstance(message, (AssignYieldsMessage, AssignReturnMessage)):
+            message = message.__class__(data={"returns": None}, meta=self.meta)
+
+        await self.connection.forward(message)
+
+        if not isinstance(message, AssignYieldsMessage):
+            self.connection.release_loopback(self.message.meta.reference)
@@ -16,6 +16,13 @@ class Connector(ABC):
     async def forward(self, message: MessageModel):
         await self.connection.forward(message)
 
+    def get_loopback_queue(self, reference: str):
+        """Returns the callers queue if the assignment was dispatched in process"""
+        return self.connection.loopback_queues.get(reference)
+
+    def release_loopback(self, reference: str):
+        self.connection.loopback_queues.pop(reference, None)
+
 
 class ContractHandler(Generic[T]):
 
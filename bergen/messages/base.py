@@ -5,6 +5,7 @@ from typing import Any, Callable, Optional, Type, TypeVar
 from pydantic.types import Json
 from pydantic import Field
 import uuid
+from .codecs import Codec, Frame, json_codec
 
 class MessageMetaExtensionsModel(BaseModel):
     """ Extensions to the AMQP Message protocol
@@ -33,6 +34,9 @@ class MessageModel(BaseModel):
 
     def to_channels(self) -> bytes:
         return json.dumps(self.dict())
+
+    def to_frame(self, codec: Codec = None) -> Frame:
+        return (codec or json_codec).encode(self.dict())
         
     @classmethod
     def from_message(cls: Type[T], message) -> T:
@@ -0,0 +1,135 @@
+from typing import Dict, Type, Union
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+
+Frame = Union[str, bytes]
+
+
+class CodecError(Exception):
+    pass
+
+
+class Codec:
+    """ A Codec serializes Messages into websocket Frames
+
+    Binary Codecs prefix every Frame with their one byte tag, so that the receiving
+    side can detect the Codec per Frame and both sides can mix Codecs freely"""
+    name: str = None
+    tag: bytes = None
+
+    def encode(self, payload: dict) -> Frame:
+        raise NotImplementedError("Please overwrite")
+
+    def decode(self, frame: Frame) -> dict:
+        raise NotImplementedError("Please overwrite")
+
+
+class JSONCodec(Codec):
+    name = "json"
+
+    def encode(self, payload: dict) -> Frame:
+        return json.dumps(payload)
+
+    def decode(self, frame: Frame) -> dict:
+        return loads(frame)
+
+
+class MsgPackCodec(Codec):
+    name = "msgpack"
+    tag = b"\x01"
+
+    def __init__(self) -> None:
+        import msgpack
+        self._packb = msgpack.packb
+        self._unpackb = msgpack.unpackb
+
+    def encode(self, payload: dict) -> Frame:
+        return self.tag + self._packb(payload, use_bin_type=True)
+
+    def decode(self, frame: Frame) -> dict:
+        return self._unpackb(frame[1:], raw=False)
+
+
+class CBORCodec(Codec):
+    name = "cbor"
+    tag = b"\x02"
+
+    def __init__(self) -> None:
+        import cbor2
+        self._dumps = cbor2.dumps
+        self._loads = cbor2.loads
+
+    def encode(self, payload: dict) -> Frame:
+        return self.tag + self._dumps(payload)
+
+    def decode(self, frame: Frame) -> dict:
+        return self._loads(frame[1:])
+
+
+codec_classes: Dict[str, Type[Codec]] = {
+    JSONCodec.name: JSONCodec,
+    MsgPackCodec.name: MsgPackCodec,
+    CBORCodec.name: CBORCodec,
+}
+
+json_codec = JSONCodec()
+_codec_instances: Dict[str, Codec] = {JSONCodec.name: json_codec}
+_tag_codec_map: Dict[bytes, Codec] = {}
+
+
+def get_codec(name: str = None) -> Codec:
+    """Gets the Codec registered under name
+
+    Falls back to JSON if the Codec is unknown or its library is not installed,
+    JSON is understood by every Arkitekt Server.
+
+    Args:
+        name (str, optional): The name of the Codec (json, msgpack, cbor). Defaults to json.
+    """
+    name = (name or JSONCodec.name).lower()
+    if name in _codec_instances:
+        return _codec_instances[name]
+
+    if name not in codec_classes:
+        logger.error(f"Unknown Codec {name}. Falling back to JSON")
+        return json_codec
+
+    try:
+        codec = codec_classes[name]()
+    except ImportError:
+        logger.error(f"You cannot use the {name} Codec without installing its library. Falling back to JSON")
+        return json_codec
+
+    _codec_instances[name] = codec
+    _tag_codec_map[codec.tag] = codec
+    return codec
+
+
+def decode_frame(frame: Frame) -> dict:
+    """Decodes a Frame with the Codec it was encoded with
+
+    Text Frames are always JSON, binary Frames are detected by their tag byte
+    (binary Frames without a known tag are treated as JSON)"""
+    if isinstance(frame, str):
+        return loads(frame)
+
+    tag = frame[:1]
+    if tag in _tag_codec_map:
+        return _tag_codec_map[tag].decode(frame)
+
+    for codec_class in codec_classes.values():
+        if codec_class.tag == tag:
+            codec = get_codec(codec_class.name)
+            if codec.tag != tag: raise CodecError(f"Received a {codec_class.name} Frame but cannot decode it. Please install its library")
+            return codec.decode(frame)
+
+    return loads(frame)
@@ -6,4 +6,5 @@ from .assign_return import AssignReturnMessage
 from .bounced_assign import BouncedAssignMessage
 from .assign_yield import AssignYieldsMessage
 from .assign_done import AssignDoneMessage
-from .bounced_forwarded_assign import BouncedForwardedAssignMessage
\ No newline at end of file
+from .bounced_forwarded_assign import BouncedForwardedAssignMessage
+from .assign_retry import AssignRetryMessage
\ No newline at end of file
@@ -6,6 +6,8 @@ from typing import List, Optional
 
 class MetaExtensionsModel(MessageMetaExtensionsModel):
     with_progress: bool = False
+    loopback: bool = False # The assignment already runs in the callers process, this is bookkeeping only
+    deadline: Optional[float] # Unix timestamp after which the result is no longer needed
 
 class MetaModel(MessageMetaModel):
     '''The reference of the metamodel representats the assignation on the platform '''
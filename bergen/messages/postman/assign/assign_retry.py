@@ -0,0 +1,19 @@
+from ..exception import ExceptionDataModel
+from ....messages.types import  ASSIGN_RETRY
+from ....messages.base import MessageMetaExtensionsModel, MessageMetaModel, MessageModel
+from typing import Optional
+
+
+class MetaExtensionsModel(MessageMetaExtensionsModel):
+    # Set by postman consumer
+    progress: Optional[str]
+    callback: Optional[str]
+
+class MetaModel(MessageMetaModel):
+    type: str = ASSIGN_RETRY
+    extensions: Optional[MetaExtensionsModel]
+
+class AssignRetryMessage(MessageModel):
+    """The assignment failed, but the provider expects that it succeeds if it is sent again"""
+    data: ExceptionDataModel
+    meta: MetaModel
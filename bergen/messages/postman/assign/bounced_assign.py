@@ -13,6 +13,8 @@ class MetaExtensionsModel(MessageMetaExtensionsModel):
     # Set by postman consumer
     progress: Optional[str]
     callback: Optional[str]
+    loopback: bool = False # The assignment already runs in the callers process, this is bookkeeping only
+    deadline: Optional[float] # Unix timestamp after which the result is no longer needed
 
 class MetaModel(MessageMetaModel):
     type: str = BOUNCED_ASSIGN
@@ -10,6 +10,7 @@ class MetaExtensionsModel(MessageMetaExtensionsModel):
     # Set by postman consumer
     progress: Optional[str]
     callback: Optional[str]
+    deadline: Optional[float] # Unix timestamp after which the result is no longer needed, Actors skip or abort the work
 
 class MetaModel(MessageMetaModel):
     type: str = BOUNCED_FORWARDED_ASSIGN
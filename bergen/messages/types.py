@@ -1,6 +1,7 @@
 #Base Types
 EXCEPTION = "exception"
 ALLOWANCE = "allowance"
+BATCH = "batch"
 
 ASSIGNATION = "assignation"
 PROVISION = "provision"
@@ -7,6 +7,10 @@ from .postman.reserve import *
 from .postman.unreserve import *
 from .postman.unassign import *
 from .exception import ExceptionMessage
+from .codecs import Frame, decode_frame
+from pydantic.fields import SHAPE_SINGLETON
+from pydantic.main import BaseModel
+from typing import Callable, Dict, List, Type
 import json
 
 
@@ -45,6 +49,7 @@ registry = {
     BOUNCED_ASSIGN: BouncedAssignMessage,
     BOUNCED_FORWARDED_ASSIGN: BouncedForwardedAssignMessage,
     ASSIGN_CRITICAL: AssignCriticalMessage,
+    ASSIGN_RETRY: AssignRetryMessage,
     ASSIGN_CANCELLED: AssignCancelledMessage,
     ASSIGN_LOG: AssignLogMessage,
     ASSIGN_RETURN: AssignReturnMessage,
@@ -74,6 +79,72 @@ def expandToMessage(message: dict) -> MessageModel:
     return cls(**message)
     
 
+def _compile_constructor(model: Type[BaseModel]) -> Callable[[dict], BaseModel]:
+    """ Builds a constructor for model that skips validation
+
+    Nested Models are constructed recursively, as pydantics construct() would
+    otherwise leave them as plain dicts"""
+    nested = {field.alias: _compile_constructor(field.type_) for field in model.__fields__.values()
+        if field.shape == SHAPE_SINGLETON and isinstance(field.type_, type) and issubclass(field.type_, BaseModel)}
+
+    def construct(values):
+        if not isinstance(values, dict):
+            return values
+
+        for alias, constructor in nested.items():
+            if alias in values:
+                values[alias] = constructor(values[alias])
+
+        return model.construct(**values)
+
+    return construct
+
+
+trusted_registry: Dict[str, Callable[[dict], MessageModel]] = {key: _compile_constructor(cls) for key, cls in registry.items()}
+
+
+def expandToMessageTrusted(message: dict) -> MessageModel:
+    """ Expands a message from a trusted source without running a full validation
+
+    Only the fields that are needed for routing (meta.type and meta.reference) are
+    checked, everything else is taken as is. Use this only for frames that come
+    from the Arkitekt Server."""
+    assert isinstance(message, dict), "Please provide already serialized Messages"
+    try:
+        meta = message["meta"]
+        constructor = trusted_registry[meta["type"]]
+    except:
+        raise MessageError(f"Didn't find an expander for message {message}")
+
+    if not isinstance(meta.get("reference"), str):
+        raise MessageError(f"Message {message} has no valid reference")
+
+    return constructor(message)
+
+
+def expandToMessages(message: dict, expander: Callable[[dict], MessageModel] = expandToMessage) -> List[MessageModel]:
+    """ Expands a message or a batch envelope of messages into a list of Messages"""
+    assert isinstance(message, dict), "Please provide already serialized Messages"
+    if message.get("meta", {}).get("type") == BATCH:
+        return [expander(item) for item in message["data"]["messages"]]
+
+    return [expander(message)]
+
+
+def get_message_decoder(trusted=False) -> Callable[[Frame], List[MessageModel]]:
+    """Returns a decoder that turns a raw Frame into its Messages
+
+    The Codec of the Frame is detected per Frame (see bergen.messages.codecs) and
+    batch envelopes are unpacked, so the decoder always returns a list.
+
+    Args:
+        trusted (bool, optional): Skip the full validation for trusted Frames. Defaults to False.
+    """
+    if trusted:
+        return lambda frame: expandToMessages(decode_frame(frame), expander=expandToMessageTrusted)
+    return lambda frame: expandToMessages(decode_frame(frame))
+
+
 def expandFromRabbitMessage(message) -> MessageModel:
     text = message.body.decode()
     return expandToMessage(json.loads(text))
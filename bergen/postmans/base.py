@@ -4,6 +4,7 @@ from contextvars import Context
 from bergen.messages.postman.log import LogLevel
 from bergen.messages import *
 from bergen.messages.base import MessageModel
+from bergen.postmans.registry import ASSIGNMENT, RESERVATION, ReferenceRegistry
 from bergen.postmans.utils import build_assign_message, build_reserve_message, build_unassign_messsage, build_unreserve_messsage
 import uuid
 from bergen.hookable.base import Hookable
@@ -32,13 +33,15 @@ class ProtocolException(Exception):
 class BasePostman(Hookable):
     """ A Postman takes node requests and translates them to Bergen calls, basic implementations are GRAPHQL and PIKA"""
     
-    def __init__(self, client, requires_configuration=True, loop=None,**kwargs) -> None:
+    def __init__(self, client, requires_configuration=True, loop=None, assignment_ttl=3600, reservation_ttl=None, **kwargs) -> None:
         super().__init__(**kwargs)
         self.loop = loop or client.loop
         self.client = client
 
+        # The queues of running Assignments and Reservations by reference
+        self.references = ReferenceRegistry(assignment_ttl=assignment_ttl, reservation_ttl=reservation_ttl)
+
         # Assignments and their Cancellations
-        self.assignment_stream_queues: ReferenceQueueMap = {}
         self.assignments: ReferenceFutureMap = {}
         self.assignment_progress_functions: ReferenceProgressFuncMap = {}
 
@@ -46,7 +49,6 @@ class BasePostman(Hookable):
         self.unassignment_progress_functions: ReferenceProgressFuncMap = {}
 
         # Reservations and their Cancellations
-        self.reservation_stream_queues: ReferenceQueueMap = {}
         self.reservations: ReferenceFutureMap = {}
         self.reservations_progress_functions: ReferenceProgressFuncMap = {}
 
@@ -69,21 +71,17 @@ class BasePostman(Hookable):
 
     async def on_message(self, message: MessageModel):
         # First we check the streams
-        reference = message.meta.reference
-
-        if reference in self.assignment_stream_queues:
-            return await self.assignment_stream_queues[reference].put(message)
-
-        if reference in self.reservation_stream_queues:
-            return await self.reservation_stream_queues[reference].put(message)
-
-        else:
+        if not await self.references.route(message):
             console.log(f"Unknown message {message}") 
+
+    def getReferenceStats(self) -> dict:
+        """Returns the number of tracked Assignments and Reservations and how many were evicted"""
+        return self.references.stats()
         
 
     async def stream_reserve_to_queue(self, queue, node_id: str = None, template_id: str = None , provision: str = None, params_dict: dict = {}, with_log= True, context=None):
         reserve_reference = str(uuid.uuid4())
-        self.reservation_stream_queues[reserve_reference] = queue
+        self.references.register(RESERVATION, reserve_reference, queue)
         reserve = build_reserve_message(reserve_reference, node_id, template_id, provision, params_dict=params_dict, with_log=with_log, context=context)
         await self.forward(reserve)
         return reserve_reference
@@ -95,22 +93,33 @@ class BasePostman(Hookable):
         return unreserve_reference
 
     async def delete_reservequeue(self, reference: str = None):
-        del self.reservation_stream_queues[reference]
+        self.references.evict(reference)
 
-    async def stream_assign_to_queue(self, queue, reservation: str, shrinked_args, shrinked_kwargs = {}, with_log=True, persist=True, context = None):
+    async def stream_assign_to_queue(self, queue, reservation: str, shrinked_args, shrinked_kwargs = {}, with_log=True, persist=True, context = None, deadline = None):
         assign_reference = str(uuid.uuid4())
-        self.assignment_stream_queues[assign_reference] = queue
-        assign = build_assign_message(assign_reference, reservation, shrinked_args, kwargs=shrinked_kwargs, with_log=with_log, context=context, persist=persist)
+        self.references.register(ASSIGNMENT, assign_reference, queue)
+        assign = build_assign_message(assign_reference, reservation, shrinked_args, kwargs=shrinked_kwargs, with_log=with_log, context=context, persist=persist, deadline=deadline)
+        await self.forward(assign)
+        return assign_reference
+
+    async def send_loopback_assign(self, assign_reference: str, reservation: str, with_log=True, persist=True, context = None, deadline = None):
+        """Tells the server about an assignment that is dispatched to an Actor in this process
+
+        The assign carries no arguments and its results are delivered in process, so messages
+        the server sends for this reference are dropped."""
+        self.references.mute(assign_reference)
+        assign = build_assign_message(assign_reference, reservation, None, None, with_log=with_log, context=context, persist=persist, loopback=True, deadline=deadline)
         await self.forward(assign)
         return assign_reference
 
-    async def send_unassign(self, assignation: str = None, context: Context= None):
+    async def send_unassign(self, assignation: str = None, context: Context= None, queue = None):
         unassign_reference = str(uuid.uuid4())
+        if queue is not None: self.references.register(ASSIGNMENT, unassign_reference, queue) # The unassign done (or critical) arrives on queue
         unreserve = build_unassign_messsage(unassign_reference, assignation, context=context)
         await self.forward(unreserve)
         return unassign_reference
 
     async def delete_assignqueue(self, reference: str = None):
-        del self.assignment_stream_queues[reference]
+        self.references.evict(reference)
 
     
\ No newline at end of file
@@ -0,0 +1,27 @@
+from bergen.messages.base import MessageModel
+from bergen.postmans.base import BasePostman
+from bergen.transports.multiplex import POSTMAN_CHANNEL, MultiplexedWebsocket
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class MultiplexedPostman(BasePostman):
+    """ A Postman that sends over the clients shared MultiplexedWebsocket"""
+    type = "multiplex"
+
+    def __init__(self, client, hooks=None, loop=None, assignment_ttl=3600, reservation_ttl=None, **transport_kwargs) -> None:
+        super().__init__(client, hooks=hooks, loop=loop, assignment_ttl=assignment_ttl, reservation_ttl=reservation_ttl)
+        self.transport_kwargs = transport_kwargs
+        self.multiplexer: MultiplexedWebsocket = None
+
+    async def connect(self):
+        self.multiplexer = self.client.getMultiplexer(**self.transport_kwargs)
+        await self.multiplexer.attach(POSTMAN_CHANNEL, self)
+
+    async def disconnect(self):
+        await self.multiplexer.detach(POSTMAN_CHANNEL)
+
+    async def forward(self, message: MessageModel):
+        await self.multiplexer.forward(POSTMAN_CHANNEL, message)
@@ -0,0 +1,161 @@
+from bergen.messages.base import MessageModel
+from bergen.messages.postman.reserve.reserve_transition import ReserveState
+from bergen.messages.types import ASSIGN_CANCELLED, ASSIGN_CRITICAL, ASSIGN_DONE, ASSIGN_RETRY, ASSIGN_RETURN, RESERVE_TRANSITION, UNASSIGN_CRITICAL, UNASSIGN_DONE
+from bergen.legacy.utils import create_task
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+ASSIGNMENT = "assignment"
+RESERVATION = "reservation"
+
+ASSIGNMENT_TERMINAL_TYPES = {ASSIGN_RETURN, ASSIGN_DONE, ASSIGN_CRITICAL, ASSIGN_RETRY, ASSIGN_CANCELLED, UNASSIGN_DONE, UNASSIGN_CRITICAL} # Unassigns are tracked like assignments
+# The exit states a Reservation handles, a critical error or the unreserve done can still be followed by the CANCELLED transition
+RESERVATION_TERMINAL_STATES = {ReserveState.ERROR, ReserveState.CANCELLED}
+
+
+def is_terminal(kind: str, message: MessageModel) -> bool:
+    if kind == ASSIGNMENT:
+        return message.meta.type in ASSIGNMENT_TERMINAL_TYPES
+
+    if message.meta.type == RESERVE_TRANSITION: return message.data.state in RESERVATION_TERMINAL_STATES
+    return False
+
+
+class ReferenceRegistry:
+    """ Maps the references of running Assignments and Reservations to their queues
+
+    Entries are evicted once their terminal message was delivered (return, done, critical
+    or cancelled for assignments, the ERROR or CANCELLED transition for reservations).
+    Reservations with other exit states evict themselves when their stream worker ends.
+    References that never see a terminal message (e.g. an abandoned assignment) are evicted
+    after they were idle for their ttl, a ttl of None keeps them until they terminate.
+    Expired entries are swept lazily on registration, so there is no background task.
+
+    Messages are put on the queues without waiting, so a full queue never holds up the
+    messages of other references. If a queue is full (and its policy neither dropped nor
+    failed the message) the messages of its reference are kept in a backlog that a task
+    of its own puts on the queue in order, as its consumer makes room.
+    """
+
+    def __init__(self, assignment_ttl: Optional[float] = 3600, reservation_ttl: Optional[float] = None, sweep_interval: float = 10, max_muted: int = 10000) -> None:
+        self.ttls = {ASSIGNMENT: assignment_ttl, RESERVATION: reservation_ttl}
+        self.sweep_interval = sweep_interval
+        self.entries: Dict[str, "OrderedDict[str, list]"] = {ASSIGNMENT: OrderedDict(), RESERVATION: OrderedDict()}
+        self.evicted = {"terminal": 0, "ttl": 0, "manual": 0}
+        self.last_sweep = time.monotonic()
+
+        # Messages waiting for room on the full queue of their reference, and the task delivering them
+        self.backlogs: Dict[str, Tuple[Deque[MessageModel], asyncio.Task]] = {}
+
+        # References whose messages are already delivered in process (loopback), the server echoes are dropped
+        self.muted: "OrderedDict[str, None]" = OrderedDict()
+        self.max_muted = max_muted
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.entries.values())
+
+    def __contains__(self, reference: str):
+        return any(reference in entries for entries in self.entries.values())
+
+    def register(self, kind: str, reference: str, queue: asyncio.Queue):
+        now = time.monotonic()
+        if now - self.last_sweep > self.sweep_interval:
+            self.sweep(now)
+
+        self.entries[kind][reference] = [queue, now]
+        self.entries[kind].move_to_end(reference)
+
+    def mute(self, reference: str):
+        self.muted[reference] = None
+        while len(self.muted) > self.max_muted:
+            self.muted.popitem(last=False)
+
+    def get(self, reference: str) -> Optional[asyncio.Queue]:
+        for entries in self.entries.values():
+            if reference in entries:
+                return entries[reference][0]
+        return None
+
+    def evict(self, reference: str, reason: str = "manual") -> bool:
+        if reason != "terminal" and reference in self.backlogs:
+            self.backlogs.pop(reference)[1].cancel() # Nobody consumes them anymore
+
+        for entries in self.entries.values():
+            if entries.pop(reference, None) is not None:
+                self.evicted[reason] += 1
+                return True
+        return False
+
+    async def route(self, message: MessageModel) -> bool:
+        """Puts the message on the queue of its reference and evicts the reference if the message was terminal
+
+        Returns:
+            bool: If the message was routed to a queue
+        """
+        reference = message.meta.reference
+
+        if reference in self.muted:
+            if message.meta.type in ASSIGNMENT_TERMINAL_TYPES: del self.muted[reference]
+            return True
+
+        for kind, entries in self.entries.items():
+            if reference in entries:
+                entry = entries[reference]
+                entry[1] = time.monotonic()
+                entries.move_to_end(reference)
+
+                self.deliver(reference, entry[0], message)
+                if is_terminal(kind, message): self.evict(reference, reason="terminal")
+                return True
+
+        return False
+
+    def deliver(self, reference: str, queue: asyncio.Queue, message: MessageModel):
+        if reference not in self.backlogs:
+            try:
+                queue.put_nowait(message)
+                return
+            except asyncio.QueueFull:
+                backlog = deque()
+                self.backlogs[reference] = (backlog, create_task(self.drain(reference, queue, backlog)))
+
+        self.backlogs[reference][0].append(message)
+
+    async def drain(self, reference: str, queue: asyncio.Queue, backlog: Deque[MessageModel]):
+        """Puts the backlog of one reference on its queue, waiting for room (in order)"""
+        while backlog:
+            await queue.put(backlog[0])
+            backlog.popleft()
+
+        del self.backlogs[reference]
+
+    def sweep(self, now: float = None):
+        """Evicts all entries that were idle for longer than their ttl"""
+        now = now or time.monotonic()
+        self.last_sweep = now
+
+        for kind, entries in self.entries.items():
+            ttl = self.ttls[kind]
+            if ttl is None: continue
+
+            # Entries are ordered by their last activity, so only the expired ones are visited
+            while entries:
+                reference, (queue, last_seen) = next(iter(entries.items()))
+                if now - last_seen <= ttl: break
+                logger.warning(f"Evicting {kind} {reference} after {ttl} seconds without a message")
+                entries.popitem(last=False)
+                self.evicted["ttl"] += 1
+
+    def stats(self) -> dict:
+        return {
+            "assignments": len(self.entries[ASSIGNMENT]),
+            "reservations": len(self.entries[RESERVATION]),
+            "muted": len(self.muted),
+            "evicted": dict(self.evicted),
+        }
@@ -1,6 +1,6 @@
 from bergen.messages import *
 
-def build_assign_message(reference, reservation, args, kwargs, with_log=False, context=None, persist=False):
+def build_assign_message(reference, reservation, args, kwargs, with_log=False, context=None, persist=False, loopback=False, deadline=None):
     assert reference is not None, "Must have a reference"
 
     data = {
@@ -13,7 +13,9 @@ def build_assign_message(reference, reservation, args, kwargs, with_log=False, c
                                     "reference": reference, 
                                     "extensions": {
                                         "with_progress": with_log,
-                                        "persist": persist
+                                        "persist": persist,
+                                        "loopback": loopback,
+                                        "deadline": deadline
                                     }
     }
 
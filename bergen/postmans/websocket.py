@@ -2,7 +2,10 @@ from asyncio.tasks import ensure_future
 
 from websockets.exceptions import ConnectionClosedError
 from bergen.messages import *
-from bergen.messages.utils import expandToMessage 
+from bergen.messages.utils import get_message_decoder
+from bergen.messages.codecs import get_codec
+from bergen.transports.batching import collect_batch, encode_batch
+from bergen.transports.reconnect import Backoff, ReconnectManager, ReplayBuffer, acknowledging, replay
 from typing import Callable
 from bergen.utils import expandOutputs, shrinkInputs
 from bergen.messages.exception import ExceptionMessage
@@ -44,7 +47,7 @@ class Channel:
 class WebsocketPostman(BasePostman):
     type = "websocket"
 
-    def __init__(self, client, port= None, protocol = None, host= None, auth= None, **kwargs) -> None:
+    def __init__(self, client, port= None, protocol = None, host= None, auth= None, trusted=None, codec=None, max_batch_size=1, max_batch_delay=0, auto_reconnect=True, reconnect_base_delay=1, reconnect_max_delay=30, replay_buffer_size=0, **kwargs) -> None:
         super().__init__(client, **kwargs)
         self.websocket_host = client.config.host
         self.websocket_port = client.config.port
@@ -52,12 +55,17 @@ class WebsocketPostman(BasePostman):
         self.connection = None      
         self.channel = None         
         self.callback_queue = ''
+        self.decode = get_message_decoder(trusted=trusted if trusted is not None else client.trusted_messages)
+        self.codec = get_codec(codec)
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
 
         self.progresses = {}
 
         # Retry logic
-        self.auto_reconnect = True
-        self.current_retries = 0
+        self.auto_reconnect = auto_reconnect
+        self.replay_buffer_size = replay_buffer_size
+        self.reconnect_manager = ReconnectManager("Postman", self.connect_websocket, self.session, auto_reconnect=auto_reconnect, backoff=Backoff(reconnect_base_delay, reconnect_max_delay), style="[green]")
 
         # Result and Stream Function
         self.futures = {}
@@ -70,14 +78,16 @@ class WebsocketPostman(BasePostman):
         self.receiving_task = None
         self.sending_task = None
         self.callback_task = None
+        self.acknowledging_task = None
 
 
         self.assign_routing = "assignation_request"
 
     async def connect(self):
-        self.callback_queue = asyncio.Queue()
+        self.callback_queue = self.client.queue_factory.create("postman.callback", raw=True)
         self.progress_queue = asyncio.Queue()
-        self.send_queue = asyncio.Queue()
+        self.send_queue = self.client.queue_factory.create("postman.send")
+        self.replay_buffer = ReplayBuffer(self.replay_buffer_size)
 
         
 
@@ -96,6 +106,7 @@ class WebsocketPostman(BasePostman):
         if self.receiving_task: self.receiving_task.cancel()
         if self.sending_task: self.sending_task.cancel()
         if self.callback_task: self.callback_task.cancel()
+        if self.acknowledging_task: self.acknowledging_task.cancel()
 
         if self.startup_task:
             self.startup_task.cancel()
@@ -107,23 +118,9 @@ class WebsocketPostman(BasePostman):
             logger.info("Postman disconnected")
 
     async def startup(self):
+        await self.reconnect_manager.run()
 
-        try:
-            await self.connect_websocket()
-        except Exception as e:
-            console.print("[green] Connection attempt as Postman failed")
-            self.current_retries += 1
-            self.current_retries += 1
-            if self.auto_reconnect:
-                sleeping_time = (self.current_retries + 1)
-                console.print(f"[green] Trying to Reconnect as Postman in {sleeping_time} seconds")
-                await asyncio.sleep(sleeping_time)
-                await self.startup()
-            else:
-                return
-
-        console.print("[green] Successfully established Postman Connection")
-
+    async def session(self):
         self.receiving_task = create_task(
             self.receiving()
         )
@@ -136,9 +133,13 @@ class WebsocketPostman(BasePostman):
             self.callbacks()
         )
 
+        self.acknowledging_task = create_task(
+            acknowledging(self.connection, self.replay_buffer)
+        )
+
 
         done, self.pending = await asyncio.wait(
-            [self.callback_task, self.receiving_task, self.sending_task],
+            [self.callback_task, self.receiving_task, self.sending_task, self.acknowledging_task],
             return_when=asyncio.FIRST_EXCEPTION
         )
 
@@ -155,17 +156,12 @@ class WebsocketPostman(BasePostman):
 
 
         logger.debug(f"Postman: Lost connection inbetween everything :( {[ task.exception() for task in done]}")
-        logger.error(f'Postman: Trying to reconnect Postman')
-        
 
         if self.connection: await self.connection.close()
 
         for task in self.pending:
             task.cancel()
 
-        self.current_retries = 0 # reset retries after one successfull connection
-        await self.startup()
-
 
     async def connect_websocket(self):
         try:
@@ -185,21 +181,25 @@ class WebsocketPostman(BasePostman):
             await self.callback_queue.put(message)
     
     async def sending(self):
+        await replay(self.connection, self.replay_buffer, lambda batch: encode_batch(batch, self.codec), self.max_batch_size)
+
         while True:
-            message = await self.send_queue.get()
+            messages = await collect_batch(self.send_queue, self.max_batch_size, self.max_batch_delay)
+            self.replay_buffer.add(messages)
             if self.connection:
-                await self.connection.send(message.to_channels())
+                await self.connection.send(encode_batch(messages, self.codec))
             else:
                 raise Exception("No longer connected. Did you use an Async context manager?")
 
-            self.send_queue.task_done()
+            for message in messages:
+                self.send_queue.task_done()
 
     async def callbacks(self):
         while True:
             message = await self.callback_queue.get()
             try:
-                parsed_message = expandToMessage(json.loads(message))
-                await self.on_message(parsed_message)
+                for parsed_message in self.decode(message):
+                    await self.on_message(parsed_message)
             except:
                 raise 
 
@@ -207,7 +207,7 @@ class WebsocketPostman(BasePostman):
 
 
     async def forward(self, message: MessageModel):
-        console.log(message)
+        logger.debug("Forwarding %s", message) # Lazy, rendering every message costs more than sending it
         await self.send_queue.put(message)
         
 
@@ -1,6 +1,7 @@
 from abc import abstractmethod
 from bergen.messages.postman.log import LogLevel
 from bergen.clients.base import BaseBergen
+from bergen.clients.runtime import get_running_loop_or_none
 from bergen.messages.base import MessageModel
 from bergen.hookable.base import Hookable, hookable
 from bergen.actors.base import Actor
@@ -54,7 +55,7 @@ class BaseProvider(Hookable):
 
         self.template_actorClass_map = {}
 
-        self.message_queue = asyncio.Queue()
+        self.message_queue = client.queue_factory.create("provider.messages")
         self.provisions = {}
         
         
@@ -62,7 +63,7 @@ class BaseProvider(Hookable):
         console.log(f"[blue] {message}")
 
 
-    def template(self, node: Node, policy: PodPolicy = MultiplePodPolicy(), auto_provide=False, on_provide=None,  on_unprovide=None, bypass_shrink=False, bypass_expand=False, **implementation_details):
+    def template(self, node: Node, policy: PodPolicy = MultiplePodPolicy(), auto_provide=False, on_provide=None,  on_unprovide=None, bypass_shrink=False, bypass_expand=False, lazy_expand=False, **implementation_details):
         console.print("[blue] Registered to Provide")
         console.print(node)
 
@@ -86,7 +87,7 @@ class BaseProvider(Hookable):
                 is_generatorfunction = inspect.isgeneratorfunction(function_or_actor)
                 is_function = inspect.isfunction(function_or_actor)
 
-                class_attributes = {"assign": staticmethod(function_or_actor), "expandInputs": not bypass_expand, "shrinkOutputs":  not bypass_shrink}
+                class_attributes = {"assign": staticmethod(function_or_actor), "expandInputs": not bypass_expand, "lazyInputs": lazy_expand, "shrinkOutputs":  not bypass_shrink}
 
 
                 if is_coroutine:
@@ -242,10 +243,10 @@ class BaseProvider(Hookable):
 
             
     def provide(self):
-        if self.loop.is_running():
+        if get_running_loop_or_none() is self.loop:
             raise Exception("Cannot do this in a running loop, please await or create task of provide_async()")
         else:
-            self.loop.run_until_complete(self.provide_async())
+            self.client.run(self.provide_async())
 
         # we enter a never-ending loop that waits for data
         # and runs callbacks whenever necessary.
@@ -0,0 +1,27 @@
+from bergen.clients.base import BaseBergen
+from bergen.messages.base import MessageModel
+from bergen.provider.base import BaseProvider
+from bergen.transports.multiplex import PROVIDER_CHANNEL, MultiplexedWebsocket
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class MultiplexedProvider(BaseProvider):
+    ''' A Provider that receives over the clients shared MultiplexedWebsocket '''
+
+    def __init__(self, client: BaseBergen, hooks=None, loop=None, **transport_kwargs) -> None:
+        super().__init__(client, hooks=hooks, loop=loop)
+        self.transport_kwargs = transport_kwargs
+        self.multiplexer: MultiplexedWebsocket = None
+
+    async def connect(self):
+        self.multiplexer = self.client.getMultiplexer(**self.transport_kwargs)
+        await self.multiplexer.attach(PROVIDER_CHANNEL, self)
+
+    async def disconnect(self):
+        await self.multiplexer.detach(PROVIDER_CHANNEL)
+
+    async def forward(self, message: MessageModel):
+        await self.multiplexer.forward(PROVIDER_CHANNEL, message)
@@ -5,7 +5,10 @@ from bergen.clients.base import BaseBergen
 
 from websockets.exceptions import ConnectionClosedError
 from bergen.messages import *
-from bergen.messages.utils import expandToMessage
+from bergen.messages.utils import get_message_decoder
+from bergen.messages.codecs import get_codec
+from bergen.transports.batching import collect_batch, encode_batch
+from bergen.transports.reconnect import Backoff, ReconnectManager, ReplayBuffer, acknowledging, replay
 from bergen.messages.base import MessageModel
 from bergen.provider.base import BaseProvider
 import logging
@@ -30,21 +33,26 @@ DEBUG = True
 class WebsocketProvider(BaseProvider):
     ''' Is a mixin for Our Bergen '''
 
-    def __init__(self, client: BaseBergen, auto_reconnect=True, **kwargs) -> None:
+    def __init__(self, client: BaseBergen, auto_reconnect=True, trusted=None, codec=None, max_batch_size=1, max_batch_delay=0, reconnect_base_delay=1, reconnect_max_delay=30, replay_buffer_size=0, **kwargs) -> None:
         super().__init__(client, **kwargs)
         self.websocket_host = client.config.host
         self.websocket_port = client.config.port
         self.websocket_protocol = "wss" if client.config.secure else "ws"
         self.pending = None
+        self.decode = get_message_decoder(trusted=trusted if trusted is not None else client.trusted_messages)
+        self.codec = get_codec(codec)
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
 
-        self.auto_reconnect = True
-        self.allowed_retries = 2
-        self.current_retries = 0
+        self.auto_reconnect = auto_reconnect
+        self.replay_buffer_size = replay_buffer_size
+        self.reconnect_manager = ReconnectManager("Provider", self.connect_websocket, self.session, auto_reconnect=auto_reconnect, backoff=Backoff(reconnect_base_delay, reconnect_max_delay), style="[blue]")
 
 
     async def connect(self):
-        self.incoming_queue = asyncio.Queue()
-        self.outgoing_queue = asyncio.Queue()
+        self.incoming_queue = self.client.queue_factory.create("provider.incoming", raw=True)
+        self.outgoing_queue = self.client.queue_factory.create("provider.outgoing")
+        self.replay_buffer = ReplayBuffer(self.replay_buffer_size)
 
 
         self.tasks = {}
@@ -54,9 +62,7 @@ class WebsocketProvider(BaseProvider):
 
     async def disconnect(self) -> str:
 
-        for task in self.pending:
-            task.cancel()
-
+        if self.startup_task: self.startup_task.cancel()
 
         if self.connection: await self.connection.close()
 
@@ -73,23 +79,9 @@ class WebsocketProvider(BaseProvider):
 
         
     async def startup(self):
-        try:
-            await self.connect_websocket()
-        except Exception as e:
-
-            console.print("[blue] Connection attempt as Provider failed")
-            self.current_retries += 1
-            if self.auto_reconnect:
-                sleeping_time = (self.current_retries + 1)
-                console.print(f"[blue] Trying to Reconnect as Provider in {sleeping_time} seconds")
-                await asyncio.sleep(sleeping_time)
-                await self.startup()
-            else:
-                console.print("[blue]Provider: No reconnecting attempt envisioned. Shutting Down!")
-                console.print_exception()
-
-        console.print("[blue] Sucessfully Established A Connection to Provider Endpoint")
+        await self.reconnect_manager.run()
 
+    async def session(self):
         self.consumer_task = create_task(
             self.consumer()
         )
@@ -102,8 +94,12 @@ class WebsocketProvider(BaseProvider):
             self.workers()
         )
 
+        self.acknowledging_task = create_task(
+            acknowledging(self.connection, self.replay_buffer)
+        )
+
         done, self.pending = await asyncio.wait(
-            [self.consumer_task, self.worker_task, self.producer_task],
+            [self.consumer_task, self.worker_task, self.producer_task, self.acknowledging_task],
             return_when=asyncio.FIRST_EXCEPTION
         )
 
@@ -117,18 +113,11 @@ class WebsocketProvider(BaseProvider):
             console.print_exception()
                     
         logger.error(f"Provider: Lost connection inbetween everything :( {[ task.exception() for task in done]}")
-        logger.error(f'Provider: Reconnecting')
-
-        
 
         if self.connection: await self.connection.close()
 
         for task in self.pending:
             task.cancel()
-
-        console.log("Trying to Reconnect")
-        self.current_retries = 0 # reset retries after one successfull connection
-        await self.startup() # Attempt to ronnect again
         
 
     async def connect_websocket(self):
@@ -149,11 +138,15 @@ class WebsocketProvider(BaseProvider):
             await self.incoming_queue.put(message)
 
     async def producer(self):
+        await replay(self.connection, self.replay_buffer, lambda batch: encode_batch(batch, self.codec), self.max_batch_size)
+
         while True:
-            message = await self.outgoing_queue.get()
-            await self.connection.send(message.to_channels())
+            messages = await collect_batch(self.outgoing_queue, self.max_batch_size, self.max_batch_delay)
+            self.replay_buffer.add(messages)
+            await self.connection.send(encode_batch(messages, self.codec))
 
-            self.outgoing_queue.task_done()
+            for message in messages:
+                self.outgoing_queue.task_done()
 
     async def forward(self, message: MessageModel) -> str:
         logger.info(f"Sending {message}")
@@ -164,9 +157,9 @@ class WebsocketProvider(BaseProvider):
             message_str = await self.incoming_queue.get()
             logger.info(f"Incoming Message {message_str}")
             try:
-                message = expandToMessage(json.loads(message_str))
-                logger.warn(f"Incoming Message {message}")
-                await self.on_message(message)
+                for message in self.decode(message_str):
+                    logger.warn(f"Incoming Message {message}")
+                    await self.on_message(message)
             except:
                 raise
 
@@ -1,6 +1,7 @@
+import hashlib
 import logging
 import re
-from typing import Generator, Generic, List, Type, TypeVar
+from typing import Any, Callable, Dict, Generator, Generic, Hashable, List, Type, TypeVar
 
 logger = logging.getLogger(__name__)
 
@@ -15,19 +16,76 @@ class GQLException(Exception):
 MyType = TypeVar("MyType")
 
 
+def match_query(query: str):
+    """Returns the match of the operation of query and if it has variables"""
+    m = gqlparsed_with_variables.match(query)
+    if m: return m, True
+    return gqlparser_without_variables.match(query), False
+
+
+class QueryCache:
+    """ Process wide cache of everything that is parsed from a query string
+
+    Keeps the operation matches of GQL, the documents the gql based wards parse before
+    executing a query, the sha256 hashes of the persisted queries and the TypedGQLs that
+    DelayedGQL builds per model, so each is only built once per query. Every kind keeps at most maxsize entries (the oldest are dropped).
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self.stores: Dict[str, Dict[Hashable, Any]] = {"matches": {}, "documents": {}, "hashes": {}, "typed": {}}
+        self.counters = {kind: {"hits": 0, "misses": 0} for kind in self.stores}
+
+    def get(self, kind: str, key: Hashable, build: Callable[[], Any]) -> Any:
+        store = self.stores[kind]
+        if key in store:
+            self.counters[kind]["hits"] += 1
+            return store[key]
+
+        self.counters[kind]["misses"] += 1
+        value = build()
+        if len(store) >= self.maxsize: store.pop(next(iter(store)))
+        store[key] = value
+        return value
+
+    def match(self, query: str):
+        return self.get("matches", query, lambda: match_query(query))
+
+    def document(self, query: str, parse: Callable[[str], Any]):
+        """Returns the document parse built for query (e.g. gql.gql)"""
+        return self.get("documents", query, lambda: parse(query))
+
+    def hash(self, query: str) -> str:
+        """Returns the sha256 hash of query, as the persisted queries send it"""
+        return self.get("hashes", query, lambda: hashlib.sha256(query.encode("utf-8")).hexdigest())
+
+    def typed(self, query: str, cls: Type[MyType]) -> "TypedGQL[MyType]":
+        return self.get("typed", (query, cls), lambda: TypedGQL(query, cls))
+
+    def clear(self):
+        for store in self.stores.values():
+            store.clear()
+
+    def stats(self) -> dict:
+        return {kind: {"entries": len(self.stores[kind]), **self.counters[kind]} for kind in self.stores}
+
+
+query_cache = QueryCache()
+
+
+def get_query_cache() -> QueryCache:
+    return query_cache
+
+
 class GQL(object):
 
     def __init__(self, query: str) -> None:
         self.query = query
         self.variables = None
         self._type = None
-        self.m = gqlparsed_with_variables.match(self.query)
-        self.has_variables = True
+        self.m, self.has_variables = query_cache.match(self.query)
         if not self.m:
-            self.m = gqlparser_without_variables.match(self.query)
-            self.has_variables = False
-            if not self.m:
-                raise GQLException("Illformed request")
+            raise GQLException("Illformed request")
 
     def combine(self, variables: dict):
         self.variables = variables
@@ -215,7 +273,7 @@ class AsyncQueryList(GQL, Generic[MyType]):
         return string
 
 def DelayedGQL(gqlstring):
-    return lambda model : TypedGQL(gqlstring, model)
+    return lambda model : query_cache.typed(gqlstring, model)
 
 
 
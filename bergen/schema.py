@@ -96,6 +96,12 @@ class WardSettings(ArnheimObject):
     host: Optional[str]
     port: Optional[int]
     secure: Optional[bool]
+    # Overwrite the HttpConfig of the ArkitektConfig for the session of this Ward
+    connectionLimit: Optional[int]
+    connectionLimitPerHost: Optional[int]
+    keepaliveTimeout: Optional[float]
+    dnsCacheTtl: Optional[int]
+    timeout: Optional[float]
 
 class Transcript(ArnheimObject):
     postman: Optional[PostmanSettings]
@@ -151,6 +157,8 @@ class NodeType(str, Enum):
 
 
 class Node(ArnheimModel):
+    __slots__ = ("_port_plan", ) # Compiled by bergen.utils.getPortPlan
+
     id: Optional[int]
     name: Optional[str]
     description: Optional[str]
@@ -0,0 +1,55 @@
+from bergen.messages.base import MessageModel
+from bergen.messages.codecs import Codec, Frame
+from bergen.messages.types import BATCH
+from typing import List
+import asyncio
+import uuid
+
+
+async def collect_batch(queue: asyncio.Queue, max_batch_size: int = 1, max_delay: float = 0) -> List[MessageModel]:
+    """Waits for the next Message and drains everything that is currently queued
+
+    Args:
+        queue (asyncio.Queue): The outgoing queue
+        max_batch_size (int, optional): The maximum number of Messages in one Frame. Defaults to 1.
+        max_delay (float, optional): Seconds to wait for further Messages before flushing a Batch that is not full. Defaults to 0.
+
+    Returns:
+        List[MessageModel]: The collected Messages (call task_done for each once sent)
+    """
+    messages = [await queue.get()]
+
+    while len(messages) < max_batch_size and not queue.empty():
+        messages.append(queue.get_nowait())
+
+    if max_delay and len(messages) < max_batch_size:
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + max_delay
+        while len(messages) < max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0: break
+            try:
+                messages.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    return messages
+
+
+def encode_payloads(payloads: List[dict], codec: Codec) -> Frame:
+    """Encodes serialized Messages into one Frame, multiple Messages are wrapped in a batch envelope"""
+    if len(payloads) == 1:
+        return codec.encode(payloads[0])
+
+    return codec.encode({
+        "data": {"messages": payloads},
+        "meta": {"type": BATCH, "reference": str(uuid.uuid4())}
+    })
+
+
+def encode_batch(messages: List[MessageModel], codec: Codec) -> Frame:
+    """Encodes Messages into one Frame, multiple Messages are wrapped in a batch envelope"""
+    if len(messages) == 1:
+        return messages[0].to_frame(codec)
+
+    return encode_payloads([message.dict() for message in messages], codec)
@@ -0,0 +1,162 @@
+from websockets.exceptions import ConnectionClosedError
+from bergen.messages.base import MessageModel
+from bergen.messages.codecs import decode_frame, get_codec
+from bergen.messages.types import BATCH
+from bergen.messages.utils import expandToMessage, expandToMessageTrusted
+from bergen.transports.batching import collect_batch, encode_payloads
+from bergen.transports.reconnect import Backoff, ReconnectManager, ReplayBuffer, acknowledging, replay
+from bergen.console import console
+from bergen.legacy.utils import create_task
+from typing import Dict
+import asyncio
+import logging
+import websockets
+
+
+logger = logging.getLogger(__name__)
+
+
+POSTMAN_CHANNEL = "postman"
+PROVIDER_CHANNEL = "provider"
+ENTERTAINER_CHANNEL = "entertainer"
+
+
+class MultiplexError(Exception):
+    pass
+
+
+class MultiplexedWebsocket:
+    """ Carries the postman, provider and entertainer channels over one websocket
+
+    Every Frame is tagged with the channel it belongs to (a "channel" key next to data
+    and meta, for batch envelopes on every item). Connection setup, authentication and
+    the receiving and sending tasks are paid once per client, the channels
+    (see MultiplexedPostman, MultiplexedProvider and MultiplexedEntertainer) only attach.
+    """
+
+    def __init__(self, client, path="multiplex", trusted=None, codec=None, max_batch_size=1, max_batch_delay=0, auto_reconnect=True, reconnect_base_delay=1, reconnect_max_delay=30, replay_buffer_size=0, **kwargs) -> None:
+        self.client = client
+        self.websocket_host = client.config.host
+        self.websocket_port = client.config.port
+        self.websocket_protocol = "wss" if client.config.secure else "ws"
+        self.path = path
+
+        self.expander = expandToMessageTrusted if (trusted if trusted is not None else client.trusted_messages) else expandToMessage
+        self.codec = get_codec(codec)
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+
+        self.channels: Dict[str, object] = {}
+
+        self.auto_reconnect = auto_reconnect
+        self.replay_buffer_size = replay_buffer_size
+        self.reconnect_manager = ReconnectManager("Multiplexer", self.connect_websocket, self.session, auto_reconnect=auto_reconnect, backoff=Backoff(reconnect_base_delay, reconnect_max_delay), style="[magenta]")
+
+        self.connection = None
+        self.startup_task = None
+        self.pending = []
+
+    async def attach(self, channel: str, handler):
+        """Attaches a handler (needs an async on_message) to a channel, the first attach connects"""
+        assert channel not in self.channels, f"Channel {channel} is already attached"
+        self.channels[channel] = handler
+
+        if self.startup_task is None:
+            self.incoming_queue = self.client.queue_factory.create("multiplex.incoming", raw=True)
+            self.outgoing_queue = self.client.queue_factory.create("multiplex.outgoing")
+            self.replay_buffer = ReplayBuffer(self.replay_buffer_size)
+            self.startup_task = create_task(self.startup())
+
+    async def detach(self, channel: str):
+        """Detaches a channel, the last detach disconnects"""
+        self.channels.pop(channel, None)
+        if not self.channels:
+            await self.disconnect()
+
+    async def forward(self, channel: str, message: MessageModel):
+        await self.outgoing_queue.put((channel, message))
+
+    async def disconnect(self):
+        if self.connection: await self.connection.close()
+
+        for task in self.pending:
+            task.cancel()
+
+        if self.startup_task:
+            self.startup_task.cancel()
+            try:
+                await self.startup_task
+            except asyncio.CancelledError:
+                logger.info("Multiplexer disconnected")
+
+        self.startup_task = None
+
+    async def connect_websocket(self):
+        try:
+            uri = f"{self.websocket_protocol}://{self.websocket_host}:{self.websocket_port}/{self.path}/?token={self.client.auth.access_token}"
+            self.connection = await websockets.client.connect(uri)
+        except:
+            #TODO: Better TokenExpired Handling
+            self.client.auth.refetch()
+            uri = f"{self.websocket_protocol}://{self.websocket_host}:{self.websocket_port}/{self.path}/?token={self.client.auth.access_token}"
+            self.connection = await websockets.client.connect(uri)
+
+        logger.info("Successfully connected Multiplexer")
+
+    async def startup(self):
+        await self.reconnect_manager.run()
+
+    async def session(self):
+        logger.info(f"Multiplexing {list(self.channels.keys())}")
+
+        tasks = [create_task(self.receiving()), create_task(self.sending()), create_task(self.workers()), create_task(acknowledging(self.connection, self.replay_buffer))]
+        done, self.pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+
+        try:
+            for task in done:
+                if task.exception():
+                    raise task.exception()
+        except ConnectionClosedError:
+            console.print("[magenta] Multiplexed Connection was closed. Trying Reconnect")
+        except:
+            console.print_exception()
+
+        if self.connection: await self.connection.close()
+
+        for task in self.pending:
+            task.cancel()
+
+    async def receiving(self):
+        async for frame in self.connection:
+            await self.incoming_queue.put(frame)
+
+    def encode(self, items) -> object:
+        payloads = [{**message.dict(), "channel": channel} for channel, message in items]
+        return encode_payloads(payloads, self.codec)
+
+    async def sending(self):
+        await replay(self.connection, self.replay_buffer, self.encode, self.max_batch_size)
+
+        while True:
+            items = await collect_batch(self.outgoing_queue, self.max_batch_size, self.max_batch_delay)
+            self.replay_buffer.add(items)
+            await self.connection.send(self.encode(items))
+
+            for item in items:
+                self.outgoing_queue.task_done()
+
+    async def workers(self):
+        while True:
+            frame = await self.incoming_queue.get()
+            payload = decode_frame(frame)
+            items = payload["data"]["messages"] if payload.get("meta", {}).get("type") == BATCH else [payload]
+
+            for item in items:
+                channel = item.pop("channel", None)
+                if channel not in self.channels:
+                    logger.error(f"Received Message for unattached channel {channel}: {item}")
+                    continue
+
+                await self.channels[channel].on_message(self.expander(item))
+
+            self.incoming_queue.task_done()
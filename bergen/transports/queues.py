@@ -0,0 +1,210 @@
+from bergen.messages.base import MessageModel
+from bergen.messages.types import ASSIGN_LOG, PROVIDE_LOG, RESERVE_LOG, UNASSIGN_LOG, UNPROVIDE_LOG, UNRESERVE_LOG
+from enum import Enum
+from collections import deque
+from typing import Deque, Dict
+import asyncio
+import logging
+import weakref
+
+logger = logging.getLogger(__name__)
+
+
+LOG_TYPES = {ASSIGN_LOG, PROVIDE_LOG, RESERVE_LOG, UNASSIGN_LOG, UNPROVIDE_LOG, UNRESERVE_LOG}
+
+DROPPED = object() # Marks the entries of logs dropped under DROP_LOGS
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class BackpressurePolicy(str, Enum):
+    BLOCK = "BLOCK" # Producers wait until there is room again
+    DROP_LOGS = "DROP_LOGS" # Log messages are dropped first, everything else blocks
+    FAIL = "FAIL" # The queue fails and its consumer raises a QueueFullError (fails the assignment)
+
+
+def is_log(item) -> bool:
+    if isinstance(item, tuple): item = item[-1] # Multiplexed (channel, message) items
+    if isinstance(item, MessageModel):
+        return item.meta.type in LOG_TYPES
+    return False
+
+
+class BoundedQueue:
+    """ A queue that applies a BackpressurePolicy once it holds maxsize items
+
+    Wraps an unbounded asyncio.Queue and only uses its public interface: the bound is
+    kept here, logs dropped under DROP_LOGS stay queued as dropped entries that get
+    skips. A maxsize of 0 keeps the queue unbounded (like asyncio.Queue)."""
+
+    def __init__(self, maxsize: int = 0, policy: BackpressurePolicy = BackpressurePolicy.BLOCK, name: str = None) -> None:
+        self.maxsize = maxsize
+        self.policy = policy
+        self.name = name
+        self.dropped = 0
+        self.high_watermark = 0
+        self.exception: QueueFullError = None
+
+        self.queue = asyncio.Queue() # Holds [item] entries
+        self.size = 0 # Queued items that are not dropped
+        self.logs: Deque[list] = deque() # Entries of the queued logs, oldest first
+        self.has_room = asyncio.Event()
+        self.has_room.set()
+
+    def qsize(self) -> int:
+        return self.size
+
+    def empty(self) -> bool:
+        return self.size == 0
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= self.size
+
+    def enqueue(self, item):
+        entry = [item]
+        if is_log(item): self.logs.append(entry)
+        self.size += 1
+        if self.full(): self.has_room.clear()
+        self.high_watermark = max(self.high_watermark, self.size)
+        self.queue.put_nowait(entry)
+
+    def drop_log(self) -> bool:
+        """Drops the oldest queued log, its entry stays queued until get skips it"""
+        if not self.logs: return False
+        entry = self.logs.popleft()
+        entry[0] = DROPPED
+        self.size -= 1
+        self.has_room.set()
+        self.dropped += 1
+        return True
+
+    def fail(self):
+        self.dropped += 1
+        if self.exception is None:
+            logger.error(f"Queue {self.name} exceeded its size of {self.maxsize}. Failing it")
+            self.exception = QueueFullError(f"Queue {self.name} exceeded its size of {self.maxsize}")
+            # The exception is queued beyond maxsize, so the consumer raises it after the already queued items
+            self.queue.put_nowait([self.exception])
+
+    def put_nowait(self, item):
+        if self.full():
+            if self.policy == BackpressurePolicy.DROP_LOGS:
+                if is_log(item):
+                    self.dropped += 1
+                    return
+                if not self.drop_log(): raise asyncio.QueueFull()
+
+            elif self.policy == BackpressurePolicy.FAIL:
+                return self.fail()
+
+            else:
+                raise asyncio.QueueFull()
+
+        self.enqueue(item)
+
+    async def put(self, item):
+        while self.full():
+            if self.policy == BackpressurePolicy.DROP_LOGS:
+                if is_log(item):
+                    self.dropped += 1
+                    return
+                if self.drop_log(): break
+
+            elif self.policy == BackpressurePolicy.FAIL:
+                return self.fail()
+
+            await self.has_room.wait()
+
+        self.enqueue(item)
+
+    def take(self, entry: list):
+        item = entry[0]
+        if item is DROPPED:
+            self.queue.task_done()
+            return DROPPED
+
+        if isinstance(item, QueueFullError):
+            self.queue.task_done()
+            raise item
+
+        self.size -= 1
+        if self.logs and self.logs[0] is entry: self.logs.popleft()
+        if not self.full(): self.has_room.set()
+        return item
+
+    async def get(self):
+        if self.exception is not None and self.queue.empty():
+            raise self.exception
+
+        while True:
+            item = self.take(await self.queue.get())
+            if item is not DROPPED: return item
+
+    def get_nowait(self):
+        while True:
+            item = self.take(self.queue.get_nowait())
+            if item is not DROPPED: return item
+
+    def task_done(self):
+        self.queue.task_done()
+
+    async def join(self):
+        await self.queue.join()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.qsize(),
+            "maxsize": self.maxsize,
+            "high_watermark": self.high_watermark,
+            "dropped": self.dropped,
+            "failed": self.exception is not None,
+        }
+
+
+class QueueFactory:
+    """ Creates the BoundedQueues of a client and keeps live counters for them
+
+    Queues that are shared by many assignments (transports and actors) never fail
+    as a whole, under the FAIL policy they drop logs first and then block. The
+    per-assignment queues (failable) apply the policy as configured. Raw queues hold
+    the undecoded frames of a connection, which can't be told apart from logs, so
+    they always block.
+    """
+
+    def __init__(self, maxsize: int = 0, policy: BackpressurePolicy = BackpressurePolicy.BLOCK) -> None:
+        self.maxsize = maxsize
+        self.policy = BackpressurePolicy(policy)
+        self.queues = weakref.WeakSet()
+
+    def create(self, name: str, failable=False, maxsize: int = None, raw=False) -> BoundedQueue:
+        policy = self.policy
+        if policy == BackpressurePolicy.FAIL and not failable:
+            policy = BackpressurePolicy.DROP_LOGS
+
+        if raw and policy != BackpressurePolicy.BLOCK:
+            if self.policy == BackpressurePolicy.DROP_LOGS:
+                logger.warning(f"Queue {name} holds raw frames, which can't be told apart from logs. It blocks instead of dropping logs")
+            policy = BackpressurePolicy.BLOCK
+
+        queue = BoundedQueue(self.maxsize if maxsize is None else maxsize, policy=policy, name=name)
+        self.queues.add(queue)
+        return queue
+
+    def stats(self) -> Dict[str, dict]:
+        """Returns the live counters of all queues, aggregated by queue name"""
+        stats = {}
+        for queue in list(self.queues):
+            queue_stats = queue.stats()
+            if queue.name not in stats:
+                stats[queue.name] = {"queues": 0, "depth": 0, "maxsize": queue.maxsize, "high_watermark": 0, "dropped": 0, "failed": 0}
+
+            aggregate = stats[queue.name]
+            aggregate["queues"] += 1
+            aggregate["depth"] += queue_stats["depth"]
+            aggregate["high_watermark"] = max(aggregate["high_watermark"], queue_stats["high_watermark"])
+            aggregate["dropped"] += queue_stats["dropped"]
+            aggregate["failed"] += int(queue_stats["failed"])
+
+        return stats
@@ -0,0 +1,149 @@
+from bergen.messages.base import MessageModel
+from bergen.console import console
+from collections import deque
+from typing import Awaitable, Callable, List
+import asyncio
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+
+class Backoff:
+    """ Capped exponential backoff with full jitter
+
+    The delay for an attempt is drawn uniformly from [0, min(max_delay, base_delay * factor ** attempt)],
+    so clients that lost their connection at the same time spread their reconnects."""
+
+    def __init__(self, base_delay: float = 1, max_delay: float = 30, factor: float = 2, jitter=True) -> None:
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.jitter = jitter
+
+    def delay(self, attempt: int) -> float:
+        ceiling = min(self.max_delay, self.base_delay * self.factor ** attempt)
+        return random.uniform(0, ceiling) if self.jitter else ceiling
+
+
+class ReplayBuffer:
+    """ Keeps sent Messages until the server acknowledged them
+
+    Messages count as acknowledged once a ping that was sent after them is answered
+    (websockets are ordered, so the server has received everything before the ping).
+    Unacknowledged Messages are replayed after a reconnect. If the buffer is full the
+    oldest Messages are dropped and can no longer be replayed.
+
+    Replay is at-least-once: the connection can drop after the server received a Message
+    but before the pong came back, and nothing deduplicates the replayed ASSIGN or RESERVE
+    Messages, so they may run twice. A maxsize of 0 (the default of the transports)
+    disables the buffer, only enable it against servers that tolerate duplicates."""
+
+    def __init__(self, maxsize: int = 0) -> None:
+        self.maxsize = maxsize
+        self.buffer = deque()
+        self.sequence = 0
+        self.dropped = 0
+        self.has_pending = asyncio.Event()
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def add(self, messages: List[MessageModel]) -> int:
+        if not self.maxsize: return self.sequence
+
+        for message in messages:
+            self.sequence += 1
+            self.buffer.append((self.sequence, message))
+
+        while len(self.buffer) > self.maxsize:
+            self.buffer.popleft()
+            self.dropped += 1
+            logger.warning("Replay Buffer is full. Dropping the oldest unacknowledged Message")
+
+        if self.buffer: self.has_pending.set()
+        return self.sequence
+
+    def acknowledge(self, sequence: int):
+        """Acknowledges all Messages up to (and including) sequence"""
+        while self.buffer and self.buffer[0][0] <= sequence:
+            self.buffer.popleft()
+
+        if not self.buffer: self.has_pending.clear()
+
+    def drain(self) -> List[MessageModel]:
+        """Removes and returns all unacknowledged Messages (in the order they were sent)"""
+        messages = [message for sequence, message in self.buffer]
+        self.buffer.clear()
+        self.has_pending.clear()
+        return messages
+
+
+async def acknowledging(connection, replay_buffer: ReplayBuffer):
+    """Acknowledges the Messages in the replay buffer with pings, run this next to the sending task"""
+    while True:
+        await replay_buffer.has_pending.wait()
+        sequence = replay_buffer.sequence
+        pong_waiter = await connection.ping()
+        await pong_waiter
+        replay_buffer.acknowledge(sequence)
+
+
+class ReconnectManager:
+    """ Keeps a connection alive without growing the stack
+
+    connect establishes the connection, session runs until the connection is lost.
+    Failed connection attempts are retried with capped exponential backoff and jitter,
+    after a lost session the first reconnect is jittered as well, so a restarting
+    server doesn't get all clients at the same instant."""
+
+    def __init__(self, name: str, connect: Callable[[], Awaitable], session: Callable[[], Awaitable], auto_reconnect=True, backoff: Backoff = None, style: str = "") -> None:
+        self.name = name
+        self.connect = connect
+        self.session = session
+        self.auto_reconnect = auto_reconnect
+        self.backoff = backoff or Backoff()
+        self.style = style
+        self.current_retries = 0
+        self.connections = 0
+
+    async def run(self):
+        while True:
+            try:
+                await self.connect()
+            except Exception as e:
+                console.print(f"{self.style} Connection attempt as {self.name} failed")
+                if not self.auto_reconnect:
+                    console.print(f"{self.style}{self.name}: No reconnecting attempt envisioned. Shutting Down!")
+                    raise e
+
+                sleeping_time = self.backoff.delay(self.current_retries)
+                self.current_retries += 1
+                console.print(f"{self.style} Trying to Reconnect as {self.name} in {sleeping_time:.2f} seconds")
+                await asyncio.sleep(sleeping_time)
+                continue
+
+            console.print(f"{self.style} Successfully established {self.name} Connection")
+            self.current_retries = 0 # reset retries after one successfull connection
+            self.connections += 1
+
+            await self.session()
+
+            if not self.auto_reconnect:
+                return
+
+            sleeping_time = self.backoff.delay(0)
+            logger.error(f"{self.name}: Lost connection. Reconnecting in {sleeping_time:.2f} seconds")
+            await asyncio.sleep(sleeping_time)
+
+
+async def replay(connection, replay_buffer: ReplayBuffer, encode: Callable[[List], object], max_batch_size: int = 1):
+    """Re-sends the unacknowledged Messages of a lost connection (call before sending anything new)"""
+    messages = replay_buffer.drain()
+    if messages:
+        logger.warning(f"Replaying {len(messages)} unacknowledged Messages")
+
+    for start in range(0, len(messages), max(max_batch_size, 1)):
+        batch = messages[start:start + max(max_batch_size, 1)]
+        replay_buffer.add(batch)
+        await connection.send(encode(batch))
@@ -32,10 +32,7 @@ class ArnheimModelManager(BaseManager, Generic[ModelType]):
         method =  getattr(self.meta, attribute, None)
         assert method is not None, f"Please provide the {attribute} parameter in your ArnheimModel meta class "
         typed_gql: TypedGQL = method(self.model)
-        if client.loop.is_running():
-            return asyncio.run_coroutine_threadsafe(typed_gql.run(variables=parse_kwargs(kwargs)), client.loop).result()
-        else:
-            return client.loop.run_until_complete(typed_gql.run(variables=parse_kwargs(kwargs)))
+        return client.run(typed_gql.run(variables=parse_kwargs(kwargs)))
 
     def __getattr__(self, name: str) -> ModelType:
         def function(**kwargs):
@@ -51,8 +48,8 @@ class ArnheimModelManager(BaseManager, Generic[ModelType]):
         Returns:
             ModelType: The returned Instance
         """
-    
-        return self._call_meta("get", ward=ward, **kwargs)
+        from bergen.registries.client import get_current_client
+        return get_current_client().run(self.model.asyncs.get(ward=ward, **kwargs))
         
     def create(self, ward=None, **kwargs) -> ModelType:
         return self._call_meta("create", ward=ward, **kwargs)
@@ -92,17 +89,38 @@ class ArnheimAsyncModelManager(BaseManager, Generic[ModelType]):
             return await self._call_meta(name, ward=self.get_ward(), **kwargs)
         return function
 
-    async def get(self, ward=None, **kwargs) -> ModelType:
-        return await self._call_meta("get", ward=ward, **kwargs)
+    def get_cache(self, ward=None):
+        return (ward or self.model.get_ward()).model_cache
+
+    async def get(self, ward=None, cached=True, **kwargs) -> ModelType:
+        """Gets an instance of this Model, instances fetched by id come from the model cache of the ward (unless cached is False)
+
+        The model cache is off unless the client was created with a model_cache_size, concurrent gets of the same id still share one query.
+        """
+        if cached and list(kwargs.keys()) == ["id"] and kwargs["id"] is not None:
+            ward = ward or self.model.get_ward()
+            return await ward.model_cache.get_or_fetch(self.model.Meta.identifier, kwargs["id"], lambda: self._call_meta("get", ward=ward, **kwargs))
+
+        instance = await self._call_meta("get", ward=ward, **kwargs)
+        self.get_cache(ward).set(self.model.Meta.identifier, instance)
+        return instance
         
     async def create(self, ward=None, **kwargs) -> ModelType:
-        return await self._call_meta("create", ward=ward, **kwargs)
+        instance = await self._call_meta("create", ward=ward, **kwargs)
+        self.get_cache(ward).set(self.model.Meta.identifier, instance)
+        return instance
 
     async def filter(self, ward=None, **kwargs) -> List[ModelType]:
         return await self._call_meta("filter", ward=ward, **kwargs)
 
     async def update(self, ward=None, **kwargs) -> ModelType:
-        return await self._call_meta("update", ward=ward, **kwargs)
+        instance = await self._call_meta("update", ward=ward, **kwargs)
+        self.get_cache(ward).set(self.model.Meta.identifier, instance)
+        return instance
+
+    def invalidate(self, id=None, ward=None):
+        """Drops the instance with id (or all instances of this Model) from the model cache"""
+        self.get_cache(ward).invalidate(self.model.Meta.identifier, id)
 
     async def all(self, ward=None):
         return await self._call_meta("filter", ward=ward)
@@ -0,0 +1,66 @@
+from bergen.clients.runtime import SyncInLoopError
+from bergen.types.model import ArnheimModel
+from typing import Generic, Type, TypeVar
+
+ModelType = TypeVar("ModelType", bound=ArnheimModel)
+
+
+class ModelProxy(Generic[ModelType]):
+    """ Stands in for an ArnheimModel that is only fetched once it is needed
+
+    The id is available right away, the instance is fetched on the first access of any other
+    attribute (or by awaiting fetch). Inside a coroutine on the loop of the client the
+    instance can't be fetched synchronously, which is why only threaded actors get their
+    inputs as proxies (see Actor.lazyInputs), async code has to await fetch first:
+
+        await proxy.fetch()
+        name = proxy.name
+
+    Proxies are shrinked to their id, so passing them on to other Nodes never fetches them.
+    """
+    __slots__ = ("_model", "_id", "_instance")
+
+    def __init__(self, model: Type[ModelType], id) -> None:
+        object.__setattr__(self, "_model", model)
+        object.__setattr__(self, "_id", id)
+        object.__setattr__(self, "_instance", None)
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def is_fetched(self) -> bool:
+        return self._instance is not None
+
+    async def fetch(self) -> ModelType:
+        if self._instance is None:
+            object.__setattr__(self, "_instance", await self._model.asyncs.get(id=self._id))
+        return self._instance
+
+    def resolve(self) -> ModelType:
+        if self._instance is None:
+            try:
+                object.__setattr__(self, "_instance", self._model.objects.get(id=self._id))
+            except SyncInLoopError as e:
+                raise SyncInLoopError(f"{self!r} was not fetched yet, await its fetch() before accessing its attributes inside the loop") from e
+        return self._instance
+
+    def __getattr__(self, name: str):
+        # Protocol lookups (pydantic checks isinstance through __fields__) must not fetch
+        if name.startswith("__"): raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name: str, value):
+        setattr(self.resolve(), name, value)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ModelProxy): return other._model is self._model and other.id == self.id
+        if isinstance(other, ArnheimModel): return isinstance(other, self._model) and other.id == self.id
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((self._model, self._id))
+
+    def __repr__(self) -> str:
+        return f"ModelProxy({self._model.__name__}, {self._id}{', fetched' if self.is_fetched else ''})"
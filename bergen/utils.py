@@ -1,9 +1,11 @@
 import re
-from typing import List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from bergen.types.model import ArnheimModel
+from bergen.types.proxy import ModelProxy
 from bergen.registries.matcher import get_current_matcher
 from bergen.enums import PortTypes
 from bergen.schema import Node
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,100 +14,152 @@ class ExpansionError(Exception):
     pass
 
 
+SHRINKABLE = (ArnheimModel, ModelProxy)
 
-async def expandInputs(node: Node, args: list, kwargs: dict) -> dict:
 
-    #assert node.inputs is not None, "Your Query for Nodes seems to not provide any field for inputs, please use that in your get statement"
-    #assert len(node.inputs) > 0  is not None, "Your Node seems to not provide any inputs, calling is redundant"
+class PortPlan:
+    """ The ports of a Node compiled for shrinking and expanding
 
-    expanded_args = []
-    for arg, port in zip(args, node.args):
-        if port.TYPENAME == PortTypes.MODEL_ARG_PORT:
-            modelClass = get_current_matcher().getModelForIdentifier(identifier=port.identifier)
-            instance =  await modelClass.asyncs.get(id=arg)
-            expanded_args.append(instance)
-        else:
-            expanded_args.append(arg)
+    Holds the model identifier of every arg, kwarg and return (None for ports that are passed
+    as they are) and the model classes resolved for them, so conversions don't have to walk
+    and compare the ports on every call. Model classes are resolved on first use, because
+    their schema might be imported after the plan was compiled.
+    """
 
+    def __init__(self, node: Node) -> None:
+        self.args: List[Optional[str]] = [port.identifier if port.TYPENAME == PortTypes.MODEL_ARG_PORT else None for port in node.args or []]
+        self.kwargs: List[Tuple[str, Optional[str], bool]] = [(port.key, port.identifier if port.TYPENAME == PortTypes.MODEL_KWARG_PORT else None, port.required) for port in node.kwargs or []]
+        self.returns: List[Optional[str]] = [port.identifier if port.TYPENAME == PortTypes.MODEL_RETURN_PORT else None for port in node.returns or []]
+        self.has_model_args = any(self.args) or any(identifier for key, identifier, required in self.kwargs)
+        self.has_model_returns = any(self.returns)
+        self.models: Dict[str, type] = {}
 
-    expanded_kwargs = {}
-    for port in node.kwargs:
-        if port.key not in kwargs or kwargs[port.key] is None:
-            if port.required:
-                raise ExpansionError(f"We couldn't expand {port.key} because it wasn't provided by our Kwargs, wrong assignation!!!")
-            else:
-                break
+    def getModelClass(self, identifier: str) -> type:
+        if identifier not in self.models:
+            self.models[identifier] = get_current_matcher().getModelForIdentifier(identifier=identifier)
+        return self.models[identifier]
 
-        
 
+def getPortPlan(node: Node) -> PortPlan:
+    """Returns the PortPlan of node, compiled on first use and kept on the node"""
+    plan = getattr(node, "_port_plan", None)
+    if plan is None:
+        plan = PortPlan(node)
+        try:
+            node._port_plan = plan
+        except (AttributeError, ValueError):
+            pass # Nodes without the slot compile their plan on every call
 
-        if port.TYPENAME == PortTypes.MODEL_KWARG_PORT:
-            modelClass = get_current_matcher().getModelForIdentifier(identifier=port.identifier)
-            instance =  await modelClass.asyncs.get(id=kwargs[port.key])
-            expanded_kwargs[port.key] = instance
-        else:
-            expanded_kwargs[port.key] = kwargs[port.key]
+    return plan
 
 
-    return expanded_args, expanded_kwargs
+async def fetchModelsForIdentifier(identifier: str, ids: list, modelClass: type = None) -> Dict[str, Any]:
+    modelClass = modelClass or get_current_matcher().getModelForIdentifier(identifier=identifier)
+    results = await asyncio.gather(*[modelClass.asyncs.get(id=id) for id in ids], return_exceptions=True)
+    return {str(id): result for id, result in zip(ids, results)}
 
 
+async def fetchModels(lookups: List[Tuple[str, Any]], plan: PortPlan = None) -> Dict[Tuple[str, str], Any]:
+    """Fetches the models of (identifier, id) lookups, every distinct lookup only once
 
-async def shrinkOutputs(node: Node, returns: list) -> list:
+    Identifiers (and with them their wards) are fetched concurrently, with one concurrent
+    get per id.
 
-    #assert node.inputs is not None, "Your Query for Nodes seems to not provide any field for inputs, please use that in your get statement"
-    #assert len(node.inputs) > 0  is not None, "Your Node seems to not provide any inputs, calling is redundant"
+    Returns:
+        Dict[Tuple[str, str], Any]: The instance (or the exception of its lookup) by (identifier, str(id))
+    """
+    ids_by_identifier: Dict[str, list] = {}
+    for identifier, id in lookups:
+        ids = ids_by_identifier.setdefault(identifier, [])
+        if id not in ids: ids.append(id)
+
+    async def fetch(identifier: str):
+        return await fetchModelsForIdentifier(identifier, ids_by_identifier[identifier], plan.getModelClass(identifier) if plan else None)
+
+    identifiers = list(ids_by_identifier.keys())
+    results = await asyncio.gather(*[fetch(identifier) for identifier in identifiers], return_exceptions=True)
+
+    models = {}
+    for identifier, result in zip(identifiers, results):
+        for id in ids_by_identifier[identifier]:
+            models[(identifier, str(id))] = result[str(id)] if isinstance(result, dict) else result
+
+    return models
 
-    shrank_returns = []
-    if not isinstance(returns, tuple) or isinstance(returns, list):
-        returns = [returns]
 
-    assert len(node.returns) == len(returns), "Returns do not conform to Node definition"
-    for port, item in zip(node.returns, returns):
-        if port.TYPENAME == PortTypes.MODEL_RETURN_PORT:
-            if isinstance(item, ArnheimModel):
-                shrank_returns.append(item.id)
+def getModel(models: Dict[Tuple[str, str], Any], identifier: str, id) -> ArnheimModel:
+    model = models[(identifier, str(id))]
+    if isinstance(model, BaseException): raise model
+    return model
+
+
+def proxyModels(lookups: List[Tuple[str, Any]], plan: PortPlan = None) -> Dict[Tuple[str, str], ModelProxy]:
+    """Returns unfetched proxies for (identifier, id) lookups (see ModelProxy)"""
+    getModelClass = plan.getModelClass if plan else lambda identifier: get_current_matcher().getModelForIdentifier(identifier=identifier)
+    return {(identifier, str(id)): ModelProxy(getModelClass(identifier), id) for identifier, id in lookups}
+
+
+async def expandInputs(node: Node, args: list, kwargs: dict, lazy=False) -> dict:
+    """Expands the model ids of args and kwargs to their models, with lazy to ModelProxies that are fetched on first use"""
+    plan = getPortPlan(node)
+
+    expanded_kwargs = {}
+    for key, identifier, required in plan.kwargs:
+        if kwargs.get(key) is None:
+            if required:
+                raise ExpansionError(f"We couldn't expand {key} because it wasn't provided by our Kwargs, wrong assignation!!!")
             else:
-                shrank_returns.append(item)
-        else:
-            shrank_returns.append(item)
+                break
 
-    return shrank_returns
+        expanded_kwargs[key] = kwargs[key]
 
+    if not plan.has_model_args:
+        return list(args[:len(plan.args)]), expanded_kwargs
 
-def shrinkOutputsSync(node: Node, returns: list) -> list:
+    lookups = [(identifier, arg) for arg, identifier in zip(args, plan.args) if identifier]
+    lookups += [(identifier, expanded_kwargs[key]) for key, identifier, required in plan.kwargs if identifier and key in expanded_kwargs]
+    if lazy:
+        models = proxyModels(lookups, plan)
+    else:
+        models = await fetchModels(lookups, plan) if lookups else {}
 
-    #assert node.inputs is not None, "Your Query for Nodes seems to not provide any field for inputs, please use that in your get statement"
-    #assert len(node.inputs) > 0  is not None, "Your Node seems to not provide any inputs, calling is redundant"
+    expanded_args = [getModel(models, identifier, arg) if identifier else arg for arg, identifier in zip(args, plan.args)]
+
+    for key, identifier, required in plan.kwargs:
+        if identifier and key in expanded_kwargs:
+            expanded_kwargs[key] = getModel(models, identifier, expanded_kwargs[key])
+
+    return expanded_args, expanded_kwargs
+
+
+def shrinkReturns(node: Node, returns: list) -> list:
+    plan = getPortPlan(node)
 
-    shrank_returns = []
     if not isinstance(returns, tuple) or isinstance(returns, list):
         returns = [returns]
 
-    assert len(node.returns) == len(returns), "Returns do not conform to Node definition"
-    for port, item in zip(node.returns, returns):
-        if port.TYPENAME == PortTypes.MODEL_RETURN_PORT:
-            if isinstance(item, ArnheimModel):
-                shrank_returns.append(item.id)
-            else:
-                shrank_returns.append(item)
-        else:
-            shrank_returns.append(item)
+    assert len(plan.returns) == len(returns), "Returns do not conform to Node definition"
+    if not plan.has_model_returns:
+        return list(returns)
 
-    return shrank_returns
+    return [item.id if identifier and isinstance(item, SHRINKABLE) else item for identifier, item in zip(plan.returns, returns)]
 
 
+async def shrinkOutputs(node: Node, returns: list) -> list:
+    return shrinkReturns(node, returns)
 
-async def shrinkInputs(node: Node, args: list, kwargs: dict) -> Tuple[dict, dict]:
 
-    #assert node.inputs is not None, "Your Query for Nodes seems to not provide any field for inputs, please use that in your get statement"
-    #assert len(node.inputs) > 0  is not None, "Your Node seems to not provide any inputs, calling is redundant"
+def shrinkOutputsSync(node: Node, returns: list) -> list:
+    return shrinkReturns(node, returns)
+
+
+async def shrinkInputs(node: Node, args: list, kwargs: dict) -> Tuple[dict, dict]:
+    plan = getPortPlan(node)
 
     shrinked_args = []
-    for arg, port in zip(args, node.args):
-        if port.TYPENAME == PortTypes.MODEL_ARG_PORT:
-            instance = arg
-            if isinstance(instance, ArnheimModel):
+    for arg, identifier in zip(args, plan.args):
+        if identifier:
+            if isinstance(arg, SHRINKABLE):
                 shrinked_args.append(arg.id)
             else:
                 raise Exception("You didnt provide a model")
@@ -113,45 +167,37 @@ async def shrinkInputs(node: Node, args: list, kwargs: dict) -> Tuple[dict, dict
             shrinked_args.append(arg)
 
     shrinked_kwargs = {}
-
-    for port in node.kwargs:
-        if port.key not in kwargs:
+    for key, identifier, required in plan.kwargs:
+        if key not in kwargs:
             break
 
-        if port.TYPENAME == PortTypes.MODEL_KWARG_PORT:
-            instance = kwargs[port.key]
-            if isinstance(instance, ArnheimModel):
-                shrinked_kwargs[port.key] = kwargs[port.key].id
-            else:
-                shrinked_kwargs[port.key] = kwargs[port.key]
-        else:
-            shrinked_kwargs[port.key] = kwargs[port.key]
+        value = kwargs[key]
+        shrinked_kwargs[key] = value.id if identifier and isinstance(value, SHRINKABLE) else value
 
-
-
-    
     return shrinked_args, shrinked_kwargs
 
 
 async def expandOutputs(node: Node, returns: list, strict=False) -> List:
-
-    #assert node.inputs is not None, "Your Query for Nodes seems to not provide any field for inputs, please use that in your get statement"
-    #assert len(node.inputs) > 0  is not None, "Your Node seems to not provide any inputs, calling is redundant"
-
-    expanded_returns = []
-    assert len(node.returns) == len(returns), "Returns do not conform to Node definition. Someone might have intercepted a Request"
-    for port, item in zip(node.returns, returns):
-        if port.TYPENAME == PortTypes.MODEL_RETURN_PORT:
-            try:
-                modelClass = get_current_matcher().getModelForIdentifier(identifier=port.identifier)
-                instance =  await modelClass.asyncs.get(id=item)
-                expanded_returns.append(instance)
-            except AssertionError as e:
-                if strict: raise e
-                logger.error(f"Couldn't expand outputs make sure to import the schema for {port.identifier}")
+    plan = getPortPlan(node)
+
+    assert len(plan.returns) == len(returns), "Returns do not conform to Node definition. Someone might have intercepted a Request"
+    if plan.has_model_returns:
+        lookups = [(identifier, item) for identifier, item in zip(plan.returns, returns) if identifier]
+        models = await fetchModels(lookups, plan)
+
+        expanded_returns = []
+        for identifier, item in zip(plan.returns, returns):
+            if identifier:
+                try:
+                    expanded_returns.append(getModel(models, identifier, item))
+                except AssertionError as e:
+                    if strict: raise e
+                    logger.error(f"Couldn't expand outputs make sure to import the schema for {identifier}")
+                    expanded_returns.append(item)
+            else:
                 expanded_returns.append(item)
-        else:
-            expanded_returns.append(item)
+    else:
+        expanded_returns = list(returns)
 
     if len(expanded_returns) == 1:
         # Single outputs are returned like that
@@ -159,8 +205,3 @@ async def expandOutputs(node: Node, returns: list, strict=False) -> List:
     
     else:
         return expanded_returns
-
-
-
-
-
@@ -1,9 +1,10 @@
 from abc import ABC
 from bergen.schema import WardSettings
 
-import aiohttp
 from bergen.wards.base import GraphQLException, ServiceWard, TokenExpired, WardException
 from bergen.query import TypedGQL
+from bergen.wards.batch import extract_batch
+from typing import Any, List, Tuple
 import logging
 from bergen.console import console
 
@@ -11,13 +12,14 @@ logger = logging.getLogger(__name__)
 
 class AIOHttpWard(ServiceWard):
     can_subscribe = False
+    can_batch = True
 
     def __init__(self, client, settings: WardSettings, loop=None) -> None:
         super().__init__(client, settings, loop=loop)
         self._graphql_endpoint = f"{self.protocol}://{self.host}:{self.port}/graphql"
 
     async def connect(self):
-        self.async_session = aiohttp.ClientSession(headers=self._headers)
+        self.async_session = self.acquire_session().session # Shared, the headers are sent with every request
 
     async def negotiate(self):
         query_node = """
@@ -25,39 +27,56 @@ class AIOHttpWard(ServiceWard):
                     negotiate(internal: $internal)
             }
         """
-        async with self.async_session.post(self._graphql_endpoint, json={"query": query_node, "variables": self.client.config.dict()}) as resp:
+        async with self.async_session.post(self._graphql_endpoint, json={"query": query_node, "variables": self.client.config.dict()}, headers=self._headers) as resp:
             result = await resp.json() 
             return result["data"]["negotiate"]
             
+    async def post(self, payload) -> Tuple[int, Any]:
+        async with self.async_session.post(self._graphql_endpoint, json=payload, headers=self._headers) as resp:
+            if resp.status in (200, 400):
+                result = await resp.json()
+                logger.debug(f"Received Reply {result}")
+                return resp.status, result
+
+            return resp.status, None
+
     async def pass_async(self, the_query: TypedGQL, variables: dict = {}, **kwargs):
-        query_node = the_query.query
         try:
-            async with self.async_session.post(self._graphql_endpoint, json={"query": query_node, "variables": variables}) as resp:
-                
-                if resp.status == 200:
-                    result = await resp.json() 
-                    logger.debug(f"Received Reply {result}")
+            status, result = await self.persisted.send(self.post, the_query.query, variables)
 
-                    if "errors" in result:
-                        raise GraphQLException(f"Ward {self._graphql_endpoint}:" + str(result["errors"]))
+            if status == 200:
+                if "errors" in result:
+                    raise GraphQLException(f"Ward {self._graphql_endpoint}:" + str(result["errors"]))
 
-                    return the_query.extract(result["data"])
+                return the_query.extract(result["data"])
 
-                if resp.status == 400:
-                    raise WardException(await resp.json())
+            if status == 400:
+                raise WardException(result)
 
 
-                if resp.status == 403:
-                    console.log("Auth token is expired trying to refresh")
-                    raise TokenExpired("Token Expired Error")
+            if status == 403:
+                console.log("Auth token is expired trying to refresh")
+                raise TokenExpired("Token Expired Error")
 
-                raise WardException(f"Unexpected statuscode {resp.status} {resp}")
+            raise WardException(f"Unexpected statuscode {status} on {self._graphql_endpoint}")
 
 
         except:
             console.print_exception(show_locals=True)
             raise 
             
+    async def pass_batch(self, queries: List[Tuple[TypedGQL, dict]]) -> list:
+        # Sent in the batch array form, the server answers with one result per query
+        status, results = await self.persisted.send_batch(self.post, [(the_query.query, variables) for the_query, variables in queries])
+        if status == 200:
+            return extract_batch(queries, results, self._graphql_endpoint)
+
+        if status == 403:
+            raise TokenExpired("Token Expired Error")
+
+        raise WardException(f"Unexpected statuscode {status} for a batch on {self._graphql_endpoint}")
+            
         
     async def disconnect(self):
-        await self.async_session.close()
\ No newline at end of file
+        # The session stays open for the other Wards on this server, the client closes it
+        self.async_session = None
\ No newline at end of file
@@ -3,12 +3,12 @@ from abc import ABC
 import asyncio
 import logging
 from bergen.wards.base import GraphQLException, MainWard, TokenExpired
-import aiohttp
 import requests
 from bergen.console import console
 from bergen.wards.base import WardException
 from bergen.query import  TypedGQL
-from typing import TypeVar
+from bergen.wards.batch import extract_batch
+from typing import Any, List, Tuple, TypeVar
 
 T = TypeVar("T")
 
@@ -16,6 +16,7 @@ logger = logging.getLogger(__name__)
 
 
 class BareMainWard(MainWard):
+    can_batch = True
 
     def __init__(self, client, loop=None):
         super().__init__(client, loop=loop)
@@ -23,39 +24,56 @@ class BareMainWard(MainWard):
         
 
     async def connect(self):
-        self.async_session = aiohttp.ClientSession(headers=self._headers)
+        self.async_session = self.acquire_session().session # Shared, the headers are sent with every request
+
+    async def post(self, payload) -> Tuple[int, Any]:
+        async with self.async_session.post(self._graphql_endpoint, json=payload, headers=self._headers) as resp:
+            if resp.status in (200, 400):
+                result = await resp.json()
+                logger.debug(f"Received Reply {result}")
+                return resp.status, result
+
+            return resp.status, None
 
     async def pass_async(self, the_query: TypedGQL, variables: dict = {}, **kwargs):
-        query_node = the_query.query
         try:
-            async with self.async_session.post(self._graphql_endpoint, json={"query": query_node, "variables": variables}) as resp:
-
-                if resp.status == 200:
-                    result = await resp.json() 
-                    logger.debug(f"Received Reply {result}")
+            status, result = await self.persisted.send(self.post, the_query.query, variables)
 
-                    if "errors" in result:
-                        raise GraphQLException(f"Ward {self._graphql_endpoint}:" + str(result["errors"]))
+            if status == 200:
+                if "errors" in result:
+                    raise GraphQLException(f"Ward {self._graphql_endpoint}:" + str(result["errors"]))
 
-                    return the_query.extract(result["data"])
+                return the_query.extract(result["data"])
 
-                if resp.status == 400:
-                    raise WardException(await resp.json())
+            if status == 400:
+                raise WardException(result)
 
 
-                if resp.status == 403:
-                    console.log("Auth token is expired trying to refresh")
-                    raise TokenExpired("Token Expired Error")
+            if status == 403:
+                console.log("Auth token is expired trying to refresh")
+                raise TokenExpired("Token Expired Error")
 
+            raise WardException(f"Unexpected statuscode {status} on {self._graphql_endpoint}")
 
-                raise WardException(f"Unexpected statuscode {resp.status} {resp}")
 
         except:
             console.print_exception(show_locals=True)
             raise 
             
+    async def pass_batch(self, queries: List[Tuple[TypedGQL, dict]]) -> list:
+        # Sent in the batch array form, the server answers with one result per query
+        status, results = await self.persisted.send_batch(self.post, [(the_query.query, variables) for the_query, variables in queries])
+        if status == 200:
+            return extract_batch(queries, results, self._graphql_endpoint)
+
+        if status == 403:
+            raise TokenExpired("Token Expired Error")
+
+        raise WardException(f"Unexpected statuscode {status} for a batch on {self._graphql_endpoint}")
+            
         
     async def disconnect(self):
-        await self.async_session.close()
+        # The session stays open for the other Wards on this server, the client closes it
+        self.async_session = None
 
 
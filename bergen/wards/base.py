@@ -4,7 +4,11 @@ import asyncio
 from bergen.auths.base import BaseAuthBackend
 from bergen.schema import DataPoint, WardSettings
 from bergen.query import  TypedGQL
-from typing import TypeVar
+from bergen.wards.cache import ModelCache
+from bergen.wards.batch import QueryBatcher
+from bergen.wards.persisted import PersistedQueries
+from bergen.wards.pool import PooledSession
+from typing import List, Tuple, TypeVar
 from bergen.console import console
 
 
@@ -24,6 +28,7 @@ class TokenExpired(ConnectionError):
 
 
 class BaseWard(ABC):
+    can_batch = False # Sends a batch of queries in one request (see pass_batch)
 
     def __init__(self, client, loop=None):
         self.loop = loop or client.loop or asyncio.get_event_loop()
@@ -31,6 +36,14 @@ class BaseWard(ABC):
         self.auth: BaseAuthBackend = client.auth
         assert self.auth.access_token is not None, "Cannot create a Ward without acquiring a Token first"
         self._headers = {"Authorization": f"Bearer {self.auth.access_token}"}
+        self.model_cache = ModelCache(maxsize=client.model_cache_size, ttl=client.model_cache_ttl) # Models fetched through this Ward by (identifier, id)
+        # Without batch requests, batching would only delay queries that already run concurrently
+        self.batcher = QueryBatcher(self, max_size=client.ward_batch_size, max_delay=client.ward_batch_delay) if (client.ward_batch_size or 0) > 1 and self.can_batch else None
+        self.persisted = PersistedQueries(enabled=client.persisted_queries) # Hashes this Ward registered on its server
+
+    def acquire_session(self) -> PooledSession:
+        """Returns the HTTP session this Ward shares with the other Wards on its server"""
+        return self.client.session_pool.acquire(self.protocol, self.host, self.port, self.http)
 
     @abstractmethod
     async def connect(self):
@@ -49,20 +62,26 @@ class BaseWard(ABC):
         pass
 
 
-    async def run(self, gql: TypedGQL, variables: dict = {}):
-        try:
-            return await self.pass_async(gql, variables=variables)
-
-        except TokenExpired:
-            console.print_exception()
+    async def refresh(self):
+        """Refetches the token and reconnects with it"""
+        self.auth.refetch()
+        self._headers = {"Authorization": f"Bearer {self.auth.access_token}"}
 
-            self.auth.refetch()
-            self._headers = {"Authorization": f"Bearer {self.auth.access_token}"}
+        await self.disconnect()
+        await self.connect()
 
-            await self.disconnect()
-            await self.connect()
+    async def run(self, gql: TypedGQL, variables: dict = {}):
+        try:
+            if self.batcher is not None:
+                # The batcher refreshes the token once for the whole batch and sends it again
+                return await self.batcher.run(gql, variables)
 
-            return await self.pass_async(gql, variables=variables)
+            try:
+                return await self.pass_async(gql, variables=variables)
+            except TokenExpired:
+                console.print_exception()
+                await self.refresh()
+                return await self.pass_async(gql, variables=variables)
 
         except:
             console.print_exception(show_locals=True)
@@ -74,6 +93,14 @@ class BaseWard(ABC):
     def pass_async(self, gql: TypedGQL, variables: dict = {}):
         return gql.cls(**{})
 
+    async def pass_batch(self, queries: List[Tuple[TypedGQL, dict]]) -> list:
+        """Sends the queries of a batch in one request and returns the result (or the exception) of each
+
+        Only called on Wards that set can_batch. The gql Wards don't, as their transport sends
+        one query per request, so their queries are never batched and just run concurrently.
+        """
+        raise NotImplementedError(f"{type(self).__name__} can't send batches")
+
 
 
 
@@ -85,6 +112,9 @@ class ServiceWard(BaseWard):
         self.host = settings.host or client.config.host
         self.port = settings.port or client.config.port
         self.protocol = "https" if settings.secure or client.config.secure else "http"
+        overrides = {"limit": settings.connectionLimit, "limit_per_host": settings.connectionLimitPerHost, "keepalive_timeout": settings.keepaliveTimeout,
+            "dns_cache_ttl": settings.dnsCacheTtl, "timeout": settings.timeout}
+        self.http = client.config.http.copy(update={key: value for key, value in overrides.items() if value is not None})
         super().__init__(client, loop=loop)
 
     async def configure(self):
@@ -105,6 +135,7 @@ class MainWard(BaseWard):
         self.host = client.config.host
         self.port = client.config.port
         self.protocol = "https" if client.config.secure else "http"
+        self.http = client.config.http
         super().__init__(client, loop=loop)
 
     async def configure(self):
@@ -0,0 +1,102 @@
+from bergen.query import TypedGQL
+from typing import Any, List, Optional, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBatcher:
+    """ Sends the queries a Ward receives at the same time as one batch
+
+    Queries are collected until max_delay seconds passed since the first one (0 collects the
+    queries issued in the same tick of the loop) or max_size queries are waiting, then they are
+    handed to ward.pass_batch together. Every caller gets its own result or exception, only a
+    failure of the whole request (e.g. a connection error) reaches everyone in the batch.
+    """
+
+    def __init__(self, ward, max_size: int = 20, max_delay: float = 0) -> None:
+        if max_size < 2: raise ValueError(f"Batches need room for at least two queries, got a max_size of {max_size}")
+        self.ward = ward
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.pending: List[Tuple[TypedGQL, dict, asyncio.Future]] = []
+        self.handle: Optional[asyncio.Handle] = None
+        self.sending = set()
+        self.counters = {"queries": 0, "batches": 0, "largest": 0}
+
+    async def run(self, gql: TypedGQL, variables: dict) -> Any:
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self.pending.append((gql, variables, future))
+
+        if len(self.pending) >= self.max_size:
+            self.flush()
+        elif self.handle is None:
+            self.handle = loop.call_later(self.max_delay, self.flush) if self.max_delay else loop.call_soon(self.flush)
+
+        return await future
+
+    def flush(self):
+        if self.handle is not None: self.handle.cancel()
+        self.handle = None
+
+        batch, self.pending = [entry for entry in self.pending if not entry[2].done()], [] # Cancelled callers are dropped
+        if not batch: return
+
+        task = asyncio.ensure_future(self.send(batch))
+        self.sending.add(task)
+        task.add_done_callback(self.sending.discard)
+
+    async def send(self, batch: List[Tuple[TypedGQL, dict, asyncio.Future]]):
+        self.counters["queries"] += len(batch)
+        self.counters["batches"] += 1
+        self.counters["largest"] = max(self.counters["largest"], len(batch))
+
+        from bergen.wards.base import TokenExpired
+        try:
+            try:
+                results = await self.pass_batch(batch)
+            except TokenExpired:
+                # Refreshed once for the whole batch instead of once per caller
+                await self.ward.refresh()
+                results = await self.pass_batch(batch)
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (gql, variables, future), result in zip(batch, results):
+            if future.done(): continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def pass_batch(self, batch: List[Tuple[TypedGQL, dict, asyncio.Future]]) -> list:
+        if len(batch) == 1:
+            return [await self.ward.pass_async(batch[0][0], variables=batch[0][1])]
+        return await self.ward.pass_batch([(gql, variables) for gql, variables, future in batch])
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            **self.counters,
+        }
+
+
+def extract_batch(queries: List[Tuple[TypedGQL, dict]], results: list, endpoint: str) -> list:
+    """Splits the results of a batch array request into the result (or exception) of each query"""
+    from bergen.wards.base import GraphQLException, WardException
+
+    if not isinstance(results, list) or len(results) != len(queries):
+        raise WardException(f"Ward {endpoint}: Expected {len(queries)} results for the batch, got {results}")
+
+    extracted = []
+    for (gql, variables), result in zip(queries, results):
+        try:
+            if "errors" in result:
+                raise GraphQLException(f"Ward {endpoint}:" + str(result["errors"]))
+            extracted.append(gql.extract(result["data"]))
+        except Exception as e:
+            extracted.append(e)
+
+    return extracted
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import time
+
+
+class ModelCache:
+    """ Identity map of the ArnheimModels a Ward fetched
+
+    Instances are keyed by (identifier, id), so everyone asking for the same model within
+    ttl seconds gets the same instance. The least recently used instances are evicted once
+    there are more than maxsize, concurrent fetches of the same key share one query.
+    A maxsize of 0 disables the cache.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 60) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: "OrderedDict[Tuple[str, str], Tuple[Optional[float], Any]]" = OrderedDict()
+        self.inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.counters = {"hits": 0, "misses": 0, "evicted": 0, "expired": 0, "invalidated": 0}
+
+    @staticmethod
+    def get_key(identifier: str, id) -> Tuple[str, str]:
+        return identifier.lower(), str(id)
+
+    def get(self, identifier: str, id) -> Any:
+        """Returns the cached instance or None"""
+        key = self.get_key(identifier, id)
+        if key not in self.entries: return None
+
+        expires, instance = self.entries[key]
+        if expires is not None and expires <= time.monotonic():
+            del self.entries[key]
+            self.counters["expired"] += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.counters["hits"] += 1
+        return instance
+
+    def set(self, identifier: str, instance):
+        if self.maxsize <= 0 or getattr(instance, "id", None) is None: return
+
+        key = self.get_key(identifier, instance.id)
+        self.entries[key] = (time.monotonic() + self.ttl if self.ttl is not None else None, instance)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.counters["evicted"] += 1
+
+    def invalidate(self, identifier: str = None, id=None):
+        """Drops the instance (identifier, id), all instances of identifier, or everything"""
+        if identifier is not None and id is not None:
+            keys = [self.get_key(identifier, id)] if self.get_key(identifier, id) in self.entries else []
+        elif identifier is not None:
+            keys = [key for key in self.entries if key[0] == identifier.lower()]
+        else:
+            keys = list(self.entries)
+
+        for key in keys:
+            del self.entries[key]
+        self.counters["invalidated"] += len(keys)
+
+    async def get_or_fetch(self, identifier: str, id, fetch: Callable[[], Awaitable]) -> Any:
+        instance = self.get(identifier, id)
+        if instance is not None: return instance
+
+        key = self.get_key(identifier, id)
+        if key not in self.inflight:
+            self.counters["misses"] += 1
+            self.inflight[key] = asyncio.ensure_future(fetch())
+            self.inflight[key].add_done_callback(lambda task: self.inflight.pop(key, None))
+
+        instance = await asyncio.shield(self.inflight[key])
+        self.set(identifier, instance)
+        return instance
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            **self.counters,
+        }
@@ -2,9 +2,10 @@ from bergen.wards.base import ServiceWard, TokenExpired, GraphQLException
 from bergen.schema import WardSettings
 import logging
 from abc import ABC
+from typing import Any, Tuple
 
 from bergen.console import console
-from bergen.query import GQL, TypedGQL
+from bergen.query import GQL, TypedGQL, get_query_cache
 from gql.gql import gql
 from gql.transport.aiohttp import AIOHTTPTransport
 from gql.transport.aiohttp import log as aiohttp_logger
@@ -22,7 +23,8 @@ class AIOHttpGraphQLWard(ServiceWard):
         self._graphql_endpoint = f"{self.protocol}://{self.host}:{self.port}/graphql"
 
     async def connect(self):
-        self.async_transport = AIOHTTPTransport(url=self._graphql_endpoint, headers=self._headers)
+        # Its session is built on the shared connector, closing the transport keeps the connections
+        self.async_transport = AIOHTTPTransport(url=self._graphql_endpoint, headers=self._headers, client_session_args=self.acquire_session().session_args)
         await self.async_transport.connect()
 
     async def negotiate(self):
@@ -34,20 +36,29 @@ class AIOHttpGraphQLWard(ServiceWard):
         response = await self.async_transport.execute(query_node, variable_values=self.client.config.dict())
         return response.data["negotiate"]
     
+    async def post(self, query_node, payload) -> Tuple[int, Any]:
+        if "extensions" not in payload:
+            response = await self.async_transport.execute(query_node, variable_values=payload["variables"])
+        else:
+            # Replaces the payload the transport builds, so the text of the query can be left out
+            response = await self.async_transport.execute(query_node, variable_values=payload["variables"], extra_args={"json": payload})
+
+        return 200, {"data": response.data, "errors": response.errors}
+
     async def pass_async(self, the_query: TypedGQL, variables: dict = {}, **kwargs):
-        query_node = gql(the_query.query)
+        query_node = get_query_cache().document(the_query.query, gql) # Parsed once per query string
         try:
             try:
-                response = await self.async_transport.execute(query_node, variable_values=variables)#
+                status, response = await self.persisted.send(lambda payload: self.post(query_node, payload), the_query.query, variables)
                 logger.debug(f"Received Reply {response}")
             except Exception as e:
                 console.print_exception(show_locals=True)
                 raise TokenExpired(f"Token Expired {e}")
                 
-            if response.errors:
-                raise GraphQLException(f"Ward {self._graphql_endpoint}:" + str(response.errors))
+            if response["errors"]:
+                raise GraphQLException(f"Ward {self._graphql_endpoint}:" + str(response["errors"]))
             
-            return the_query.extract(response.data)
+            return the_query.extract(response["data"])
 
         except:
             console.print_exception(show_locals=True)
@@ -0,0 +1,112 @@
+from bergen.query import get_query_cache
+from typing import Any, Awaitable, Callable, List, Set, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+PERSISTED_QUERY_NOT_FOUND = "PersistedQueryNotFound"
+PERSISTED_QUERY_NOT_SUPPORTED = "PersistedQueryNotSupported"
+
+Post = Callable[[Any], Awaitable[Tuple[int, Any]]]
+
+
+def get_error_codes(result) -> Set[str]:
+    """Returns the messages and codes of the errors of a graphql result"""
+    errors = (result.get("errors") or []) if isinstance(result, dict) else []
+    codes = set()
+    for error in errors:
+        if not isinstance(error, dict): continue
+        codes.add(error.get("message"))
+        codes.add((error.get("extensions") or {}).get("code"))
+    return codes
+
+
+class PersistedQueries:
+    """ Automatic persisted queries of a Ward
+
+    Queries are first sent as the sha256 hash of their text only (in the persistedQuery
+    extension). If the server does not know a hash yet it answers with PersistedQueryNotFound
+    and the query is sent again together with its text, which registers it on the server for
+    every later request. The hashes a Ward registered are remembered, a server that answers
+    PersistedQueryNotSupported disables persisted queries for the Ward.
+
+    post sends one payload (or a list of payloads for a batch) and returns the status code and
+    the decoded reply.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.registered: Set[str] = set()
+        self.counters = {"hashed": 0, "not_found": 0, "reregistered": 0}
+
+    def payload(self, query: str, variables: dict, full: bool = False) -> dict:
+        if not self.enabled:
+            return {"query": query, "variables": variables}
+
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": get_query_cache().hash(query)}}
+        if full:
+            return {"query": query, "variables": variables, "extensions": extensions}
+
+        self.counters["hashed"] += 1
+        return {"variables": variables, "extensions": extensions}
+
+    def needs_query(self, query: str, result) -> bool:
+        """Checks if the server asks for the text of query"""
+        if not self.enabled: return False
+        codes = get_error_codes(result)
+
+        if PERSISTED_QUERY_NOT_SUPPORTED in codes or "PERSISTED_QUERY_NOT_SUPPORTED" in codes:
+            logger.warning("The server does not support persisted queries, sending full queries from now on")
+            self.enabled = False
+            return True
+
+        if PERSISTED_QUERY_NOT_FOUND in codes or "PERSISTED_QUERY_NOT_FOUND" in codes:
+            self.counters["not_found"] += 1
+            query_hash = get_query_cache().hash(query)
+            if query_hash in self.registered:
+                # The server dropped a query we registered before (e.g. it restarted)
+                self.counters["reregistered"] += 1
+                self.registered.discard(query_hash)
+            return True
+
+        return False
+
+    def accept(self, query: str, status: int, result):
+        if self.enabled and status == 200 and isinstance(result, dict) and not result.get("errors"):
+            self.registered.add(get_query_cache().hash(query))
+
+    async def send(self, post: Post, query: str, variables: dict) -> Tuple[int, Any]:
+        status, result = await post(self.payload(query, variables))
+        if self.needs_query(query, result):
+            status, result = await post(self.payload(query, variables, full=True))
+
+        self.accept(query, status, result)
+        return status, result
+
+    async def send_batch(self, post: Post, queries: List[Tuple[str, dict]]) -> Tuple[int, Any]:
+        """Sends a batch, the queries the server does not know are sent again with their text in one follow up batch"""
+        status, results = await post([self.payload(query, variables) for query, variables in queries])
+        if status != 200 or not isinstance(results, list) or len(results) != len(queries):
+            return status, results
+
+        missing = [index for index, ((query, variables), result) in enumerate(zip(queries, results)) if self.needs_query(query, result)]
+        if missing:
+            status, resent = await post([self.payload(*queries[index], full=True) for index in missing])
+            if status != 200 or not isinstance(resent, list) or len(resent) != len(missing):
+                return status, resent
+
+            for index, result in zip(missing, resent):
+                results[index] = result
+
+        for (query, variables), result in zip(queries, results):
+            self.accept(query, status, result)
+
+        return status, results
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "registered": len(self.registered),
+            **self.counters,
+        }
@@ -0,0 +1,90 @@
+from bergen.config.types import HttpConfig
+from typing import Dict
+import aiohttp
+
+
+class PooledSession:
+    """ One aiohttp session and its connector, shared by the Wards on one server
+
+    session is used directly by the bare Wards, session_args build sessions (e.g. the one of a
+    gql transport) on the same connector, so they share its connections too.
+    """
+
+    def __init__(self, config: HttpConfig) -> None:
+        self.config = config
+        self.counters = {"acquired": 0, "requests": 0, "connections": 0, "reused": 0, "dns_hits": 0, "dns_misses": 0}
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(self.counter("requests"))
+        trace.on_connection_create_end.append(self.counter("connections"))
+        trace.on_connection_reuseconn.append(self.counter("reused"))
+        trace.on_dns_cache_hit.append(self.counter("dns_hits"))
+        trace.on_dns_cache_miss.append(self.counter("dns_misses"))
+
+        self.connector = aiohttp.TCPConnector(limit=config.limit, limit_per_host=config.limit_per_host, keepalive_timeout=config.keepalive_timeout,
+            use_dns_cache=True, ttl_dns_cache=config.dns_cache_ttl)
+
+        self.session_args = {
+            "connector": self.connector,
+            "connector_owner": False, # Closing a session doesn't close the connections of the others
+            "timeout": aiohttp.ClientTimeout(total=config.timeout, connect=config.connect_timeout),
+            "trace_configs": [trace],
+        }
+        self.session = aiohttp.ClientSession(**self.session_args)
+
+    def counter(self, key: str):
+        async def count(session, context, params):
+            self.counters[key] += 1
+        return count
+
+    async def close(self):
+        await self.session.close()
+        await self.connector.close()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.config.limit,
+            "limit_per_host": self.config.limit_per_host,
+            **self.counters,
+        }
+
+
+class SessionPool:
+    """ The HTTP sessions of a client, one per protocol, host and port
+
+    Wards on the same server send their queries through one session, so they reuse its kept
+    alive connections (and their TLS handshakes) and its DNS cache instead of opening their
+    own. Wards whose HttpConfig differs from the default (e.g. through the overrides of their
+    WardSettings) get a session of their own, keyed by the fields that differ. Sessions stay
+    open until the pool is closed when the client disconnects, so Wards that reconnect (e.g.
+    after a token refresh) keep their connections. Sessions must be acquired on the loop of
+    the client.
+    """
+
+    def __init__(self, default: HttpConfig = None) -> None:
+        self.default = default or HttpConfig()
+        self.sessions: Dict[str, PooledSession] = {}
+
+    def get_key(self, protocol: str, host: str, port: int, config: HttpConfig) -> str:
+        key = f"{protocol}://{host}:{port}"
+        overrides = {field: value for field, value in config.dict().items() if value != getattr(self.default, field)}
+        if overrides: key += "?" + "&".join(f"{field}={value}" for field, value in sorted(overrides.items()))
+        return key
+
+    def acquire(self, protocol: str, host: str, port: int, config: HttpConfig) -> PooledSession:
+        key = self.get_key(protocol, host, port, config)
+        pooled = self.sessions.get(key)
+        if pooled is None or pooled.session.closed:
+            pooled = PooledSession(config)
+            self.sessions[key] = pooled
+
+        pooled.counters["acquired"] += 1
+        return pooled
+
+    async def close(self):
+        sessions, self.sessions = list(self.sessions.values()), {}
+        for pooled in sessions:
+            await pooled.close()
+
+    def stats(self) -> dict:
+        return {key: pooled.stats() for key, pooled in self.sessions.items()}
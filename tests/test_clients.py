@@ -0,0 +1,25 @@
+from bergen.clients.runtime import ClientRuntime, get_running_loop_or_none
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
+
+
+def test_runtime_serves_blocking_threads_concurrently():
+    runtime = ClientRuntime()
+    runtime.start()
+
+    async def work(i):
+        assert get_running_loop_or_none() is runtime.loop
+        await asyncio.sleep(0.1)
+        return i
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda i: runtime.submit(work(i)).result(), range(8)))
+
+    assert results == list(range(8))
+    assert time.perf_counter() - start < 0.5
+
+    forever = runtime.submit(asyncio.sleep(3600))
+    runtime.stop()
+    assert forever.cancelled() and not runtime.is_running
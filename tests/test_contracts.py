@@ -0,0 +1,327 @@
+from bergen.contracts.cache import MISSING, AssignCache
+from bergen.contracts.exceptions import AssignmentCriticalError, AssignmentException, AssignmentRetryError, AssignmentTimeoutError
+from bergen.contracts.group import ReservationGroup
+from bergen.contracts.pool import ReservationPool
+from bergen.contracts.reservation import Reservation, get_deadline
+from bergen.contracts.retry import RetryPolicy
+from bergen.messages.postman.reserve.reserve_transition import ReserveState
+import asyncio
+import gc
+import pytest
+import time
+
+
+class StubReservation:
+
+    def __init__(self, node, fail=False, transition_hook=None, **params) -> None:
+        self.node = node
+        self.fail = fail
+        self.transition_hook = transition_hook
+        self.params = params
+        self.assigned = 0
+        self.delay = 0.01
+        self.cancel_delay = 0
+        self.failing = None
+        self.cancelled = 0
+        self.reference = f"reservation-{len(node.reservations)}"
+        self.current_state = None
+        self.exit_states = [ReserveState.ERROR, ReserveState.CANCELLED]
+        self.ended = False
+
+    async def start(self):
+        await asyncio.sleep(0.01)
+        if self.fail: raise Exception("Could not reserve")
+        self.current_state = ReserveState.ACTIVE
+        return self
+
+    async def end(self):
+        self.ended = True
+
+    async def assign_async(self, *args, **kwargs):
+        self.assigned += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            await asyncio.sleep(self.cancel_delay) # Waiting for the unassign to be confirmed
+            self.cancelled += 1
+            raise
+        if self.failing: raise self.failing
+        return args
+
+    async def transition(self, state):
+        self.current_state = state
+        await self.transition_hook(self, state)
+
+
+class StubNode:
+
+    def __init__(self, id="1", fail=False, flags=()) -> None:
+        self.id = id
+        self.name = "stub"
+        self.fail = fail
+        self.flags = flags
+        self.reservations = []
+
+    def is_flagged(self, flag):
+        return flag in self.flags
+
+    def reserve(self, **params):
+        reservation = StubReservation(self, fail=self.fail, **params)
+        self.reservations.append(reservation)
+        return reservation
+
+
+def test_pool_shares_and_expires_reservations():
+
+    async def run():
+        pool = ReservationPool(idle_timeout=0.05)
+        node = StubNode()
+
+        async def call():
+            async with pool.lease(node, providers=["vanilla"]) as reservation:
+                return reservation
+
+        first, second = await asyncio.gather(call(), call())
+        assert first is second
+        assert (await call()) is first
+
+        first.current_state = ReserveState.CANCELLED
+        replacement = await call()
+        assert replacement is not first
+
+        await asyncio.sleep(0.1)
+        assert first.ended and replacement.ended
+        return pool, node
+
+    pool, node = asyncio.run(run())
+    assert len(node.reservations) == 2
+    assert pool.stats() == {"reservations": 0, "leased": 0, "hits": 2, "misses": 2, "expired": 1, "discarded": 1}
+
+
+def test_pool_does_not_keep_failed_reservations():
+
+    async def run():
+        pool = ReservationPool()
+        node = StubNode(fail=True)
+
+        for i in range(2):
+            with pytest.raises(Exception):
+                async with pool.lease(node):
+                    pass
+
+        return pool, node
+
+    pool, node = asyncio.run(run())
+    assert len(node.reservations) == 2
+    assert pool.stats()["reservations"] == 0
+
+
+class LocalReservation(Reservation):
+    """A Reservation whose assignments run locally (sleep for their arg, fail on negative args)"""
+
+    def __init__(self) -> None:
+        self.loop = asyncio.get_event_loop()
+        self.running = 0
+        self.max_running = 0
+        self.cancelled = 0
+
+    async def assign_async(self, delay, **kwargs):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(abs(delay))
+            if delay < 0: raise AssignmentException("Failed")
+            return delay
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.running -= 1
+
+
+def test_map_bounds_concurrency_and_orders_results():
+
+    async def run():
+        reservation = LocalReservation()
+        ordered = await reservation.map([0.03, 0.01, 0.02, 0.0, 0.01], concurrency=2)
+        unordered = await reservation.map([0.03, 0.0], concurrency=2, ordered=False)
+        return reservation, ordered, unordered
+
+    reservation, ordered, unordered = asyncio.run(run())
+    assert ordered == [0.03, 0.01, 0.02, 0.0, 0.01]
+    assert unordered == [0.0, 0.03]
+    assert reservation.max_running == 2
+
+
+def test_map_cancels_the_rest_on_failure():
+
+    async def run():
+        reservation = LocalReservation()
+        with pytest.raises(AssignmentException):
+            await reservation.map([1, -0.01, 1, 1], concurrency=3)
+        return reservation
+
+    reservation = asyncio.run(run())
+    assert reservation.cancelled == 2 and reservation.running == 0
+
+
+def test_map_retrieves_every_failure():
+    unretrieved = []
+
+    async def run():
+        asyncio.get_event_loop().set_exception_handler(lambda loop, context: unretrieved.append(context["message"]))
+        try:
+            await LocalReservation().map([-0.01, -0.01], concurrency=2)
+        except AssignmentException:
+            pass
+        gc.collect()
+
+    asyncio.run(run())
+    assert unretrieved == []
+
+
+def test_group_balances_and_replaces_members():
+
+    async def run():
+        node = StubNode()
+        async with ReservationGroup(node, size=2, providers=["a", "b"], loop=asyncio.get_event_loop()) as group:
+            await asyncio.gather(*[group.assign_async(i) for i in range(4)])
+            assert [reservation.assigned for reservation in node.reservations] == [2, 2]
+
+            await node.reservations[0].transition(ReserveState.ERROR)
+            await group.assign_async(5)
+            await asyncio.sleep(0.05)
+            stats = group.stats()
+
+        return node, stats
+
+    node, stats = asyncio.run(run())
+    assert [reservation.params["providers"] for reservation in node.reservations] == [["a"], ["b"], ["a"]]
+    assert node.reservations[1].assigned == 3
+    assert stats["replaced"] == 1 and len(stats["members"]) == 2
+    assert all(reservation.ended for reservation in node.reservations)
+
+
+def test_group_hedges_slow_assignments_of_idempotent_nodes():
+
+    with pytest.raises(AssertionError):
+        ReservationGroup(StubNode(), hedge_after=0.01)
+
+    async def run():
+        node = StubNode(flags=("idempotent",))
+        async with ReservationGroup(node, size=2, hedge_after=0.02, loop=asyncio.get_event_loop()) as group:
+            node.reservations[0].delay = 1
+            node.reservations[0].cancel_delay = 0.5
+            start = time.perf_counter()
+            result = await group.assign_async(1)
+            elapsed = time.perf_counter() - start
+            stats = group.stats()
+
+        return node, result, stats, elapsed
+
+    node, result, stats, elapsed = asyncio.run(run())
+    assert result == (1,) and elapsed < 0.3
+    assert stats["hedged"] == 1 and stats["hedges_won"] == 1
+    assert node.reservations[0].cancelled == 1
+
+
+def test_retry_policy_filters_exceptions():
+    policy = RetryPolicy(max_attempts=2, retry_on=(AssignmentRetryError, "ConnectionError"))
+    assert policy.should_retry(AssignmentRetryError("Busy"), 1)
+    assert policy.should_retry(AssignmentCriticalError("Lost", type="ConnectionError"), 1)
+    assert not policy.should_retry(AssignmentCriticalError("Bug", type="ValueError"), 1)
+    assert not policy.should_retry(AssignmentRetryError("Busy"), 2)
+    assert not RetryPolicy().should_retry(AssignmentTimeoutError("Late"), 1)
+    assert not RetryPolicy().should_retry(AssignmentCriticalError("Bug", type="ValueError"), 1)
+
+
+def test_group_retries_on_a_sibling():
+
+    async def run():
+        node = StubNode()
+        async with ReservationGroup(node, size=2, retry=RetryPolicy(backoff=0.01), loop=asyncio.get_event_loop()) as group:
+            node.reservations[0].failing = AssignmentRetryError("Provider is restarting")
+            results = [await group.assign_async(i) for i in range(3)]
+
+        return node, results
+
+    node, results = asyncio.run(run())
+    assert results == [(0,), (1,), (2,)]
+    assert [reservation.assigned for reservation in node.reservations] == [3, 3]
+
+
+class SilentPostman:
+    """Never answers, like a server that lost the assignment"""
+
+    def __init__(self) -> None:
+        self.evicted = []
+
+    async def send_unassign(self, assignation, context=None, queue=None):
+        return "unassign"
+
+    async def delete_assignqueue(self, reference):
+        self.evicted.append(reference)
+
+
+def test_assign_cache_collapses_evicts_and_persists(tmp_path):
+    calls = []
+
+    async def assign(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+
+    async def run(cache):
+        keys = [AssignCache.get_key("1", [value], {}) for value in range(3)]
+        results = await asyncio.gather(*[cache.get_or_run(keys[0], lambda: assign(0)) for i in range(3)])
+        assert results == [0, 0, 0]
+        for index in (1, 2):
+            assert await cache.get_or_run(keys[index], lambda: assign(index)) == index * 2
+        await cache.close()
+        return keys
+
+    path = str(tmp_path / "assigns")
+    cache = AssignCache(maxsize=2, path=path)
+    keys = asyncio.run(run(cache))
+    assert calls == [0, 1, 2]
+    assert cache.stats() == {"entries": 2, "inflight": 0, "hits": 0, "disk_hits": 0, "misses": 3, "collapsed": 2, "evicted": 1, "expired": 0}
+
+    assert asyncio.run(AssignCache(path=path).get_async(keys[0])) == 0
+    expired = AssignCache(ttl=0)
+    expired.set(keys[0], 0)
+    assert expired.get(keys[0]) is MISSING
+
+
+def test_assign_cache_hands_out_copies():
+
+    async def run():
+        cache = AssignCache()
+        first = await cache.get_or_run("key", lambda: asyncio.sleep(0, result=[1]))
+        first.append(2)
+        return await cache.get_or_run("key", lambda: asyncio.sleep(0, result=[3]))
+
+    assert asyncio.run(run()) == [1]
+
+
+def test_deadline_is_the_earlier_of_timeout_and_deadline():
+    now = time.time()
+    assert get_deadline() is None
+    assert get_deadline(deadline=now + 100) == now + 100
+    assert now + 1 <= get_deadline(timeout=1, deadline=now + 100) < now + 2
+
+
+def test_cancellation_is_capped():
+
+    async def run():
+        reservation = LocalReservation()
+        reservation._postman = SilentPostman()
+        reservation.cancel_timeout = 0.05
+        reservation._log = lambda message, level: None
+
+        start = time.perf_counter()
+        confirmed = await reservation.cancel_assignment("assign", asyncio.Queue())
+        return reservation, confirmed, time.perf_counter() - start
+
+    reservation, confirmed, elapsed = asyncio.run(run())
+    assert not confirmed and elapsed < 1
+    assert reservation._postman.evicted == ["assign", "unassign"]
@@ -0,0 +1,75 @@
+from bergen.messages import AssignReturnMessage, BouncedForwardedAssignMessage
+from bergen.messages.utils import MessageError, get_message_decoder
+import pytest
+import json
+
+
+ASSIGN_RETURN = json.dumps({"data": {"returns": [1, "2"]}, "meta": {"type": "assign_return", "reference": "ref", "extensions": {}}})
+FORWARDED_ASSIGN = json.dumps({
+    "data": {"reservation": "res", "provision": "prov", "args": [1], "kwargs": {}},
+    "meta": {"type": "bounced_forwarded_assign", "reference": "ref", "extensions": {}, "context": {"roles": [], "scopes": [], "user": "1", "app": None}}
+})
+
+
+@pytest.mark.parametrize("trusted", [True, False])
+def test_decoders_agree(trusted):
+    decode = get_message_decoder(trusted=trusted)
+
+    message, = decode(ASSIGN_RETURN)
+    assert isinstance(message, AssignReturnMessage)
+    assert message.data.returns == [1, "2"]
+
+    message, = decode(FORWARDED_ASSIGN)
+    assert isinstance(message, BouncedForwardedAssignMessage)
+    assert message.meta.context.user == "1"
+
+
+def test_trusted_decoder_checks_routing():
+    decode = get_message_decoder(trusted=True)
+
+    with pytest.raises(MessageError):
+        decode(json.dumps({"data": {}, "meta": {"type": "assign_return"}}))
+
+    with pytest.raises(MessageError):
+        decode(json.dumps({"data": {}, "meta": {"type": "not_a_type", "reference": "ref"}}))
+
+
+@pytest.mark.parametrize("codec_name", ["json", "msgpack", "cbor"])
+def test_codec_roundtrip(codec_name):
+    from bergen.messages.codecs import get_codec
+    if codec_name != "json": pytest.importorskip("msgpack" if codec_name == "msgpack" else "cbor2")
+
+    codec = get_codec(codec_name)
+    assert codec.name == codec_name
+
+    message, = get_message_decoder()(ASSIGN_RETURN)
+    frame = message.to_frame(codec)
+
+    for trusted in [True, False]:
+        decoded, = get_message_decoder(trusted=trusted)(frame)
+        assert isinstance(decoded, AssignReturnMessage)
+        assert decoded.data.returns == [1, "2"]
+
+
+def test_unknown_codec_falls_back_to_json():
+    from bergen.messages.codecs import get_codec
+    assert get_codec("notacodec").name == "json"
+
+
+def test_batch_envelope():
+    import asyncio
+    from bergen.messages.codecs import get_codec
+    from bergen.transports.batching import collect_batch, encode_batch
+
+    async def collect():
+        queue = asyncio.Queue()
+        message, = get_message_decoder()(ASSIGN_RETURN)
+        for i in range(5): await queue.put(message)
+        return await collect_batch(queue, max_batch_size=3), await collect_batch(queue, max_batch_size=3, max_delay=0.01)
+
+    first, second = asyncio.run(collect())
+    assert len(first) == 3 and len(second) == 2
+
+    decoded = get_message_decoder(trusted=True)(encode_batch(first, get_codec("json")))
+    assert len(decoded) == 3
+    assert all(isinstance(message, AssignReturnMessage) for message in decoded)
@@ -0,0 +1,129 @@
+from bergen.messages import AssignLogMessage, AssignMessage, AssignReturnMessage, ReserveCriticalMessage, ReserveTransitionMessage, UnreserveDoneMessage
+from bergen.postmans.registry import ASSIGNMENT, RESERVATION, ReferenceRegistry
+from bergen.postmans.websocket import WebsocketPostman
+from bergen.transports.queues import QueueFactory
+from types import SimpleNamespace
+from websockets.exceptions import ConnectionClosedError
+import asyncio
+
+
+def test_registry_evicts_terminal_references():
+
+    async def route():
+        registry = ReferenceRegistry()
+        queue = asyncio.Queue()
+        registry.register(ASSIGNMENT, "assign", queue)
+        registry.register(RESERVATION, "reserve", queue)
+
+        await registry.route(AssignLogMessage(data={"level": "INFO", "message": "log"}, meta={"reference": "assign"}))
+        assert "assign" in registry
+        await registry.route(AssignReturnMessage(data={"returns": [1]}, meta={"reference": "assign"}))
+
+        await registry.route(ReserveTransitionMessage(data={"state": "ACTIVE"}, meta={"reference": "reserve"}))
+        await registry.route(ReserveCriticalMessage(data={"message": "Provider lost", "type": "Exception"}, meta={"reference": "reserve"}))
+        await registry.route(UnreserveDoneMessage(data={"reservation": "reserve"}, meta={"reference": "unreserve"}))
+        assert "reserve" in registry
+        # Arrives after the unreserve done and must still reach the Reservation
+        assert await registry.route(ReserveTransitionMessage(data={"state": "CANCELLED"}, meta={"reference": "reserve"}))
+        return registry, queue
+
+    registry, queue = asyncio.run(route())
+    assert len(registry) == 0
+    assert queue.qsize() == 5
+    assert registry.stats()["evicted"]["terminal"] == 2
+
+
+def test_registry_does_not_block_on_a_full_queue():
+
+    async def route():
+        registry = ReferenceRegistry()
+        slow, fast = QueueFactory(1).create("assignment", failable=True), asyncio.Queue()
+        registry.register(ASSIGNMENT, "slow", slow)
+        registry.register(ASSIGNMENT, "fast", fast)
+
+        for index in range(3):
+            await asyncio.wait_for(registry.route(AssignLogMessage(data={"level": "INFO", "message": str(index)}, meta={"reference": "slow"})), 1)
+        await asyncio.wait_for(registry.route(AssignReturnMessage(data={"returns": [1]}, meta={"reference": "fast"})), 1)
+        routed_fast = fast.qsize()
+
+        received = [(await slow.get()).data.message for index in range(3)]
+        return routed_fast, received, registry
+
+    routed_fast, received, registry = asyncio.run(route())
+    assert routed_fast == 1
+    assert received == ["0", "1", "2"]
+    assert not registry.backlogs
+
+
+def test_registry_evicts_idle_references():
+    registry = ReferenceRegistry(assignment_ttl=10, reservation_ttl=None)
+    registry.register(ASSIGNMENT, "abandoned", None)
+    registry.register(RESERVATION, "reserve", None)
+
+    registry.sweep(registry.entries[ASSIGNMENT]["abandoned"][1] + 11)
+    assert registry.stats() == {"assignments": 0, "reservations": 1, "muted": 0, "evicted": {"terminal": 0, "ttl": 1, "manual": 0}}
+
+
+def test_registry_drops_muted_references():
+
+    async def route():
+        registry = ReferenceRegistry()
+        registry.mute("loopback")
+        routed = await registry.route(AssignReturnMessage(data={"returns": None}, meta={"reference": "loopback"}))
+        return registry, routed
+
+    registry, routed = asyncio.run(route())
+    assert routed and registry.stats()["muted"] == 0
+
+
+class DroppingConnection:
+    """A websocket that never answers pings and, if dropping, is lost after the first frame"""
+
+    def __init__(self, dropping: bool) -> None:
+        self.dropping = dropping
+        self.sent = []
+        self.lost = asyncio.Event()
+
+    async def send(self, frame):
+        self.sent.append(frame)
+        if self.dropping: self.lost.set()
+
+    async def ping(self):
+        return asyncio.get_event_loop().create_future()
+
+    async def close(self):
+        pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await self.lost.wait()
+        raise ConnectionClosedError(None, None)
+
+
+def test_reconnect_does_not_resend_assignments():
+    connections = [DroppingConnection(True), DroppingConnection(False)]
+
+    async def run():
+        client = SimpleNamespace(config=SimpleNamespace(host="localhost", port=8000, secure=False), trusted_messages=True, queue_factory=QueueFactory(), loop=asyncio.get_event_loop())
+        postman = WebsocketPostman(client, reconnect_base_delay=0, reconnect_max_delay=0)
+
+        async def connect_websocket():
+            postman.connection = connections.pop(0)
+
+        postman.connect_websocket = connect_websocket
+        postman.reconnect_manager.connect = connect_websocket
+        first, second = connections
+
+        await postman.connect()
+        await postman.send_queue.put(AssignMessage(data={"reservation": "reserve", "args": [1]}, meta={"reference": "assign"}))
+        while postman.connection is not second:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        await postman.disconnect()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert len(first.sent) == 1
+    assert second.sent == [] # The server may already run the assignment, it must not be sent twice
@@ -0,0 +1,38 @@
+from bergen.query import DelayedGQL, GQL, QueryCache, get_query_cache
+
+
+class Sample:
+    pass
+
+
+QUERY = """
+    query Sample($id: ID!) {
+        sample(id: $id) {
+            id
+        }
+    }
+"""
+
+
+def test_delayed_queries_are_built_and_parsed_once():
+    delayed = DelayedGQL(QUERY)
+    before = get_query_cache().stats()
+
+    first, second = delayed(Sample), delayed(Sample)
+    assert first is second
+    assert first.firstchild == "sample" and first.has_variables
+
+    stats = get_query_cache().stats()
+    assert stats["typed"]["misses"] - before["typed"]["misses"] == 1
+    assert stats["typed"]["hits"] - before["typed"]["hits"] == 1
+    assert GQL(QUERY).m is first.m
+
+
+def test_query_cache_is_bounded():
+    cache = QueryCache(maxsize=2)
+    parsed = []
+    for query in ["a", "b", "c", "a"]:
+        cache.document(query, lambda query: parsed.append(query) or query.upper())
+
+    assert parsed == ["a", "b", "c", "a"]
+    assert cache.stats()["documents"] == {"entries": 2, "hits": 0, "misses": 4}
@@ -0,0 +1,84 @@
+from bergen.messages import AssignLogMessage, AssignReturnMessage
+from bergen.transports.queues import BackpressurePolicy, QueueFactory, QueueFullError
+from bergen.transports.reconnect import Backoff, ReconnectManager, ReplayBuffer
+import asyncio
+import pytest
+
+
+LOG = AssignLogMessage(data={"level": "INFO", "message": "log"}, meta={"reference": "ref"})
+RETURN = AssignReturnMessage(data={"returns": [1]}, meta={"reference": "ref"})
+
+
+def test_drop_logs_policy():
+
+    async def fill():
+        factory = QueueFactory(2, BackpressurePolicy.DROP_LOGS)
+        queue = factory.create("test")
+        for message in [LOG, RETURN, RETURN]:
+            await queue.put(message)
+        queue.put_nowait(LOG)
+        stats = factory.stats()
+
+        received = []
+        while not queue.empty():
+            received.append(queue.get_nowait())
+        return received, stats, factory.create("raw", raw=True).policy
+
+    received, stats, raw_policy = asyncio.run(fill())
+    assert received == [RETURN, RETURN]
+    assert stats["test"]["dropped"] == 2
+    assert stats["test"]["depth"] == 2
+    assert raw_policy == BackpressurePolicy.BLOCK
+
+
+def test_fail_policy_fails_consumer():
+
+    async def fill_and_drain():
+        factory = QueueFactory(2, BackpressurePolicy.FAIL)
+        queue = factory.create("assignment", failable=True)
+        for message in [RETURN, RETURN, RETURN]:
+            await queue.put(message)
+
+        received = [await queue.get(), await queue.get()]
+        with pytest.raises(QueueFullError):
+            await queue.get()
+        return received, factory.create("shared").policy
+
+    received, shared_policy = asyncio.run(fill_and_drain())
+    assert received == [RETURN, RETURN]
+    assert shared_policy == BackpressurePolicy.DROP_LOGS
+
+
+def test_backoff_is_capped():
+    backoff = Backoff(base_delay=1, max_delay=5, jitter=False)
+    assert [backoff.delay(attempt) for attempt in range(5)] == [1, 2, 4, 5, 5]
+    assert 0 <= Backoff(base_delay=1, max_delay=5).delay(10) <= 5
+
+
+def test_replay_buffer_acknowledges_and_drains():
+    buffer = ReplayBuffer(maxsize=3)
+    sequence = buffer.add([RETURN, LOG])
+    buffer.add([RETURN, RETURN])
+    assert buffer.dropped == 1
+
+    buffer.acknowledge(sequence)
+    assert buffer.drain() == [RETURN, RETURN]
+    assert len(buffer) == 0 and not buffer.has_pending.is_set()
+
+
+def test_reconnect_manager_is_iterative():
+    attempts = []
+
+    async def connect():
+        attempts.append(1)
+        if len(attempts) % 2: raise ConnectionError("refused")
+
+    async def session():
+        if len(attempts) >= 200: raise asyncio.CancelledError()
+
+    manager = ReconnectManager("Test", connect, session, backoff=Backoff(0, 0))
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(manager.run())
+
+    # Hundreds of reconnects must not grow the stack
+    assert manager.connections == 100
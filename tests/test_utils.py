@@ -0,0 +1,104 @@
+from bergen.actors.functional import FunctionalFuncActor, FunctionalThreadedFuncActor
+from bergen.enums import PortTypes
+from bergen.types.model import ArnheimAsyncModelManager, ArnheimModel
+from bergen.types.proxy import ModelProxy
+from bergen.utils import expandInputs, expandOutputs, getPortPlan, shrinkInputs
+from bergen.wards.cache import ModelCache
+from types import SimpleNamespace
+import asyncio
+import pytest
+
+
+WARD = SimpleNamespace(model_cache=ModelCache())
+
+
+class CountingManager(ArnheimAsyncModelManager):
+    calls = []
+
+    async def _call_meta(self, attribute, ward=None, **kwargs):
+        self.calls.append((self.model.__name__, attribute, kwargs))
+        await asyncio.sleep(0.01)
+        return self.model(id=kwargs["id"])
+
+
+class Sample(ArnheimModel):
+    asyncs = CountingManager
+    get_ward = classmethod(lambda cls: WARD)
+
+    class Meta:
+        identifier = "test-sample"
+
+
+class Experiment(ArnheimModel):
+    asyncs = CountingManager
+    get_ward = classmethod(lambda cls: WARD)
+
+    class Meta:
+        identifier = "test-experiment"
+
+
+def port(typename, identifier=None, key=None):
+    return SimpleNamespace(TYPENAME=typename, identifier=identifier, key=key, required=True)
+
+
+def test_expansion_fetches_every_model_once():
+    node = SimpleNamespace(
+        args=[port(PortTypes.MODEL_ARG_PORT, "test-sample"), port(PortTypes.MODEL_ARG_PORT, "test-sample"), port(PortTypes.MODEL_ARG_PORT, "test-experiment"), port("IntArgPort")],
+        kwargs=[port(PortTypes.MODEL_KWARG_PORT, "test-experiment", key="other"), port(PortTypes.MODEL_KWARG_PORT, "test-sample", key="sample")],
+        returns=[port(PortTypes.MODEL_RETURN_PORT, "test-sample")],
+    )
+
+    args, kwargs = asyncio.run(expandInputs(node, [1, 1, 2, 7], {"other": 3, "sample": 4}))
+    assert [arg.id if isinstance(arg, ArnheimModel) else arg for arg in args] == [1, 1, 2, 7]
+    assert args[0] is args[1]
+    assert kwargs["other"].id == 3 and kwargs["sample"].id == 4
+    assert sorted(CountingManager.calls, key=str) == sorted([("Sample", "get", {"id": 1}), ("Sample", "get", {"id": 4}), ("Experiment", "get", {"id": 2}), ("Experiment", "get", {"id": 3})], key=str)
+
+    assert asyncio.run(expandOutputs(node, [5])).id == 5
+    assert node._port_plan is getPortPlan(node) and set(node._port_plan.models) == {"test-sample", "test-experiment"}
+
+
+def test_lazy_expansion_fetches_on_first_use():
+    node = SimpleNamespace(args=[port(PortTypes.MODEL_ARG_PORT, "test-sample")], kwargs=[], returns=[])
+
+    async def run():
+        CountingManager.calls.clear()
+        (proxy,), kwargs = await expandInputs(node, [11], {}, lazy=True)
+        assert isinstance(proxy, ModelProxy) and proxy.id == 11 and not proxy.is_fetched
+        assert await shrinkInputs(node, [proxy], {}) == ([11], {})
+        assert CountingManager.calls == []
+
+        instance = await proxy.fetch()
+        assert proxy.is_fetched and proxy == instance and proxy.TYPENAME == instance.TYPENAME
+        assert CountingManager.calls == [("Sample", "get", {"id": 11})]
+
+    asyncio.run(run())
+
+
+def test_lazy_inputs_need_a_threaded_actor():
+    with pytest.raises(TypeError):
+        type("LazyAsyncActor", (FunctionalFuncActor,), {"lazyInputs": True})
+
+    assert type("LazyThreadedActor", (FunctionalThreadedFuncActor,), {"lazyInputs": True}).lazyInputs
+
+
+def test_model_cache_is_an_identity_map():
+    cache = ModelCache(maxsize=2, ttl=None)
+    calls = []
+
+    async def fetch(id):
+        calls.append(id)
+        await asyncio.sleep(0.01)
+        return Sample(id=id)
+
+    async def run():
+        first, second = await asyncio.gather(*[cache.get_or_fetch("test-sample", 1, lambda: fetch(1)) for i in range(2)])
+        assert first is second
+        await cache.get_or_fetch("test-sample", 2, lambda: fetch(2))
+        await cache.get_or_fetch("test-sample", 3, lambda: fetch(3))
+        cache.invalidate("test-sample", 3)
+        return await cache.get_or_fetch("test-sample", 2, lambda: fetch(2))
+
+    asyncio.run(run())
+    assert calls == [1, 2, 3]
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 3, "evicted": 1, "expired": 0, "invalidated": 1}
@@ -0,0 +1,114 @@
+from bergen.config.types import HttpConfig
+from bergen.wards.base import BaseWard, GraphQLException, TokenExpired
+from bergen.wards.batch import QueryBatcher
+from bergen.wards.persisted import PERSISTED_QUERY_NOT_FOUND, PersistedQueries
+from bergen.wards.pool import SessionPool
+import asyncio
+
+
+class BatchWard:
+    """Answers every query with its variables, fails the ones asking for it"""
+
+    def __init__(self) -> None:
+        self.batches = []
+
+    async def pass_async(self, gql, variables={}):
+        self.batches.append([variables])
+        return variables
+
+    async def pass_batch(self, queries):
+        self.batches.append([variables for gql, variables in queries])
+        return [GraphQLException("Failed") if variables.get("fail") else variables for gql, variables in queries]
+
+
+def test_batcher_merges_a_tick_and_isolates_errors():
+
+    async def run():
+        ward = BatchWard()
+        batcher = QueryBatcher(ward, max_size=3)
+        results = await asyncio.gather(*[batcher.run(None, {"index": index, "fail": index == 1}) for index in range(4)], return_exceptions=True)
+        return ward, batcher, results
+
+    ward, batcher, results = asyncio.run(run())
+    assert [len(batch) for batch in ward.batches] == [3, 1]
+    assert isinstance(results[1], GraphQLException)
+    assert [result["index"] for index, result in enumerate(results) if index != 1] == [0, 2, 3]
+    assert batcher.stats() == {"pending": 0, "queries": 4, "batches": 2, "largest": 3}
+
+
+class ExpiringWard(BatchWard):
+    """Fails the first expired batches with an expired token"""
+
+    def __init__(self, expired: int) -> None:
+        super().__init__()
+        self.expired = expired
+        self.refreshes = 0
+        self.batcher = QueryBatcher(self, max_size=10)
+
+    async def refresh(self):
+        self.refreshes += 1
+
+    async def pass_async(self, gql, variables={}):
+        raise AssertionError("Queries of a batching Ward are only sent through its batcher")
+
+    async def pass_batch(self, queries):
+        if self.refreshes < self.expired: raise TokenExpired("Expired")
+        return await super().pass_batch(queries)
+
+
+def test_batcher_refreshes_once_for_an_expired_batch():
+
+    async def run(expired):
+        ward = ExpiringWard(expired)
+        results = await asyncio.gather(*[BaseWard.run(ward, None, {"index": index}) for index in range(4)], return_exceptions=True)
+        return ward, results
+
+    ward, results = asyncio.run(run(1))
+    assert ward.refreshes == 1
+    assert ward.batches == [[{"index": index} for index in range(4)]]
+    assert [result["index"] for result in results] == [0, 1, 2, 3]
+
+    ward, results = asyncio.run(run(2))
+    assert ward.refreshes == 1
+    assert all(isinstance(result, TokenExpired) for result in results)
+
+
+def test_persisted_queries_register_unknown_hashes():
+    server = {}
+    payloads = []
+
+    async def post(payload):
+        payloads.append(payload)
+        persisted = payload["extensions"]["persistedQuery"]["sha256Hash"]
+        if "query" in payload: server[persisted] = payload["query"]
+        if persisted not in server: return 200, {"errors": [{"message": PERSISTED_QUERY_NOT_FOUND}]}
+        return 200, {"data": payload["variables"]}
+
+    async def run():
+        persisted = PersistedQueries()
+        results = [await persisted.send(post, "query { sample }", {"index": index}) for index in range(2)]
+        return persisted, results
+
+    persisted, results = asyncio.run(run())
+    assert results == [(200, {"data": {"index": 0}}), (200, {"data": {"index": 1}})]
+    assert ["query" in payload for payload in payloads] == [False, True, False]
+    assert persisted.stats() == {"enabled": True, "registered": 1, "hashed": 2, "not_found": 1, "reregistered": 0}
+
+
+def test_session_pool_shares_sessions_per_server():
+
+    async def run():
+        pool = SessionPool()
+        first = pool.acquire("http", "arkitekt", 8090, HttpConfig())
+        second = pool.acquire("http", "arkitekt", 8090, HttpConfig())
+        other = pool.acquire("https", "arkitekt", 8090, HttpConfig())
+        tuned = pool.acquire("http", "arkitekt", 8090, HttpConfig(limit=10))
+        stats = pool.stats()
+        await pool.close()
+        return first, second, other, tuned, stats
+
+    first, second, other, tuned, stats = asyncio.run(run())
+    assert first is second and first is not other and first is not tuned
+    assert first.session.closed and first.connector.closed
+    assert stats["http://arkitekt:8090"]["acquired"] == 2
+    assert stats["http://arkitekt:8090?limit=10"]["limit"] == 10